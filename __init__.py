@@ -1,12 +1,18 @@
 import clr
 import sys
 import os
-import re
+import ast
+import json
+import time
+import tokenize
+import shutil
+import hashlib
+import threading
 import os.path as op
 from datetime import datetime
+from collections import deque
 # import random as rnd
 # import pickle as pl
-# import time
 
 clr.AddReference('PresentationCore')
 clr.AddReference('RevitAPI')
@@ -17,28 +23,34 @@ from System import *
 from System.IO import *
 from System.Reflection import *
 from System.Reflection.Emit import *
-from System.Windows.Media.Imaging import BitmapImage, BitmapCacheOption
+from System.Windows.Media import PixelFormats
+from System.Windows.Media.Imaging import BitmapImage, BitmapCacheOption, BitmapSource
 
 from Autodesk.Revit.UI import *
 from Autodesk.Revit.Attributes import *
 from System.Diagnostics import Process
 
-verbose = True
 
+def report(message, *args, **kwargs):
+    loaderLog.log(PyRevitLoaderLog.INFO, message, args, kwargs.get('title', False))
 
-def report(message, title=False):
-    if title:
-        print('-' * 100 + '\n' + message + '\n' + '-' * 100)
-    else:
-        print(message)
+
+def reportv(message, *args, **kwargs):
+    # message arguments are only formatted if the record is written to the window or the log file
+    loaderLog.log(PyRevitLoaderLog.DEBUG, message, args, kwargs.get('title', False))
+
+
+def isverbose():
+    # guards the debug messages whose arguments take work to build
+    return loaderLog.isenabled(PyRevitLoaderLog.DEBUG)
 
 
-def reportv(message, title=False):
-    global verbose
-    if verbose:
-        report(message, title)
-        # else:
-        # time.sleep(.01)
+def reportwarning(message, *args, **kwargs):
+    loaderLog.log(PyRevitLoaderLog.WARNING, message, args, kwargs.get('title', False))
+
+
+def reporterror(message, *args, **kwargs):
+    loaderLog.log(PyRevitLoaderLog.ERROR, message, args, kwargs.get('title', False))
 
 
 def find_home_directory():
@@ -56,6 +68,15 @@ def find_user_temp_directory():
     return tempfolder
 
 
+def get_session_data(key, default):
+    # values are kept on the AppDomain so they survive reloading the scripts in the same Revit session
+    value = AppDomain.CurrentDomain.GetData(key)
+    if value is None:
+        value = default()
+        AppDomain.CurrentDomain.SetData(key, value)
+    return value
+
+
 # EXCEPTIONS
 class PyRevitException(Exception):
     pass
@@ -70,6 +91,71 @@ class UnknownFileNameFormat(PyRevitException):
 
 
 # SOOP CLASSES
+class PyRevitLoaderLog:
+    """Buffered, leveled log of the loader messages.
+    Records are kept unformatted in memory and are formatted and written out in one go by flush().
+    Records below both the window and the log file levels are dropped without being formatted. Debug messages whose
+    arguments take work to build are only logged when isverbose() says the records are kept."""
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    ERROR = 40
+    levelNames = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+    def __init__(self, windowlevel, filelevel=None, logfile=None, buffered=True):
+        self.windowLevel = windowlevel
+        self.fileLevel = filelevel
+        self.logFile = logfile if filelevel is not None else None
+        self.buffered = buffered
+        self.minLevel = min(windowlevel, filelevel) if self.logFile else windowlevel
+        self.records = []
+        self.startTime = time.time()
+        self.fileStarted = False
+
+    def isenabled(self, level):
+        return level >= self.minLevel
+
+    def log(self, level, message, args=(), title=False):
+        if level < self.minLevel:
+            return
+        self.records.append((level, time.time() - self.startTime, message, args, title))
+        if not self.buffered:
+            self.flush()
+
+    @staticmethod
+    def formatrecord(message, args, title):
+        if args:
+            try:
+                message = message.format(*args)
+            except Exception:
+                message = '{0} {1}'.format(message, args)
+        if title:
+            message = '-' * 100 + '\n' + message + '\n' + '-' * 100
+        return message
+
+    def flush(self):
+        records, self.records = self.records, []
+        windowlines = []
+        filelines = []
+        for level, elapsed, message, args, title in records:
+            text = PyRevitLoaderLog.formatrecord(message, args, title)
+            if level >= self.windowLevel:
+                windowlines.append(text)
+            if self.logFile and level >= self.fileLevel:
+                filelines.append('{0:9.3f} {1:<8}{2}\n'.format(elapsed, self.levelNames[level], text))
+        if filelines:
+            try:
+                # the log file holds the trace of the current session only
+                with open(self.logFile, 'a' if self.fileStarted else 'w') as f:
+                    f.writelines(filelines)
+                self.fileStarted = True
+            except Exception:
+                windowlines.append('Error writing loader log file: {0}'.format(self.logFile))
+        if windowlines:
+            # appending to the output window is slow so all buffered lines are printed at once
+            print('\n'.join(windowlines))
+
+
 class PyRevitUISettings:
     pyRevitAssemblyName = 'pyRevit'
     linkButtonTypeName = 'PushButton'
@@ -79,37 +165,1235 @@ class PyRevitUISettings:
     stackedThreeTypeName = 'Stack3'
     splitButtonTypeName = 'SplitButton'
     tooltipParameter = '__doc__'
+    smartButtonInitParameter = '__selfinit__'
     userSetupKeyword = '__init__'
     reloadScriptsOverrideName = 'Settings_reloadScripts'
     masterTabName = 'master'
+    manifestFileName = 'pyRevitManifest'
+    useManifestCache = True
+    assemblyCacheFolderName = 'pyRevitAssemblyCache'
+    # generated assemblies kept per assembly kind and Revit version, and caps on all cached assemblies together.
+    # assemblies loaded by a running Revit are never removed
+    assemblyCacheSize = 5
+    assemblyCacheMaxBytes = 50 * 1024 * 1024
+    assemblyCacheMaxAgeDays = 30
+    assemblyCacheLockTimeout = 2.0
+    useDispatcherAssembly = False
+    dispatcherTypeNamespace = 'pyRevitDispatch'
+    dispatcherSlotCount = 512
+    dispatcherSlotsDataKey = 'pyRevitDispatchSlots'
+    useIncrementalReload = True
+    ribbonStateDataKey = 'pyRevitRibbonState'
+    ribbonItemsDataKey = 'pyRevitRibbonItems'
+    startupLogFileName = 'pyRevitStartupLog.jsonl'
+    startupLogSize = 50
+    startupLogFileSpans = 25
+    # messages at or above logLevel are printed to the output window, the ones at or above logFileLevel go to the
+    # log file. set logFileLevel to DEBUG for the full trace. it slows the load down since every message is formatted.
+    # Settings > showLoaderLog can also ask for the full trace of the next load only
+    logLevel = PyRevitLoaderLog.INFO
+    logFileLevel = PyRevitLoaderLog.INFO
+    logFileName = 'pyRevitLoaderLog.txt'
+    traceNextLoadDataKey = 'pyRevitTraceNextLoad'
+    bufferLoaderLog = True
+    # icons, tooltips and smart button initialization are done on Revit's Idling event after the ribbon is created
+    deferUIPopulation = True
+    idleSliceBudget = 0.05
+    idleQueueDataKey = 'pyRevitIdleQueue'
+    # commands run through a launcher that puts the script folder on the search paths, so scripts can share
+    # helper modules like _runtimecontext.py. the launcher runs a compiled copy of the script once it is
+    # compiled in idle time
+    useScriptCache = True
+    scriptCacheFolderName = 'pyRevitScriptCache'
+    scriptCacheQueueDataKey = 'pyRevitScriptCacheQueue'
+    # a home directory on a network share is copied to a local folder and the session runs from the local copy.
+    # the folder defaults to pyRevitMirror under the local application data folder of the user
+    useLocalMirror = True
+    mirrorNetworkHomeOnly = True
+    localMirrorFolder = None
+    # script roots that are scanned after the home directory, in order. tabs with the same name are merged, and a
+    # script, or a group in the same panel, in a later root replaces the one with the same name in the earlier roots
+    extensionFolders = [folder for folder in os.getenv('pyRevitExtensions', '').split(os.pathsep) if folder]
+    discoveryThreadCount = 4
+    # watches the script roots and updates the tooltips and icons of changed scripts in place, without a reload
+    useScriptWatcher = False
+    scriptWatcherQuietTime = 0.5
+    scriptWatcherDataKey = 'pyRevitScriptWatcher'
+    # records the selection history of the open projects for the selection Back and Forward buttons. Revit
+    # versions without the SelectionChanged event are polled on Idling at most once per poll interval
+    useSelectionHistory = True
+    selectionHistoryBudget = 16 * 1024 * 1024
+    selectionHistoryPollInterval = 0.5
+    selectionHistoryQuietTime = 5.0
+    selectionHistoryDataKey = 'pyRevitSelectionRecorder'
 
     def __init__(self):
         """Loads settings from settigns file."""
         pass
 
 
-class ButtonIcons:
+class PyRevitManifest:
+    """On-disk record of the script tree: the listings of the script roots and tab folders, and the docstrings read
+    from the scripts, with the stats of the folders and files they were read from. Folders whose mtime has not changed
+    since the last session (no file was added, removed or renamed in them) are not listed again, and scripts whose
+    mtime and size have not changed are not read again. The panels, groups and commands are made from the file names
+    in the listings, which takes no file access."""
+    formatVersion = 2
+
+    def __init__(self, homedir, revitversion, cachedir):
+        settings = PyRevitUISettings()
+        homehash = hashlib.md5(homedir.lower().encode('utf-8')).hexdigest()[:8]
+        self.homeDir = homedir
+        self.revitVersion = str(revitversion)
+        self.manifestFile = op.join(cachedir, '{0}_{1}_{2}.json'.format(settings.manifestFileName,
+                                                                        self.revitVersion,
+                                                                        homehash))
+        self.previousEntries = {}
+        self.entries = {}
+        self.previousFolders = {}
+        self.folders = {}
+        self.hits = 0
+        self.misses = 0
+        self.folderHits = 0
+        self.folderMisses = 0
+        # folders are looked up from the root scan threads
+        self.folderLock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.manifestFile, 'r') as f:
+                manifest = json.load(f)
+            if manifest['version'] == self.formatVersion and manifest['homeDir'] == self.homeDir:
+                self.previousEntries = manifest['files']
+                self.previousFolders = manifest['folders']
+                reportv('Manifest loaded: {0} cached folders, {1} cached files',
+                        len(self.previousFolders), len(self.previousEntries))
+        except Exception:
+            reportv('No usable manifest found. All folders will be listed and all scripts parsed: {0}',
+                    self.manifestFile)
+            self.previousEntries = {}
+            self.previousFolders = {}
+
+    def carryforward(self):
+        """Keeps the recorded data of the scripts that were not looked up in this session, as long as they have not
+        changed. A reload only reads the tooltips of the items it touches, and saving only those would make the next
+        session parse every other script again."""
+        for fullpath, entry in self.previousEntries.items():
+            if fullpath in self.entries:
+                continue
+            try:
+                mtime, size = PyRevitManifest.getfilestamp(fullpath)
+            except OSError:
+                continue
+            if entry['mtime'] == mtime and entry['size'] == size:
+                self.entries[fullpath] = entry
+
+    def save(self):
+        self.carryforward()
+        manifest = {'version': self.formatVersion,
+                    'homeDir': self.homeDir,
+                    'revitVersion': self.revitVersion,
+                    'folders': self.folders,
+                    'files': self.entries}
+        try:
+            with open(self.manifestFile, 'w') as f:
+                json.dump(manifest, f)
+            reportv('Manifest saved: {0} folder hits, {1} listed, {2} file hits, {3} parsed: {4}',
+                    self.folderHits, self.folderMisses, self.hits, self.misses, self.manifestFile)
+        except Exception:
+            reportwarning('Error saving manifest file: {0}', self.manifestFile)
+
+    @staticmethod
+    def getfilestamp(fullpath):
+        stat = os.stat(fullpath)
+        return stat.st_mtime, stat.st_size
+
+    def lookup(self, fullpath):
+        """Returns the recorded data for this file if the file has not changed since it was recorded."""
+        entry = self.previousEntries.get(fullpath)
+        if entry:
+            mtime, size = PyRevitManifest.getfilestamp(fullpath)
+            if entry['mtime'] == mtime and entry['size'] == size:
+                self.entries[fullpath] = entry
+                self.hits += 1
+                return entry['data']
+        self.misses += 1
+        return None
+
+    def record(self, fullpath, data):
+        mtime, size = PyRevitManifest.getfilestamp(fullpath)
+        self.entries[fullpath] = {'mtime': mtime, 'size': size, 'data': data}
+
+    def getlisting(self, folder, lister):
+        """Returns the recorded listing of the folder if its mtime has not changed, or lists it with lister."""
+        # the mtime is read before listing, so a change made while listing is seen by the next session
+        mtime = op.getmtime(folder)
+        entry = self.previousFolders.get(folder)
+        if entry and entry['mtime'] == mtime:
+            with self.folderLock:
+                self.folders[folder] = entry
+                self.folderHits += 1
+            return entry['listing']
+        listing = lister(folder)
+        with self.folderLock:
+            self.folders[folder] = {'mtime': mtime, 'listing': listing}
+            self.folderMisses += 1
+        return listing
+
+
+class PyRevitLocalMirror:
+    """Local copy of a pyRevit home directory that is deployed on a network share.
+    The share holds a manifest with the relative path, size and hash of every deployed file. At startup only the
+    manifest is read from the share, the files that changed since the last startup are copied, and the session runs
+    discovery and the scripts from the local copy. The local copy keeps the manifest it was last updated from."""
+    formatVersion = 1
+    manifestFileName = 'pyRevitMirrorManifest.json'
+    excludedNames = ('.git', '__pycache__')
+    excludedExtensions = ('.pyc', '.pyo')
+
+    def __init__(self, sourcedir, mirrordir):
+        self.sourceDir = sourcedir
+        self.mirrorDir = mirrordir
+        self.manifestFile = op.join(mirrordir, self.manifestFileName)
+        self.copiedFiles = []
+        self.removedFiles = []
+        self.copiedSize = 0
+        self.unchangedCount = 0
+        self.sourceEntries = {}
+
+    @staticmethod
+    def readmanifest(manifestfile):
+        try:
+            with open(manifestfile, 'r') as f:
+                manifest = json.load(f)
+            if manifest['version'] == PyRevitLocalMirror.formatVersion:
+                return manifest
+        except Exception:
+            pass
+        return None
+
+    @staticmethod
+    def findsourcedir(homedir):
+        """Returns the share that this home directory is a local copy of, or None if it is not a local copy.
+        The reload button of a mirrored session runs the loader from the local copy."""
+        manifest = PyRevitLocalMirror.readmanifest(op.join(homedir, PyRevitLocalMirror.manifestFileName))
+        if manifest:
+            return manifest.get('sourceDir')
+        return None
+
+    @staticmethod
+    def gethash(fullpath):
+        filehash = hashlib.md5()
+        with open(fullpath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                filehash.update(chunk)
+        return filehash.hexdigest()
+
+    @staticmethod
+    def buildmanifest(sourcedir):
+        """Writes the manifest of the deployed files to the share. Run it after every deployment."""
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(sourcedir):
+            dirnames[:] = sorted(d for d in dirnames if d not in PyRevitLocalMirror.excludedNames)
+            for fname in sorted(filenames):
+                if fname == PyRevitLocalMirror.manifestFileName \
+                        or op.splitext(fname)[1].lower() in PyRevitLocalMirror.excludedExtensions:
+                    continue
+                fullpath = op.join(dirpath, fname)
+                relpath = op.relpath(fullpath, sourcedir).replace('\\', '/')
+                files[relpath] = {'size': op.getsize(fullpath), 'hash': PyRevitLocalMirror.gethash(fullpath)}
+        manifestfile = op.join(sourcedir, PyRevitLocalMirror.manifestFileName)
+        with open(manifestfile, 'w') as f:
+            json.dump({'version': PyRevitLocalMirror.formatVersion, 'files': files}, f, indent=0, sort_keys=True)
+        return manifestfile, len(files)
+
+    def getlocalpath(self, relpath):
+        return op.join(self.mirrorDir, *relpath.split('/'))
+
+    def iscurrent(self, relpath, entry, localentries):
+        return localentries.get(relpath) == entry and op.isfile(self.getlocalpath(relpath)) \
+            and op.getsize(self.getlocalpath(relpath)) == entry['size']
+
+    def hasmirror(self):
+        return PyRevitLocalMirror.readmanifest(self.manifestFile) is not None
+
+    @staticmethod
+    def isnetworkfolder(folder):
+        """Returns True for a UNC path or a path on a drive letter that is mapped to a share."""
+        if folder.startswith('\\\\'):
+            return True
+        try:
+            return DriveInfo(op.splitdrive(op.abspath(folder))[0] or folder).DriveType == DriveType.Network
+        except Exception:
+            return False
+
+    def findnewerfiles(self, sourceentries):
+        """Returns the files and folders on the share that were written after its manifest, which means the manifest
+        was not built again after a deployment. Each folder of the manifest is listed once with the write times of
+        its files, so the share gets one request per folder instead of one per file."""
+        manifesttime = File.GetLastWriteTimeUtc(op.join(self.sourceDir, self.manifestFileName))
+        newer = []
+        for folder in sorted(set(relpath.rpartition('/')[0] for relpath in sourceentries)):
+            folderinfo = DirectoryInfo(op.join(self.sourceDir, *folder.split('/')) if folder else self.sourceDir)
+            for item in list(folderinfo.GetFiles()) + list(folderinfo.GetDirectories()):
+                if item.Name == self.manifestFileName or item.Name in self.excludedNames \
+                        or op.splitext(item.Name)[1].lower() in self.excludedExtensions:
+                    continue
+                if item.LastWriteTimeUtc > manifesttime:
+                    newer.append('/'.join(x for x in (folder, item.Name) if x))
+        return newer
+
+    def sync(self):
+        """Brings the local copy up to date with the share. Raises an exception if the share manifest can not
+        be read or a file can not be copied. The local manifest is only saved once all changed files are copied."""
+        sourcemanifest = PyRevitLocalMirror.readmanifest(op.join(self.sourceDir, self.manifestFileName))
+        if sourcemanifest is None:
+            raise PyRevitException('No usable mirror manifest on the share. '
+                                   'Build one with _headless/mirrormanifest.py after deploying.')
+        localmanifest = PyRevitLocalMirror.readmanifest(self.manifestFile)
+        localentries = {}
+        if localmanifest and localmanifest.get('sourceDir') == self.sourceDir:
+            localentries = localmanifest['files']
+
+        # all changes are found from the two manifests and local file stats before anything is copied
+        sourceentries = sourcemanifest['files']
+        self.sourceEntries = sourceentries
+        changed = sorted(relpath for relpath, entry in sourceentries.items()
+                         if not self.iscurrent(relpath, entry, localentries))
+        removed = sorted(relpath for relpath in localentries if relpath not in sourceentries)
+        self.unchangedCount = len(sourceentries) - len(changed)
+
+        for relpath in changed:
+            localpath = self.getlocalpath(relpath)
+            if not op.isdir(op.dirname(localpath)):
+                os.makedirs(op.dirname(localpath))
+            shutil.copyfile(op.join(self.sourceDir, *relpath.split('/')), localpath)
+            self.copiedFiles.append(relpath)
+            self.copiedSize += sourceentries[relpath]['size']
+        for relpath in removed:
+            try:
+                os.remove(self.getlocalpath(relpath))
+                self.removedFiles.append(relpath)
+            except OSError:
+                continue
+
+        if changed or removed or localmanifest is None:
+            sourcemanifest['sourceDir'] = self.sourceDir
+            with open(self.manifestFile, 'w') as f:
+                json.dump(sourcemanifest, f, indent=0, sort_keys=True)
+        return self.mirrorDir
+
+
+class PyRevitTimingSpan:
+    def __init__(self, timer, category, name):
+        self.timer = timer
+        self.category = category
+        self.name = name
+        self.startTime = None
+
+    def __enter__(self):
+        self.startTime = time.time()
+        return self
+
+    def __exit__(self, exctype, excvalue, exctraceback):
+        self.timer.addspan(self.category, self.name, time.time() - self.startTime)
+        return False
+
+
+class PyRevitStartupTimer:
+    """Timing spans (phases, tabs, files and docstrings) and counters for one loader session.
+    Each session is appended as one JSON record to a rolling log in the user temp folder."""
+
+    def __init__(self):
+        self.startTime = time.time()
+        self.stopTime = None
+        self.spans = {'phase': [], 'root': [], 'tab': [], 'file': [], 'docstring': [], 'smartbutton': []}
+        self.counters = {}
+
+    def stop(self):
+        # work that is done later in Revit's idle time is recorded as a phase but is not part of the total
+        self.stopTime = time.time()
+
+    def gettotal(self):
+        return (self.stopTime or time.time()) - self.startTime
+
+    def span(self, category, name):
+        return PyRevitTimingSpan(self, category, name)
+
+    def addspan(self, category, name, duration):
+        self.spans[category].append((name, duration))
+
+    def count(self, counter, increment=1):
+        self.counters[counter] = self.counters.get(counter, 0) + increment
+
+    def getrecord(self, session):
+        settings = PyRevitUISettings()
+        slowestfiles = sorted(self.spans['file'], key=lambda x: x[1], reverse=True)[:settings.startupLogFileSpans]
+        slowestdocstrings = sorted(self.spans['docstring'], key=lambda x: x[1],
+                                   reverse=True)[:settings.startupLogFileSpans]
+        return {'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'revitVersion': session.getrevitversionstr(),
+                'homeDir': session.homeDir,
+                'isReload': session.isreloading(),
+                'total': self.gettotal(),
+                'phases': [[name, round(duration, 4)] for name, duration in self.spans['phase']],
+                'roots': [[name, round(duration, 4)] for name, duration in self.spans['root']],
+                'tabs': [[name, round(duration, 4)] for name, duration in self.spans['tab']],
+                'slowestFiles': [[name, round(duration, 4)] for name, duration in slowestfiles],
+                'fileCount': len(self.spans['file']),
+                'slowestDocstrings': [[name, round(duration, 4)] for name, duration in slowestdocstrings],
+                'docstringCount': len(self.spans['docstring']),
+                'smartButtons': [[name, round(duration, 4)] for name, duration in
+                                 sorted(self.spans['smartbutton'], key=lambda x: x[1], reverse=True)],
+                'counters': self.counters}
+
+    def save(self, session):
+        settings = PyRevitUISettings()
+        logfile = op.join(session.userTempFolder, settings.startupLogFileName)
+        try:
+            records = []
+            if op.exists(logfile):
+                with open(logfile, 'r') as f:
+                    records = [line for line in f.readlines() if line.strip()]
+            records.append(json.dumps(self.getrecord(session)) + '\n')
+            with open(logfile, 'w') as f:
+                f.writelines(records[-settings.startupLogSize:])
+            reportv('Startup timing saved to: {0}', logfile)
+        except Exception:
+            reportwarning('Error saving startup timing log: {0}', logfile)
+
+    def report(self):
+        if not isverbose():
+            return
+        reportv('Startup timing:', title=True)
+        for name, duration in self.spans['phase']:
+            reportv('{0:<40} {1:8.3f} s', name, duration)
+        reportv('{0:<40} {1:8.3f} s', 'total', self.gettotal())
+        for name, duration in self.spans['root']:
+            reportv('root scan {0:<30} {1:8.3f} s', name, duration)
+        for counter in sorted(self.counters):
+            reportv('{0:<40} {1}', counter, self.counters[counter])
+        for name, duration in sorted(self.spans['smartbutton'], key=lambda x: x[1], reverse=True):
+            reportv('smart button {0:<27} {1:8.3f} s', name, duration)
+
+
+class PyRevitIconCache:
+    """Process wide cache of decoded button icons keyed by (path, mtime, decode size).
+    Each size is decoded on first request only, and icons shared by many buttons are decoded once."""
+    sessionDataKey = 'pyRevitIconCache'
+    # sizes that ButtonIcons used to decode up front. None is the full size image.
+    iconSizes = (16, 24, None)
+
+    def __init__(self):
+        self.bitmaps = get_session_data(self.sessionDataKey, dict)
+        self.requestCount = 0
+        self.decodeCount = 0
+        self.eagerDecodeCount = 0
+
+    def register(self):
+        self.eagerDecodeCount += len(self.iconSizes)
+
+    def getbitmap(self, iconfile, mtime, size):
+        self.requestCount += 1
+        cachekey = (iconfile.lower(), mtime, size)
+        if cachekey not in self.bitmaps:
+            self.bitmaps[cachekey] = PyRevitIconCache.decode(iconfile, size)
+            self.decodeCount += 1
+            startupTimer.count('iconsDecoded')
+        return self.bitmaps[cachekey]
+
+    def getavoideddecodecount(self):
+        return self.eagerDecodeCount - self.decodeCount
+
+    def getplaceholder(self, size):
+        cachekey = ('placeholder', size)
+        if cachekey not in self.bitmaps:
+            self.bitmaps[cachekey] = PyRevitIconCache.createplaceholder(size)
+        return self.bitmaps[cachekey]
+
+    @staticmethod
+    def createplaceholder(size):
+        # transparent image shown on the ribbon until the actual icon is decoded in idle time
+        stride = size * 4
+        bitmap = BitmapSource.Create(size, size, 96, 96, PixelFormats.Bgra32, None, Array[Byte]([0] * stride * size),
+                                     stride)
+        bitmap.Freeze()
+        return bitmap
+
+    @staticmethod
+    def decode(iconfile, size):
+        bitmap = BitmapImage()
+        bitmap.BeginInit()
+        bitmap.UriSource = Uri(iconfile)
+        bitmap.CacheOption = BitmapCacheOption.OnLoad
+        if size:
+            bitmap.DecodePixelHeight = size
+            bitmap.DecodePixelWidth = size
+        bitmap.EndInit()
+        bitmap.Freeze()
+        return bitmap
+
+
+class PyRevitAssemblyIndex:
+    """Index of the assemblies loaded in this Revit session, keyed by their lower case simple names.
+    The index is built once per Revit session and is kept current by the AppDomain.AssemblyLoad event.
+    Type names of the indexed assemblies are reflected once and cached."""
+    sessionDataKey = 'pyRevitAssemblyIndex'
+    typeNamesDataKey = 'pyRevitAssemblyTypeNames'
+
+    def __init__(self):
+        self.typeNames = get_session_data(self.typeNamesDataKey, dict)
+        self.assemblies = AppDomain.CurrentDomain.GetData(self.sessionDataKey)
+        if self.assemblies is None:
+            assemblies = self.assemblies = {}
+            AppDomain.CurrentDomain.SetData(self.sessionDataKey, assemblies)
+
+            # the handler only touches the shared dictionary so it keeps working after the scripts are reloaded
+            def onassemblyload(sender, args):
+                PyRevitAssemblyIndex.add(assemblies, args.LoadedAssembly)
+
+            AppDomain.CurrentDomain.AssemblyLoad += onassemblyload
+            for loadedAssembly in AppDomain.CurrentDomain.GetAssemblies():
+                PyRevitAssemblyIndex.add(assemblies, loadedAssembly)
+
+    @staticmethod
+    def add(assemblies, assembly):
+        namedassemblies = assemblies.setdefault(assembly.GetName().Name.lower(), [])
+        if assembly not in namedassemblies:
+            namedassemblies.append(assembly)
+
+    def findassembly(self, assemblyname):
+        # the most recently loaded assembly wins if more than one has the same name
+        namedassemblies = self.assemblies.get(assemblyname.lower())
+        return namedassemblies[-1] if namedassemblies else None
+
+    def findassemblies(self, nameprefixes):
+        nameprefixes = tuple(nameprefix.lower() for nameprefix in nameprefixes)
+        return [assembly for name, namedassemblies in sorted(self.assemblies.items()) if name.startswith(nameprefixes)
+                for assembly in namedassemblies]
+
+    def gettypenames(self, assembly):
+        if assembly.FullName not in self.typeNames:
+            self.typeNames[assembly.FullName] = [ct.Name for ct in assembly.GetTypes()]
+            startupTimer.count('assembliesReflected')
+        return self.typeNames[assembly.FullName]
+
+
+class PyRevitIdleQueue:
+    """Ribbon work that is left for Revit's Idling event once the ribbon skeleton is created.
+    Each Idling event runs queued tasks until the slice budget is spent so Revit stays responsive.
+    When deferring is off, tasks run as soon as they are added. Tasks that populate a ribbon item carry its ribbon
+    state key, and the items of failed tasks are invalidated in the ribbon state so the next load populates them."""
+
+    def __init__(self, uiapp, slicebudget, deferred=True, datakey=None):
+        self.uiApp = uiapp
+        self.sliceBudget = slicebudget
+        self.deferred = deferred
+        self.tasks = deque()
+        self.onComplete = None
+        self.subscribed = False
+        self.startTime = None
+        self.busyTime = 0.0
+        self.sliceCount = 0
+        self.taskCount = 0
+        self.failedCount = 0
+        self.ribbonState = None
+        self.invalidKeys = set()
+        # a reload replaces the queue of the previous load, which may still be working
+        datakey = datakey or PyRevitUISettings().idleQueueDataKey
+        previousqueue = AppDomain.CurrentDomain.GetData(datakey)
+        if previousqueue is not None:
+            previousqueue.cancel()
+        AppDomain.CurrentDomain.SetData(datakey, self)
+
+    def add(self, name, task, *args, **kwargs):
+        statekey = kwargs.get('statekey', None)
+        if self.deferred:
+            self.tasks.append((name, task, args, statekey))
+        else:
+            self.runtask(name, task, args, statekey)
+
+    def start(self, oncomplete):
+        self.onComplete = oncomplete
+        self.startTime = time.time()
+        if self.tasks:
+            self.uiApp.Idling += self.onidling
+            self.subscribed = True
+        else:
+            self.complete()
+
+    def runtask(self, name, task, args, statekey):
+        try:
+            task(*args)
+            self.taskCount += 1
+        except Exception:
+            reportwarning('Idle time task failed. Skipping: {0}', name)
+            self.failedCount += 1
+            if statekey:
+                self.invalidate([statekey])
+
+    def setribbonstate(self, ribbonstate):
+        """Sets the ribbon state that the tasks complete, once it is saved for the next load."""
+        self.ribbonState = ribbonstate
+        self.invalidate(list(self.invalidKeys))
+
+    def invalidate(self, statekeys):
+        self.invalidKeys.update(statekeys)
+        if self.ribbonState is not None:
+            for statekey in statekeys:
+                # no ribbon item has this signature, so the next change plan updates the item
+                if statekey in self.ribbonState:
+                    self.ribbonState[statekey] = None
+
+    def onidling(self, sender, args):
+        slicestart = time.time()
+        self.sliceCount += 1
+        while self.tasks:
+            name, task, taskargs, statekey = self.tasks.popleft()
+            self.runtask(name, task, taskargs, statekey)
+            if time.time() - slicestart > self.sliceBudget:
+                break
+        self.busyTime += time.time() - slicestart
+        if self.tasks:
+            # ask Revit to call again right away instead of waiting for the next user input
+            args.SetRaiseWithoutDelay()
+        else:
+            self.complete()
+
+    def complete(self):
+        self.unsubscribe()
+        if self.onComplete:
+            self.onComplete(self)
+
+    def cancel(self):
+        # the items of the tasks that did not run are handed back to the next load through the ribbon state
+        self.invalidate([statekey for name, task, args, statekey in self.tasks if statekey])
+        self.tasks.clear()
+        self.onComplete = None
+        self.unsubscribe()
+
+    def unsubscribe(self):
+        if self.subscribed:
+            self.uiApp.Idling -= self.onidling
+            self.subscribed = False
+
+
+class PyRevitAssemblyCache:
+    """Index of the generated assemblies in the assembly cache folder, shared by all Revit instances of the user.
+    The index records when each assembly was last used and which Revit processes use it. Instances change the index
+    and remove assemblies only while holding the lock file, and never remove an assembly a running Revit uses."""
+    indexFileName = 'pyRevitAssemblyCache.json'
+    lockFileName = 'pyRevitAssemblyCache.lock'
+    # a lock file older than this was left by an instance that stopped while holding it
+    staleLockAge = 30.0
+
+    def __init__(self, cachedir, settings):
+        self.cacheDir = cachedir
+        self.settings = settings
+        self.indexFile = op.join(cachedir, self.indexFileName)
+        self.lockFile = op.join(cachedir, self.lockFileName)
+        self.processId = os.getpid()
+        self.entries = {}
+        self.removedFiles = []
+
+    def acquirelock(self):
+        starttime = time.time()
+        while True:
+            try:
+                lockfd = os.open(self.lockFile, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(lockfd, str(self.processId).encode('utf-8'))
+                os.close(lockfd)
+                return True
+            except OSError:
+                pass
+            try:
+                if time.time() - op.getmtime(self.lockFile) > self.staleLockAge:
+                    reportv('Removing stale assembly cache lock: {0}', self.lockFile)
+                    os.remove(self.lockFile)
+                    continue
+            except OSError:
+                continue
+            if time.time() - starttime > self.settings.assemblyCacheLockTimeout:
+                return False
+            time.sleep(0.05)
+
+    def releaselock(self):
+        try:
+            os.remove(self.lockFile)
+        except OSError:
+            reportwarning('Error removing assembly cache lock: {0}', self.lockFile)
+
+    @staticmethod
+    def isrevitrunning(processid):
+        try:
+            return 'revit' in Process.GetProcessById(processid).ProcessName.lower()
+        except Exception:
+            return False
+
+    @staticmethod
+    def getassemblykind(dllname):
+        # pyRevit2016_<hash>.dll and pyRevitDispatch2016_<slots>_<hash>.dll are kept separately
+        return dllname.split('_')[0]
+
+    def loadindex(self):
+        try:
+            with open(self.indexFile, 'r') as f:
+                self.entries = json.load(f)
+        except Exception:
+            self.entries = {}
+        # assemblies that are not in the index yet, like the ones saved before the index existed
+        for dllname in os.listdir(self.cacheDir):
+            if dllname.lower().endswith('.dll') and dllname not in self.entries:
+                fullpath = op.join(self.cacheDir, dllname)
+                self.entries[dllname] = {'lastUsed': op.getmtime(fullpath), 'size': op.getsize(fullpath), 'users': []}
+        for dllname in list(self.entries):
+            if not op.exists(op.join(self.cacheDir, dllname)):
+                del self.entries[dllname]
+
+    def saveindex(self):
+        with open(self.indexFile, 'w') as f:
+            json.dump(self.entries, f, indent=0, sort_keys=True)
+
+    def markused(self, dllname):
+        fullpath = op.join(self.cacheDir, dllname)
+        entry = self.entries.setdefault(dllname, {'users': []})
+        entry['lastUsed'] = time.time()
+        entry['size'] = op.getsize(fullpath)
+        if self.processId not in entry['users']:
+            entry['users'].append(self.processId)
+
+    def getevictions(self):
+        """Returns the assemblies to remove, least recently used first out of the caps."""
+        now = time.time()
+        kindcounts = {}
+        totalsize = 0
+        evictions = []
+        for dllname in sorted(self.entries, key=lambda x: self.entries[x]['lastUsed'], reverse=True):
+            entry = self.entries[dllname]
+            # users are Revit processes that loaded the assembly. the ones that exited are dropped
+            entry['users'] = [pid for pid in entry['users']
+                              if pid == self.processId or PyRevitAssemblyCache.isrevitrunning(pid)]
+            kind = PyRevitAssemblyCache.getassemblykind(dllname)
+            kindcounts[kind] = kindcounts.get(kind, 0) + 1
+            totalsize += entry['size']
+            if entry['users']:
+                continue
+            if kindcounts[kind] > self.settings.assemblyCacheSize \
+                    or totalsize > self.settings.assemblyCacheMaxBytes \
+                    or now - entry['lastUsed'] > self.settings.assemblyCacheMaxAgeDays * 86400:
+                evictions.append(dllname)
+                kindcounts[kind] -= 1
+                totalsize -= entry['size']
+        return evictions
+
+    def use(self, dllname, build):
+        """Returns the path of the assembly, built with build(filename) unless the cache has it. Records that this
+        Revit uses the assembly and removes the assemblies that are out of the caps. All of it is done under the lock,
+        so another instance can not remove the assembly before this one loads it. When another instance holds the lock
+        for longer than the lock timeout, nothing is removed, and both instances may build the same assembly."""
+        dllpath = op.join(self.cacheDir, dllname)
+        if not self.acquirelock():
+            reportwarning('Assembly cache is locked by another Revit instance. Skipping DLL cleanup.')
+            self.buildmissing(dllname, build)
+            return dllpath
+        try:
+            self.buildmissing(dllname, build)
+            self.update(dllname)
+        finally:
+            self.releaselock()
+        return dllpath
+
+    def buildmissing(self, dllname, build):
+        """Builds the assembly under a name of its own and moves it into place, so an instance that builds without
+        the lock never saves over, or loads, a file another instance is still writing."""
+        dllpath = op.join(self.cacheDir, dllname)
+        if op.exists(dllpath):
+            reportv('Reusing existing assembly: {0}', dllpath)
+            return
+        # not a .dll, so loadindex does not take a file that is being written for a cached assembly
+        tempname = '{0}.{1}.tmp'.format(dllname, self.processId)
+        temppath = op.join(self.cacheDir, tempname)
+        try:
+            build(tempname)
+            try:
+                os.rename(temppath, dllpath)
+            except OSError:
+                # another instance moved the same assembly into place first
+                if not op.exists(dllpath):
+                    raise
+                reportv('Assembly was built by another Revit instance. Reusing: {0}', dllpath)
+        finally:
+            if op.exists(temppath):
+                try:
+                    os.remove(temppath)
+                except OSError:
+                    reportwarning('Error removing temporary assembly: {0}', temppath)
+
+    def update(self, dllname):
+        """Records the use of the assembly in the index and removes the assemblies that are out of the caps.
+        Only call with the lock held."""
+        try:
+            self.loadindex()
+            self.markused(dllname)
+            for evicted in self.getevictions():
+                try:
+                    os.remove(op.join(self.cacheDir, evicted))
+                    del self.entries[evicted]
+                    self.removedFiles.append(evicted)
+                    reportv('Least recently used .Dll Removed: {0}', evicted)
+                except OSError:
+                    # loaded by a Revit that did not record itself as a user
+                    reportv('Assembly is in use. Keeping: {0}', evicted)
+            self.saveindex()
+        except Exception:
+            reportwarning('Error updating the assembly cache index: {0}', self.indexFile)
+
+
+class PyRevitScriptWatcher:
+    """Watches the tab folders of the script roots for changed scripts and icons while Revit runs.
+    File system events arrive on worker threads and are collected until no event has come in for the quiet time.
+    The collected paths are then handed to onchange on Revit's Idling event, where the ribbon can be changed."""
+    watchedExtensions = ('.py', '.png')
+
+    def __init__(self, uiapp, rootdirs, quiettime, onchange, datakey):
+        self.uiApp = uiapp
+        self.quietTime = quiettime
+        self.onChange = onchange
+        self.rootDirs = set(op.normcase(rootdir) for rootdir in rootdirs)
+        self.pendingPaths = set()
+        self.lastEventTime = 0.0
+        self.lock = threading.Lock()
+        self.subscribed = False
+        # a reload replaces the watcher of the previous load
+        PyRevitScriptWatcher.stopprevious(datakey)
+        AppDomain.CurrentDomain.SetData(datakey, self)
+        self.watchers = []
+        for rootdir in rootdirs:
+            watcher = FileSystemWatcher(rootdir)
+            watcher.IncludeSubdirectories = True
+            watcher.NotifyFilter = NotifyFilters.LastWrite | NotifyFilters.FileName
+            watcher.Changed += self.onfileevent
+            watcher.Created += self.onfileevent
+            watcher.Deleted += self.onfileevent
+            watcher.Renamed += self.onfileevent
+            self.watchers.append(watcher)
+
+    @staticmethod
+    def stopprevious(datakey):
+        previouswatcher = AppDomain.CurrentDomain.GetData(datakey)
+        if previouswatcher is not None:
+            previouswatcher.stop()
+            AppDomain.CurrentDomain.SetData(datakey, None)
+
+    def start(self):
+        for watcher in self.watchers:
+            watcher.EnableRaisingEvents = True
+        self.uiApp.Idling += self.onidling
+        self.subscribed = True
+
+    def iswatched(self, fullpath):
+        # only scripts and icons directly in a tab folder. helper modules starting with _ are imported by the
+        # scripts when they run and do not need any ribbon changes
+        fname, fext = op.splitext(op.basename(fullpath))
+        tabdir = op.dirname(fullpath)
+        return fext.lower() in self.watchedExtensions and not fname.startswith('_') \
+            and '_' not in op.basename(tabdir) and op.normcase(op.dirname(tabdir)) in self.rootDirs
+
+    def onfileevent(self, sender, args):
+        # called on a worker thread. renames report both the old and the new path
+        fullpaths = [args.FullPath, getattr(args, 'OldFullPath', None)]
+        with self.lock:
+            for fullpath in fullpaths:
+                if fullpath and self.iswatched(fullpath):
+                    self.pendingPaths.add(fullpath)
+                    self.lastEventTime = time.time()
+
+    def onidling(self, sender, args):
+        if not self.pendingPaths or time.time() - self.lastEventTime < self.quietTime:
+            return
+        with self.lock:
+            changedpaths = sorted(self.pendingPaths)
+            self.pendingPaths = set()
+        try:
+            self.onChange(changedpaths)
+        except Exception:
+            reportwarning('Error applying script changes. Skipping: {0}', ', '.join(changedpaths))
+
+    def stop(self):
+        for watcher in self.watchers:
+            watcher.EnableRaisingEvents = False
+            watcher.Dispose()
+        self.watchers = []
+        if self.subscribed:
+            self.uiApp.Idling -= self.onidling
+            self.subscribed = False
+
+
+class PyRevitSelectionRecorder:
+    """Records the selection of the active project into its selection history on Revit's Idling event.
+    The histories are kept by the _selectionhistory helper module next to the scripts, which the Back and Forward
+    buttons use too. A history is written to the cache folder of its project once its selection has not changed for the
+    quiet time, so the files are not rewritten while the user is still selecting. Histories are only written when the
+    project cache lock is free right away, and are tried again on the next Idling event otherwise."""
+
+    def __init__(self, uiapp, settings):
+        import _selectionhistory
+        import _selectionmemory
+        self.uiApp = uiapp
+        self.settings = settings
+        self.historyModule = _selectionhistory
+        self.memoryModule = _selectionmemory
+        # Revit 2023 and newer report selection changes, older versions are polled
+        self.hasSelectionEvent = hasattr(uiapp, 'SelectionChanged')
+        self.selectionChanged = True
+        self.lastPollTime = 0.0
+        self.lastSignature = None
+        self.errorReported = False
+        # histories changed under the recorder of the previous load are saved after the quiet time too
+        self.lastChangeTime = time.time()
+        self.subscribed = False
+        PyRevitSelectionRecorder.stopprevious(settings.selectionHistoryDataKey)
+        AppDomain.CurrentDomain.SetData(settings.selectionHistoryDataKey, self)
+
+    @staticmethod
+    def stopprevious(datakey):
+        previousrecorder = AppDomain.CurrentDomain.GetData(datakey)
+        if previousrecorder is not None:
+            previousrecorder.stop()
+            AppDomain.CurrentDomain.SetData(datakey, None)
+
+    def start(self):
+        self.uiApp.Idling += self.onidling
+        if self.hasSelectionEvent:
+            self.uiApp.SelectionChanged += self.onselectionchanged
+        self.subscribed = True
+
+    def onselectionchanged(self, sender, args):
+        self.selectionChanged = True
+
+    def onidling(self, sender, args):
+        now = time.time()
+        if self.hasSelectionEvent:
+            polling = self.selectionChanged
+        else:
+            polling = now - self.lastPollTime >= self.settings.selectionHistoryPollInterval
+        try:
+            if polling:
+                self.lastPollTime = now
+                self.selectionChanged = False
+                self.recordselection(now)
+            # the lock is not waited for on the UI thread. the histories that were not written stay changed
+            if self.lastChangeTime and now - self.lastChangeTime >= self.settings.selectionHistoryQuietTime \
+                    and self.historyModule.savehistories(0):
+                self.lastChangeTime = 0.0
+            self.errorReported = False
+        except Exception as err:
+            # transient errors, like a document that is closing, only skip this tick. repeats are not logged
+            self.selectionChanged = True
+            if not self.errorReported:
+                reportwarning('Error recording the selection history. Trying again: {0}', err)
+                loaderLog.flush()
+                self.errorReported = True
+
+    def recordselection(self, now):
+        uidoc = self.uiApp.ActiveUIDocument
+        if uidoc is None:
+            return
+        doc = uidoc.Document
+        elementids = uidoc.Selection.GetElementIds()
+        # the id set is only built when the selection looks different from the one seen last
+        signature = (doc.PathName, doc.Title, self.memoryModule.getselectionsignature(elementids))
+        if signature == self.lastSignature:
+            return
+        history = self.historyModule.gethistory(doc, self.settings.selectionHistoryBudget)
+        if history.record(self.memoryModule.toidset(elementids)):
+            self.lastChangeTime = now
+        self.lastSignature = signature
+
+    def stop(self):
+        if self.subscribed:
+            self.uiApp.Idling -= self.onidling
+            if self.hasSelectionEvent:
+                self.uiApp.SelectionChanged -= self.onselectionchanged
+            self.subscribed = False
+
+
+class PyRevitScriptCache:
+    """Compiled copies of the command scripts, keyed by script path, modification time and engine version.
+    Commands run a small launcher script from the cache folder. The launcher imports the compiled copy of its
+    script when there is one for the current version of the script and engine, and runs the script itself
+    otherwise, so a script edit takes effect right away and the click never waits for a compile."""
+    compiledPrefix = 'pyRevitScript'
+    launcherPrefix = 'pyRevitLaunch'
+    # part of the launcher file names, so launchers written from an older template are not reused
+    launcherVersion = 4
+    indexFileName = 'pyRevitScriptCache.json'
+    # the launchers record how long each click took, for Settings > compareScriptCacheTimes
+    timesDataKey = 'pyRevitScriptTimes'
+    timesPerScript = 10
+    # scripts that use these names depend on running as the main script from their own file. pickle records the
+    # module name of the pickled classes, which differs between the compiled copies of a script
+    sourceOnlyNames = ('__file__', '__name__', '__message__', '__result__', 'pickle')
+    launcherTemplate = """# pyRevit launcher for {scriptpath}
+# generated by the pyRevit loader. runs the compiled copy of the script when it is current.
+import sys
+import time as _time
+import os.path as op
+from System import AppDomain as _AppDomain
+_starttime = _time.time()
+_scriptpath = {scriptpath!r}
+# scripts can import the helper modules that sit next to them
+if op.dirname(_scriptpath) not in sys.path:
+    sys.path.append(op.dirname(_scriptpath))
+_compiledname = '{compiledprefix}_{scriptkey}_{{0}}_{{1}}'.format(int(op.getmtime(_scriptpath)),
+                                                          ''.join(str(x) for x in sys.version_info[:3]))
+_compiledfile = op.join({cachedir!r}, _compiledname + '.dll')
+_compiled = op.exists(_compiledfile)
+try:
+    if _compiled:
+        import clr
+        import __builtin__
+        # the compiled module has its own globals. the variables set up for the script are lent to it through
+        # builtins while its body runs, and are then set on the module for the functions it leaves behind
+        _names = [n for n in globals() if n.startswith('__') and n not in ('__builtins__', '__builtin__', '__name__',
+                                                                           '__doc__', '__file__')]
+        _shadowed = dict((n, getattr(__builtin__, n)) for n in _names if hasattr(__builtin__, n))
+        for _name in _names:
+            setattr(__builtin__, _name, globals()[_name])
+        try:
+            clr.AddReferenceToFileAndPath(_compiledfile)
+            sys.modules.pop(_compiledname, None)
+            _module = __import__(_compiledname)
+        finally:
+            # later commands and modules must not see the variables of this command
+            for _name in _names:
+                if _name in _shadowed:
+                    setattr(__builtin__, _name, _shadowed[_name])
+                else:
+                    delattr(__builtin__, _name)
+        for _name in _names:
+            setattr(_module, _name, globals()[_name])
+    else:
+        __file__ = _scriptpath
+        execfile(_scriptpath)
+finally:
+    # the first click of the session and the latest ones are kept
+    _times = _AppDomain.CurrentDomain.GetData({timesdatakey!r})
+    if _times is None:
+        _times = {{}}
+        _AppDomain.CurrentDomain.SetData({timesdatakey!r}, _times)
+    _runs = _times.setdefault(_scriptpath, [])
+    _runs.append((_compiled, _time.time() - _starttime))
+    if len(_runs) > {timesperscript}:
+        del _runs[1]
+"""
+
+    def __init__(self, cachedir):
+        self.cacheDir = cachedir
+        if not op.exists(cachedir):
+            os.makedirs(cachedir)
+        self.indexFile = op.join(cachedir, self.indexFileName)
+        self.index = {}
+        self.compileTime = 0.0
+        self.compiledCount = 0
+        self.sourceOnlyCount = 0
+
+    @staticmethod
+    def getscriptkey(scriptpath):
+        return hashlib.md5(op.normcase(scriptpath).encode('utf-8')).hexdigest()[:12]
+
+    @staticmethod
+    def getengineversion():
+        return ''.join(str(x) for x in sys.version_info[:3])
+
+    def getcompiledname(self, scriptpath):
+        return '{0}_{1}_{2}_{3}'.format(self.compiledPrefix, PyRevitScriptCache.getscriptkey(scriptpath),
+                                        int(op.getmtime(scriptpath)), PyRevitScriptCache.getengineversion())
+
+    def getlauncher(self, scriptpath):
+        scriptkey = PyRevitScriptCache.getscriptkey(scriptpath)
+        launchername = '{0}{1}_{2}.py'.format(self.launcherPrefix, self.launcherVersion, scriptkey)
+        launcherpath = op.join(self.cacheDir, launchername)
+        # the launcher only depends on the script path, so it is written once
+        if not op.exists(launcherpath):
+            with open(launcherpath, 'w') as f:
+                f.write(self.launcherTemplate.format(scriptpath=scriptpath, scriptkey=scriptkey,
+                                                     compiledprefix=self.compiledPrefix, cachedir=self.cacheDir,
+                                                     timesdatakey=self.timesDataKey,
+                                                     timesperscript=self.timesPerScript))
+        return launcherpath
+
+    def compile(self, scriptpath):
+        compiledname = self.getcompiledname(scriptpath)
+        compiledfile = op.join(self.cacheDir, compiledname + '.dll')
+        starttime = time.time()
+        with open(scriptpath, 'r') as f:
+            source = f.read()
+        # checked before reusing a compiled copy, so copies made before a name was added here are not run
+        if any(name in source for name in self.sourceOnlyNames):
+            self.sourceOnlyCount += 1
+            return
+        if op.exists(compiledfile):
+            self.index[scriptpath] = compiledfile
+            return
+        # the copy gives the compiled module a name that no script folder on the search paths can shadow
+        sourcecopy = op.join(self.cacheDir, compiledname + '.py')
+        with open(sourcecopy, 'w') as f:
+            f.write(source)
+        try:
+            clr.CompileModules(compiledfile, sourcecopy)
+        finally:
+            os.remove(sourcecopy)
+        self.index[scriptpath] = compiledfile
+        self.compiledCount += 1
+        self.compileTime += time.time() - starttime
+        startupTimer.count('scriptsCompiled')
+
+    def removestale(self, scriptpaths):
+        # compiled copies of older versions of these scripts. copies loaded in this Revit session are locked
+        scriptkeys = set(PyRevitScriptCache.getscriptkey(scriptpath) for scriptpath in scriptpaths)
+        current = set(op.basename(f) for f in self.index.values())
+        for f in os.listdir(self.cacheDir):
+            namepieces = f.split('_')
+            if f.endswith('.dll') and len(namepieces) == 4 and namepieces[0] == self.compiledPrefix \
+                    and namepieces[1] in scriptkeys and f not in current:
+                try:
+                    os.remove(op.join(self.cacheDir, f))
+                except OSError:
+                    continue
+
+    def readlauncherscript(self, launcherpath):
+        # the first line of the launcher names its script
+        header = self.launcherTemplate.split('{scriptpath}')[0]
+        try:
+            with open(launcherpath, 'r') as f:
+                firstline = f.readline().rstrip('\r\n')
+        except (IOError, OSError):
+            return None
+        return firstline[len(header):] if firstline.startswith(header) else None
+
+    def removeorphans(self):
+        """Removes the launchers and compiled copies of scripts that do not exist anymore. The cache folder is
+        shared by all Revit instances of the user, so scripts are only dropped once they are gone from the disk."""
+        cachefiles = os.listdir(self.cacheDir)
+        livekeys = set()
+        orphans = []
+        for f in cachefiles:
+            if f.startswith(self.launcherPrefix) and f.endswith('.py'):
+                scriptpath = self.readlauncherscript(op.join(self.cacheDir, f))
+                if scriptpath is None:
+                    continue
+                scriptkey = op.splitext(f)[0].split('_')[-1]
+                if op.exists(scriptpath):
+                    livekeys.add(scriptkey)
+                else:
+                    orphans.append(f)
+        for f in cachefiles:
+            namepieces = f.split('_')
+            if f.endswith('.dll') and len(namepieces) == 4 and namepieces[0] == self.compiledPrefix \
+                    and namepieces[1] not in livekeys:
+                orphans.append(f)
+        removedcount = 0
+        for f in orphans:
+            try:
+                os.remove(op.join(self.cacheDir, f))
+                removedcount += 1
+            except OSError:
+                continue
+        return removedcount
+
+    def save(self):
+        try:
+            with open(self.indexFile, 'w') as f:
+                json.dump(self.index, f, indent=0)
+        except Exception:
+            reportwarning('Error saving script cache index: {0}', self.indexFile)
+
+
+class ButtonIcons(object):
     def __init__(self, filedir, filename):
-        uri = Uri(op.join(filedir, filename))
-        self.smallBitmap = BitmapImage()
-        self.smallBitmap.BeginInit()
-        self.smallBitmap.UriSource = uri
-        self.smallBitmap.CacheOption = BitmapCacheOption.OnLoad
-        self.smallBitmap.DecodePixelHeight = 16
-        self.smallBitmap.DecodePixelWidth = 16
-        self.smallBitmap.EndInit()
-        self.mediumBitmap = BitmapImage()
-        self.mediumBitmap.BeginInit()
-        self.mediumBitmap.UriSource = uri
-        self.mediumBitmap.CacheOption = BitmapCacheOption.OnLoad
-        self.mediumBitmap.DecodePixelHeight = 24
-        self.mediumBitmap.DecodePixelWidth = 24
-        self.mediumBitmap.EndInit()
-        self.largeBitmap = BitmapImage()
-        self.largeBitmap.BeginInit()
-        self.largeBitmap.UriSource = uri
-        self.largeBitmap.CacheOption = BitmapCacheOption.OnLoad
-        self.largeBitmap.EndInit()
+        self.iconFile = op.join(filedir, filename)
+        self.iconFileTime = None
+        iconCache.register()
+
+    def getbitmap(self, size):
+        if self.iconFileTime is None:
+            self.iconFileTime = op.getmtime(self.iconFile)
+        return iconCache.getbitmap(self.iconFile, self.iconFileTime, size)
+
+    @property
+    def smallBitmap(self):
+        return self.getbitmap(16)
+
+    @property
+    def mediumBitmap(self):
+        return self.getbitmap(24)
+
+    @property
+    def largeBitmap(self):
+        return self.getbitmap(None)
+
+
+class PyRevitRootScan:
+    """File listing of the tab folders under one script root. Only the file system is touched, so the roots
+    are scanned on worker threads and the script tree is built from the listings on the loader thread."""
+
+    def __init__(self, rootdir, manifest=None):
+        self.rootDir = rootdir
+        self.manifest = manifest
+        self.tabs = []
+        self.fileCount = 0
+        self.scanTime = 0.0
+        self.error = None
+
+    def scan(self):
+        starttime = time.time()
+        try:
+            for dirname in self.getlisting(self.rootDir, PyRevitRootScan.listtabfolders):
+                tabdir = op.join(self.rootDir, dirname)
+                scriptfiles, descriptorfiles, iconfiles = self.getlisting(tabdir, PyRevitUISession.scantabfolder)
+                self.fileCount += len(scriptfiles) + len(descriptorfiles) + len(iconfiles)
+                self.tabs.append((dirname, tabdir, scriptfiles, descriptorfiles, iconfiles))
+        except Exception as err:
+            self.error = err
+        self.scanTime = time.time() - starttime
+
+    def getlisting(self, folder, lister):
+        if self.manifest is None:
+            return lister(folder)
+        return self.manifest.getlisting(folder, lister)
+
+    @staticmethod
+    def listtabfolders(rootdir):
+        return [dirname for dirname in sorted(os.listdir(rootdir))
+                if op.isdir(op.join(rootdir, dirname)) and ('_' not in dirname)]
+
+    @staticmethod
+    def scanall(rootdirs, threadcount, manifest=None):
+        """Scans the roots on up to threadcount threads and returns the scans in the order of the roots."""
+        rootscans = [PyRevitRootScan(rootdir, manifest) for rootdir in rootdirs]
+        if len(rootscans) < 2 or threadcount < 2:
+            for rootscan in rootscans:
+                rootscan.scan()
+            return rootscans
+
+        pending = deque(rootscans)
+
+        def scanpending():
+            while True:
+                try:
+                    rootscan = pending.popleft()
+                except IndexError:
+                    return
+                rootscan.scan()
+
+        workers = [threading.Thread(target=scanpending) for i in range(min(threadcount, len(rootscans)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return rootscans
 
 
 class ScriptTab:
@@ -123,7 +1407,7 @@ class ScriptTab:
     def adoptpanels(self, pyrevitscriptpanels):
         for panel in pyrevitscriptpanels:
             if panel.tabName == self.tabName:
-                reportv('\tcontains: {0}'.format(panel.panelName))
+                reportv('\tcontains: {0}', panel.panelName)
                 self.scriptPanels.append(panel)
 
     def getsortedscriptpanels(self):
@@ -153,7 +1437,7 @@ class ScriptPanel:
             if namepieceslength == 4 or namepieceslength == 6:
                 self.panelOrder, self.panelName = namepieces[0:2]
                 self.panelOrder = int(self.panelOrder[:2])
-                reportv('Panel found: Type: {0}'.format(self.panelName.ljust(20)))
+                reportv('Panel found: Type: {0:<20}', self.panelName)
             else:
                 raise UnknownFileNameFormat()
         else:
@@ -163,11 +1447,10 @@ class ScriptPanel:
     def isdescriptorfile(fname, fext):
         return '.png' == fext.lower() and fname[0].isdigit()
 
-    def adoptgroups(self, pyrevitscriptgroups):
-        for group in pyrevitscriptgroups:
-            if group.panelName == self.panelName and group.tabName == self.tabName:
-                reportv('\tcontains: {0}'.format(group.groupName))
-                self.scriptGroups.append(group)
+    def adoptgroups(self, pyrevitscriptgroupsindex):
+        for group in pyrevitscriptgroupsindex.get((self.tabName, self.panelName), []):
+            reportv('\tcontains: {0}', group.groupName)
+            self.scriptGroups.append(group)
 
     def getsortedscriptgroups(self):
         return sorted(self.scriptGroups, key=lambda x: x.groupOrder)
@@ -201,30 +1484,31 @@ class ScriptGroup:
             if namepieceslength == 4 or namepieceslength == 6:
                 self.groupOrder, self.panelName, self.groupType, self.groupName = namepieces[0:4]
                 self.groupOrder = int(self.groupOrder[2:])
-                reportv('Script group found: Type: {0}  Name: {1} Parent Panel: {2}'.format(self.groupType.ljust(20),
-                                                                                            self.groupName.ljust(20),
-                                                                                            self.panelName))
+                reportv('Script group found: Type: {0:<20}  Name: {1:<20} Parent Panel: {2}',
+                        self.groupType, self.groupName, self.panelName)
                 self.buttonIcons = ButtonIcons(filedir, f)
             # check to see if name has assembly information
             if len(namepieces) == 6:
                 self.assemblyName, self.assemblyClassName = namepieces[4:]
                 try:
-                    self.assemblyName = ScriptGroup.findassembly(self.assemblyName).GetName().Name
-                    self.assemblyLocation = ScriptGroup.findassembly(self.assemblyName).Location
-                    reportv('                    Assembly.Class: {0}.{1}'.format(self.assemblyName,
-                                                                                 self.assemblyClassName))
+                    linkedassembly = ScriptGroup.findassembly(self.assemblyName)
+                    self.assemblyName = linkedassembly.GetName().Name
+                    self.assemblyLocation = linkedassembly.Location
+                    reportv('                    Assembly.Class: {0}.{1}', self.assemblyName, self.assemblyClassName)
                 except UnknownAssembly:
                     raise
         else:
             raise UnknownFileNameFormat()
 
-    def adoptcommands(self, pyrevitscriptcommands):
+    def adoptcommands(self, pyrevitscriptcommandsindex):
         settings = PyRevitUISettings()
-        for cmd in pyrevitscriptcommands:
-            if cmd.scriptGroupName == self.groupName:
-                if cmd.tabName == self.tabName or cmd.tabName == settings.masterTabName:
-                    reportv('\tcontains: {0}'.format(cmd.fileName))
-                    self.commands.append(cmd)
+        tabnames = [settings.masterTabName]
+        if self.tabName != settings.masterTabName:
+            tabnames.append(self.tabName)
+        for tabname in tabnames:
+            for cmd in pyrevitscriptcommandsindex.get((tabname, self.groupName), []):
+                reportv('\tcontains: {0}', cmd.fileName)
+                self.commands.append(cmd)
 
     def islinkbutton(self):
         return self.assemblyName is not None
@@ -235,17 +1519,20 @@ class ScriptGroup:
 
     @staticmethod
     def findassembly(assemblyname):
-        for loadedAssembly in AppDomain.CurrentDomain.GetAssemblies():
-            if assemblyname in loadedAssembly.FullName:
-                return loadedAssembly
-        raise UnknownAssembly()
+        loadedassembly = assemblyIndex.findassembly(assemblyname)
+        if loadedassembly is None:
+            raise UnknownAssembly()
+        return loadedassembly
 
 
 class ScriptCommand:
-    def __init__(self, filedir, f, tabname):
+    def __init__(self, filedir, f, tabname, manifest=None, iconfiles=None):
         self.filePath = ''
         self.fileName = ''
         self.tooltip = ''
+        self.docstring = None
+        self.docstringResolved = False
+        self.manifest = manifest
         self.cmdName = ''
         self.scriptGroupName = ''
         self.className = ''
@@ -264,19 +1551,17 @@ class ScriptCommand:
             self.filePath = filedir
             self.fileName = f
             self.tooltip = fname + ' ' + fext.lower()
-            docstring = ScriptCommand.extractparameter(settings.tooltipParameter, self.getfullscriptaddress())
-            if docstring is not None:
-                self.tooltip = self.tooltip + '\n' + docstring
             namepieces = fname.rsplit('_')
             namepieceslength = len(namepieces)
             if namepieceslength == 2:
                 self.scriptGroupName, self.cmdName = namepieces
                 self.className = tabname + self.scriptGroupName + self.cmdName
-                reportv('Script found: {0} Group: {1} CommandName: {2}'.format(f.ljust(50),
-                                                                               self.scriptGroupName.ljust(20),
-                                                                               self.cmdName))
-                if op.exists(op.join(filedir, fname + '.png')):
+                reportv('Script found: {0:<50} Group: {1:<20} CommandName: {2}', f, self.scriptGroupName, self.cmdName)
+                if iconfiles is not None:
+                    self.iconFileName = iconfiles.get((fname + '.png').lower())
+                elif op.exists(op.join(filedir, fname + '.png')):
                     self.iconFileName = fname + '.png'
+                if self.iconFileName:
                     self.buttonIcons = ButtonIcons(filedir, self.iconFileName)
                 else:
                     self.iconFileName = None
@@ -292,72 +1577,315 @@ class ScriptCommand:
     def getscriptbasename(self):
         return self.scriptGroupName + '_' + self.cmdName
 
+    def getdocstring(self):
+        """Reads the docstring on first request only. Tooltips are not needed until the ribbon item is built."""
+        if not self.docstringResolved:
+            settings = PyRevitUISettings()
+            scriptaddress = self.getfullscriptaddress()
+            cached = self.manifest.lookup(scriptaddress) if self.manifest else None
+            if cached is not None:
+                self.docstring = cached['docstring']
+            else:
+                # the command was already timed as a file when it was found. reading the docstring is timed apart
+                with startupTimer.span('docstring', scriptaddress):
+                    self.docstring = ScriptCommand.extractparameter(settings.tooltipParameter, scriptaddress)
+                startupTimer.count('scriptsParsed')
+                if self.manifest:
+                    self.manifest.record(scriptaddress, {'docstring': self.docstring})
+            self.docstringResolved = True
+        return self.docstring
+
+    def gettooltip(self):
+        docstring = self.getdocstring()
+        if docstring is not None:
+            return self.tooltip + '\n' + docstring
+        return self.tooltip
+
+    # memoized parameter values keyed by (parameter, script path, mtime)
+    parameterCache = {}
+
     @staticmethod
     def extractparameter(param, fileaddress):
-        finder = re.compile(param + '\s*=\s*\'*\"*(.+?)[\'\"]', flags=re.DOTALL | re.IGNORECASE)
+        cachekey = (param, fileaddress, op.getmtime(fileaddress))
+        if cachekey not in ScriptCommand.parameterCache:
+            ScriptCommand.parameterCache[cachekey] = ScriptCommand.readheaderparameter(param, fileaddress)
+        return ScriptCommand.parameterCache[cachekey]
+
+    @staticmethod
+    def readheaderparameter(param, fileaddress):
+        """Tokenizes the script only up to the first top level assignment to param and returns its literal value.
+        Reading stops at the first top level def or class since parameters are expected in the script header."""
         with open(fileaddress, 'r') as f:
-            values = finder.findall(f.read())
-            if values:
-                return values[0].replace('\\n', '\n')
-            else:
+            try:
+                tokens = tokenize.generate_tokens(f.readline)
+                previous = []
+                for token in tokens:
+                    toktype, tokstring, tokstart = token[0], token[1], token[2]
+                    if toktype == tokenize.NAME and tokstart[1] == 0 and tokstring in ('def', 'class'):
+                        return None
+                    if toktype in (tokenize.NL, tokenize.COMMENT):
+                        continue
+                    if len(previous) == 2 and previous[0][1] == param and previous[1][1] == '=' \
+                            and previous[0][2][1] == 0:
+                        literal = []
+                        while toktype in (tokenize.STRING, tokenize.NL) or tokstring in ('(', ')'):
+                            if toktype == tokenize.STRING:
+                                literal.append(tokstring)
+                            toktype, tokstring = next(tokens)[0:2]
+                        return ast.literal_eval(' '.join(literal)) if literal else None
+                    previous = (previous + [token])[-2:]
+            except (tokenize.TokenError, SyntaxError, ValueError):
                 return None
+        return None
+
+
+class PyRevitUIChangePlan:
+    """Difference between the ribbon items built by the previous session and the ones this session needs.
+    Items are keyed by tab/panel/item name and compared by a signature string. A session without a previous
+    state (first load in this Revit session) gets a full plan that creates or updates everything."""
+
+    def __init__(self, previousstate, currentstate):
+        self.isFull = previousstate is None
+        previousstate = previousstate or {}
+        self.create = set(k for k in currentstate if k not in previousstate)
+        self.update = set(k for k in currentstate if k in previousstate and previousstate[k] != currentstate[k])
+        self.disable = set(k for k in previousstate if k not in currentstate)
+        self.untouched = set(currentstate) - self.create - self.update
+        self.touched = []
+
+    def needsupdate(self, key):
+        return self.isFull or key not in self.untouched
+
+    def recordtouch(self, action, key):
+        self.touched.append((action, key))
+
+    def report(self):
+        report('Ribbon change plan: {0} create, {1} update, {2} disable, {3} untouched{4}',
+               len(self.create), len(self.update), len(self.disable), len(self.untouched),
+               ' (full build)' if self.isFull else '')
+        # a full build touches every item, so its list is only worth a verbose log
+        reporttouch = reportv if self.isFull else report
+        for action, key in self.touched:
+            reporttouch('\t{0:<10}: {1}', action, key)
 
 
 class PyRevitUISession:
-    def __init__(self, homedir, settings):
+    def __init__(self, homedir, settings, extensiondirs=None):
         self.loadedPyRevitScripts = []
         self.loadedPyRevitAssemblies = []
         self.pyRevitScriptPanels = []
         self.pyRevitScriptGroups = []
         self.pyRevitScriptCommands = []
         self.pyRevitScriptTabs = []
+        self.pyRevitScriptCommandsIndex = {}
+        self.pyRevitScriptGroupsIndex = {}
+        self.pyRevitScriptPanelsIndex = {}
+        self.pyRevitScriptTabsIndex = {}
         self.homeDir = homedir
+        # script roots in override order. the reload button and the manifest belong to the home directory
+        self.rootDirs = [homedir] + list(extensiondirs or [])
         self.userTempFolder = find_user_temp_directory()
         self.commandLoaderClass = None
         self.commandLoaderAssembly = None
         self.newAssemblyLocation = None
+        self.dispatcherSlots = {}
+        self.changePlan = None
+        self.idleQueue = None
+        self.smartButtonInits = []
+        self.scriptCache = None
         self.settings = settings
         self.revitVersion = __revit__.Application.VersionNumber
+        self.manifest = None
 
-        report('Home Directory is: {0}'.format(self.homeDir))
+    def discover(self):
+        """Finds the command loader, previously loaded assemblies and the script tree. Does not touch the ribbon."""
+        report('Home Directory is: {0}', self.homeDir)
+        for extensiondir in self.rootDirs[1:]:
+            report('Extension Directory is: {0}', extensiondir)
 
         # collect information about previously loaded assemblies
         report('Initializing python script loader...')
-        res = self.findcommandloaderclass()
+        with startupTimer.span('phase', 'findcommandloaderclass'):
+            res = self.findcommandloaderclass()
         if res:
-            self.findloadedpyrevitassemblies()
-            self.cleanup()
+            with startupTimer.span('phase', 'findloadedpyrevitassemblies'):
+                self.findloadedpyrevitassemblies()
 
+            if self.settings.useManifestCache:
+                with startupTimer.span('phase', 'loadmanifest'):
+                    self.manifest = PyRevitManifest(self.homeDir, self.getrevitversionstr(), self.userTempFolder)
             # find commands, script groups and assign commands
-            self.createreloadbutton(self.homeDir)
+            with startupTimer.span('phase', 'createreloadbutton'):
+                self.createreloadbutton(self.homeDir)
             report('Searching for tabs, panels, groups, and scripts...')
-            self.findscripttabs(self.homeDir)
+            with startupTimer.span('phase', 'findscripttabs'):
+                self.findscripttabs(self.rootDirs)
+        return res
+
+    def load(self):
+        # the watcher of the previous load would apply changes to ribbon items this load is about to update
+        PyRevitScriptWatcher.stopprevious(self.settings.scriptWatcherDataKey)
+        if self.discover():
+            self.scriptCache = PyRevitScriptCache(op.join(self.userTempFolder, self.settings.scriptCacheFolderName))
 
             # create assembly dll
             report('Building script executer assembly...')
-            self.createassmebly()
+            with startupTimer.span('phase', 'createassmebly'):
+                self.createassmebly()
+            loadedassemblycount = self.countloadedpyrevitassemblies()
+            reportv('pyRevit assemblies loaded in this Revit session: {0}', loadedassemblycount)
+            startupTimer.count('pyRevitAssembliesLoaded', loadedassemblycount)
 
             # setting up UI
             report('Executer assembly saved. Creating pyRevit UI.')
-            self.createpyrevitui()
+            self.idleQueue = PyRevitIdleQueue(__revit__, self.settings.idleSliceBudget, self.settings.deferUIPopulation)
+            with startupTimer.span('phase', 'createpyrevitui'):
+                self.createpyrevitui()
+            startupTimer.stop()
+            self.idleQueue.start(self.finishload)
         else:
-            report('pyRevit load failed...')
-
-    def cleanup(self):
-        revitinstances = list(Process.GetProcessesByName('Revit'))
-        revitversionstr = self.getrevitversionstr()
-        if len(revitinstances) > 1:
-            reportv('Multiple Revit instance are running...Skipping DLL Cleanup')
-        elif len(revitinstances) == 1 and not self.isreloading():
-            reportv('Cleaning up old DLL files...')
-            files = os.listdir(self.userTempFolder)
-            for f in files:
-                if f.startswith(self.settings.pyRevitAssemblyName + revitversionstr):
-                    try:
-                        os.remove(op.join(self.userTempFolder, f))
-                        reportv('Existing .Dll Removed: {0}'.format(f))
-                    except:
-                        reportv('Error deleting .DLL file: {0}'.format(f))
+            reporterror('pyRevit load failed...')
+
+    def finishload(self, idlequeue):
+        if idlequeue.deferred and idlequeue.taskCount:
+            startupTimer.addspan('phase', 'idleuipopulation', idlequeue.busyTime)
+            startupTimer.count('idleSlices', idlequeue.sliceCount)
+            report('{0} ribbon items populated in idle time: {1:.3f} s of work in {2} slices over {3:.3f} s.',
+                   idlequeue.taskCount, idlequeue.busyTime, idlequeue.sliceCount, time.time() - idlequeue.startTime)
+        if idlequeue.failedCount:
+            reportwarning('{0} ribbon items could not be populated. They are populated again on the next reload.',
+                          idlequeue.failedCount)
+        reportv('{0} icons decoded, {1} icon decodes avoided.',
+                iconCache.decodeCount, iconCache.getavoideddecodecount())
+        # tooltips are read by the idle time tasks. saving before they ran would leave the manifest empty
+        if self.manifest:
+            self.manifest.save()
+        startupTimer.report()
+        startupTimer.save(self)
+        loaderLog.flush()
+        if self.settings.useScriptCache:
+            self.compilescriptcache()
+        if self.settings.useScriptWatcher:
+            PyRevitScriptWatcher(__revit__, self.rootDirs, self.settings.scriptWatcherQuietTime,
+                                 self.applyscriptchanges, self.settings.scriptWatcherDataKey).start()
+            report('Watching the script folders for changes.')
+        if self.settings.useSelectionHistory:
+            try:
+                PyRevitSelectionRecorder(__revit__, self.settings).start()
+            except ImportError:
+                reportwarning('Can not find the selection history module. Selection history is not recorded.')
+
+    def applyscriptchanges(self, changedpaths):
+        """Updates the tooltips and icons of the ribbon items whose scripts or icons changed, in place.
+        Buttons run their script through a launcher that checks the script on every click, so the command types
+        and the dispatcher table stay as they are. Added, removed and renamed files need a reload."""
+        changedpaths = set(op.normcase(fullpath) for fullpath in changedpaths)
+        # removed files and the old names of renamed files are left for the reload
+        existingpaths = set(fullpath for fullpath in changedpaths if op.isfile(fullpath))
+        ribbonitems = get_session_data(self.settings.ribbonItemsDataKey, dict)
+        ribbonstate = AppDomain.CurrentDomain.GetData(self.settings.ribbonStateDataKey)
+        appliedpaths = set()
+        changedscripts = set()
+        updateditemcount = 0
+        for scriptTab in self.pyRevitScriptTabs:
+            for scriptPanel in scriptTab.getsortedscriptpanels():
+                for scriptGroup in scriptPanel.getsortedscriptgroups():
+                    groupchanged = False
+                    for key, cmd, buttonicons, imagename, largeimagename in \
+                            self.getgroupribbonbindings(scriptTab, scriptPanel, scriptGroup):
+                        scriptpath = op.normcase(cmd.getfullscriptaddress()) if cmd else None
+                        iconpath = op.normcase(buttonicons.iconFile) if buttonicons else None
+                        scriptchanged = scriptpath in existingpaths
+                        iconchanged = iconpath in existingpaths
+                        if not scriptchanged and not iconchanged:
+                            continue
+                        if scriptchanged:
+                            cmd.docstringResolved = False
+                            appliedpaths.add(scriptpath)
+                            changedscripts.add(cmd.getfullscriptaddress())
+                        if iconchanged:
+                            buttonicons.iconFileTime = None
+                            appliedpaths.add(iconpath)
+                        if key in ribbonitems:
+                            PyRevitUISession.setribbonitemui(ribbonitems[key], cmd,
+                                                             buttonicons if iconchanged else None,
+                                                             imagename, largeimagename)
+                            reportv('\tRibbon item updated in place: {0}', key)
+                            updateditemcount += 1
+                        groupchanged = True
+                    # the next reload compares against the updated signatures and leaves these items alone
+                    if groupchanged and ribbonstate is not None:
+                        ribbonstate.update(self.getgroupribbonstate(scriptTab, scriptPanel, scriptGroup))
+
+        # compiled copies of the old scripts are not used anymore
+        for scriptpath in sorted(changedscripts):
+            self.scriptCache.index.pop(scriptpath, None)
+            if self.settings.useScriptCache:
+                try:
+                    self.scriptCache.compile(scriptpath)
+                except Exception:
+                    reportwarning('Error compiling changed script. It runs from source: {0}', scriptpath)
+        if changedscripts:
+            self.scriptCache.removestale(changedscripts)
+            self.scriptCache.save()
+        if self.manifest:
+            self.manifest.save()
+
+        report('{0} ribbon items updated in place for {1} changed files.', updateditemcount, len(appliedpaths))
+        reloadpaths = sorted(changedpaths - appliedpaths)
+        if reloadpaths:
+            report('Reload pyRevit to add or remove buttons for: {0}', ', '.join(reloadpaths))
+        loaderLog.flush()
+
+    def compilescriptcache(self):
+        # compiling is left until the ribbon is fully populated and runs on the UI thread, in the Idling slices of
+        # its own queue. clicks before a script is compiled run it from source
+        compilequeue = PyRevitIdleQueue(__revit__, self.settings.idleSliceBudget, True,
+                                        self.settings.scriptCacheQueueDataKey)
+        for cmd in self.pyRevitScriptCommands:
+            if self.uselauncher(cmd):
+                compilequeue.add(cmd.fileName, self.scriptCache.compile, cmd.getfullscriptaddress())
+        compilequeue.start(self.finishscriptcache)
+
+    def finishscriptcache(self, compilequeue):
+        self.scriptCache.removestale([cmd.getfullscriptaddress() for cmd in self.pyRevitScriptCommands])
+        removedcount = self.scriptCache.removeorphans()
+        if removedcount:
+            reportv('Removed {0} cached files of deleted scripts.', removedcount)
+        self.scriptCache.save()
+        report('Script cache ready: {0} scripts compiled in {1:.3f} s, {2} cached, {3} run from source.',
+               self.scriptCache.compiledCount, self.scriptCache.compileTime,
+               len(self.scriptCache.index), self.scriptCache.sourceOnlyCount)
+        loaderLog.flush()
+
+    def uselauncher(self, cmd):
+        # the reload command is the loader itself and always runs from its own file
+        return self.scriptCache is not None and self.settings.userSetupKeyword not in cmd.fileName
+
+    def getcommandscriptaddress(self, cmd):
+        """Returns the script that the command type hands to the command loader when the button is clicked."""
+        if self.uselauncher(cmd):
+            return self.scriptCache.getlauncher(cmd.getfullscriptaddress())
+        return cmd.getfullscriptaddress()
+
+    def useassembly(self, dllname, build):
+        # the cache index records the assembly of this session and the least recently used ones are removed
+        assemblycache = PyRevitAssemblyCache(self.getassemblycachefolder(), self.settings)
+        self.newAssemblyLocation = assemblycache.use(dllname, build)
+        startupTimer.count('assembliesEvicted', len(assemblycache.removedFiles))
+
+    def getassemblycachefolder(self):
+        dllfolder = op.join(self.userTempFolder, self.settings.assemblyCacheFolderName)
+        if not op.exists(dllfolder):
+            os.makedirs(dllfolder)
+        return dllfolder
+
+    def getassemblyhash(self):
+        # the generated assembly only depends on the command types, their scripts and the loader base class
+        assemblyhash = hashlib.md5(self.commandLoaderClass.AssemblyQualifiedName.encode('utf-8'))
+        for cmd in sorted(self.pyRevitScriptCommands, key=lambda x: x.className):
+            assemblyhash.update('{0}|{1}\n'.format(cmd.className, self.getcommandscriptaddress(cmd)).encode('utf-8'))
+        return assemblyhash.hexdigest()[:16]
 
     def isreloading(self):
         return len(self.loadedPyRevitAssemblies) > 0
@@ -368,117 +1896,202 @@ class PyRevitUISession:
     def findcommandloaderclass(self):
         # tries to find the revitpythonloader assembly first
         reportv('Asking Revit for RevitPythonLoader Command Loader class...')
-        for loadedAssembly in AppDomain.CurrentDomain.GetAssemblies():
-            if 'RevitPythonLoader' in loadedAssembly.FullName:
-                reportv('RPL Assembly found: {0}'.format(loadedAssembly.GetName().FullName))
-                self.commandLoaderClass = loadedAssembly.GetType('RevitPythonLoader.CommandLoaderBase')
-                self.commandLoaderAssembly = loadedAssembly
-                return True
+        loadedAssembly = assemblyIndex.findassembly('RevitPythonLoader')
+        if loadedAssembly:
+            if isverbose():
+                reportv('RPL Assembly found: {0}', loadedAssembly.GetName().FullName)
+            self.commandLoaderClass = loadedAssembly.GetType('RevitPythonLoader.CommandLoaderBase')
+            self.commandLoaderAssembly = loadedAssembly
+            return True
 
         # if revitpythonloader doesn't exist tries to find the revitpythonshell assembly
         reportv('Can not find RevitPythonLoader. Asking Revit for RevitPythonShell Command Loader class instead...')
-        for loadedAssembly in AppDomain.CurrentDomain.GetAssemblies():
-            if 'RevitPythonShell' in loadedAssembly.FullName:
-                reportv('RPS Assembly found: {0}'.format(loadedAssembly.GetName().FullName))
-                self.commandLoaderClass = loadedAssembly.GetType('RevitPythonShell.CommandLoaderBase')
-                self.commandLoaderAssembly = loadedAssembly
-                return True
-
-        reportv('Can not find RevitPythonShell either. Aborting load...')
+        loadedAssembly = assemblyIndex.findassembly('RevitPythonShell')
+        if loadedAssembly:
+            if isverbose():
+                reportv('RPS Assembly found: {0}', loadedAssembly.GetName().FullName)
+            self.commandLoaderClass = loadedAssembly.GetType('RevitPythonShell.CommandLoaderBase')
+            self.commandLoaderAssembly = loadedAssembly
+            return True
+
+        reporterror('Can not find RevitPythonShell either. Aborting load...')
         self.commandLoaderClass = None
         self.commandLoaderAssembly = None
         return None
 
     def findloadedpyrevitassemblies(self):
         reportv('Asking Revit for previously loaded pyRevit assemblies...')
-        for loadedAssembly in AppDomain.CurrentDomain.GetAssemblies():
-            if self.settings.pyRevitAssemblyName in loadedAssembly.FullName:
-                reportv('Existing assembly found: {0}'.format(loadedAssembly.FullName))
-                self.loadedPyRevitAssemblies.append(loadedAssembly)
-                self.loadedPyRevitScripts.extend([ct.Name for ct in loadedAssembly.GetTypes()])
+        for loadedAssembly in assemblyIndex.findassemblies(self.getsessionassemblyprefixes()):
+            reportv('Existing assembly found: {0}', loadedAssembly.FullName)
+            self.loadedPyRevitAssemblies.append(loadedAssembly)
+            self.loadedPyRevitScripts.extend(assemblyIndex.gettypenames(loadedAssembly))
+
+    @staticmethod
+    def scantabfolder(tabdir):
+        """Lists the tab folder once and classifies each entry by its extension and name pattern."""
+        scriptfiles = []
+        imagefiles = []
+        descriptorfiles = []
+        iconfiles = {}
+        for f in sorted(os.listdir(tabdir)):
+            fext = op.splitext(f)[1].lower()
+            if '.py' == fext:
+                scriptfiles.append(f)
+            elif '.png' == fext:
+                imagefiles.append(f)
+        # images named after a script are its icon, even when the script name starts with a digit like descriptors
+        scriptnames = set(op.splitext(f)[0].lower() for f in scriptfiles)
+        for f in imagefiles:
+            fname = op.splitext(f)[0]
+            if fname.lower() not in scriptnames and fname[:1].isdigit():
+                descriptorfiles.append(f)
+            else:
+                # keyed by lower case name since file names are not case sensitive on windows
+                iconfiles[f.lower()] = f
+        return [scriptfiles, descriptorfiles, iconfiles]
+
+    @staticmethod
+    def getdescriptorkey(f):
+        # group descriptors are matched by panel and group name across roots, since the order prefix may differ
+        namepieces = op.splitext(f)[0].rsplit('_')
+        if len(namepieces) == 4 or len(namepieces) == 6:
+            return 'group:{0}/{1}'.format(namepieces[1].lower(), namepieces[3].lower())
+        return f.lower()
 
-    def findscriptcommands(self, tabdir, tabname):
+    @staticmethod
+    def mergetabfolders(tabfolders):
+        """Merges the listings of the folders of one tab, given in root order, into lists of (folder, file name).
+        Script icons are kept per folder."""
+        scripts = {}
+        descriptors = {}
+        iconfiles = {}
+        for tabdir, scriptfiles, descriptorfiles, foldericonfiles in tabfolders:
+            iconfiles[tabdir] = foldericonfiles
+            for f in scriptfiles:
+                if f.lower() in scripts:
+                    if isverbose():
+                        reportv('Script overridden by {0}: {1}', tabdir, op.join(*scripts[f.lower()]))
+                    startupTimer.count('filesOverridden')
+                scripts[f.lower()] = (tabdir, f)
+            for f in descriptorfiles:
+                descriptorkey = PyRevitUISession.getdescriptorkey(f)
+                # only a later root overrides a group. descriptors in the same folder are all kept
+                if descriptorkey in descriptors and descriptors[descriptorkey][0] == tabdir:
+                    descriptorkey = f.lower()
+                elif descriptorkey in descriptors:
+                    if isverbose():
+                        reportv('Script group overridden by {0}: {1}', tabdir, op.join(*descriptors[descriptorkey]))
+                    startupTimer.count('filesOverridden')
+                descriptors[descriptorkey] = (tabdir, f)
+        return sorted(scripts.values(), key=lambda x: x[1]), sorted(descriptors.values(), key=lambda x: x[1]), iconfiles
+
+    def findscriptcommands(self, tabname, scriptfiles, iconfiles):
         reportv('Searching tab folder for scripts...')
-        files = sorted(os.listdir(tabdir))
-        for f in files:
+        tabcommands = []
+        for tabdir, f in scriptfiles:
             # creating scriptCommands
-            fname, fext = op.splitext(op.basename(f))
-            if '.py' == fext.lower():
-                try:
-                    cmd = ScriptCommand(tabdir, f, tabname)
-                    self.pyRevitScriptCommands.append(cmd)
-                except UnknownFileNameFormat:
-                    reportv('Can not recognize name pattern. skipping: {0}'.format(f))
-                    continue
-                except:
-                    reportv('Something is wrong. skipping: {0}'.format(f))
-                    continue
+            try:
+                with startupTimer.span('file', op.join(tabdir, f)):
+                    cmd = ScriptCommand(tabdir, f, tabname, self.manifest, iconfiles[tabdir])
+                self.pyRevitScriptCommands.append(cmd)
+                self.pyRevitScriptCommandsIndex.setdefault((cmd.tabName, cmd.scriptGroupName), []).append(cmd)
+                tabcommands.append(cmd)
+            except UnknownFileNameFormat:
+                reportv('Can not recognize name pattern. skipping: {0}', f)
+                continue
+            except:
+                reportwarning('Something is wrong. skipping: {0}', f)
+                continue
 
-        if not len(self.pyRevitScriptCommands) > 0:
+        if not len(tabcommands) > 0:
             report('No Scripts found...')
+        return tabcommands
 
-    def findscriptgroups(self, tabdir, tabname):
+    def findscriptgroups(self, tabname, descriptorfiles):
         reportv('Searching content folder for script groups ...')
-        self.findscriptcommands(tabdir, tabname)
-        files = os.listdir(tabdir)
-        for f in files:
+        for tabdir, f in descriptorfiles:
             # creating ScriptGroup list and adopting ScriptCommands
-            fname, fext = op.splitext(op.basename(f))
-            if '.png' == fext.lower():
-                try:
+            try:
+                with startupTimer.span('file', op.join(tabdir, f)):
                     scriptgroup = ScriptGroup(tabdir, f, tabname)
-                    scriptgroup.adoptcommands(self.pyRevitScriptCommands)
-                    self.pyRevitScriptGroups.append(scriptgroup)
-                except UnknownFileNameFormat:
-                    if f in [x.iconFileName for x in self.pyRevitScriptCommands]:
-                        reportv('Skipping script icon file: {0}'.format(f))
-                        continue
-                    else:
-                        reportv('Can not recognize name pattern. skipping: {0}'.format(f))
-                        continue
-                except UnknownAssembly:
-                    reportv('Unknown assembly error. Skipping: {0}'.format(f))
-                    continue
+                scriptgroup.adoptcommands(self.pyRevitScriptCommandsIndex)
+                self.pyRevitScriptGroups.append(scriptgroup)
+                self.pyRevitScriptGroupsIndex.setdefault((tabname, scriptgroup.panelName), []).append(scriptgroup)
+            except UnknownFileNameFormat:
+                reportv('Can not recognize name pattern. skipping: {0}', f)
+                continue
+            except UnknownAssembly:
+                reportwarning('Unknown assembly error. Skipping: {0}', f)
+                continue
 
-    def findscriptpanels(self, tabdir, tabname):
+    def findscriptpanels(self, tabname, descriptorfiles):
         reportv('Searching content folder for script panels ...')
-        self.findscriptgroups(tabdir, tabname)
-        files = os.listdir(tabdir)
-        for f in files:
+        tabpanels = []
+        for tabdir, f in descriptorfiles:
             # creating ScriptPanel list and adopting ScriptGroups
-            fname, fext = op.splitext(op.basename(f))
-            if '.png' == fext.lower():
-                try:
-                    scriptpanel = ScriptPanel(tabdir, f, tabname)
-                    collectedscriptpanels = [(x.panelName, x.tabName) for x in self.pyRevitScriptPanels]
-                    if (scriptpanel.panelName, scriptpanel.tabName) not in collectedscriptpanels:
-                        scriptpanel.adoptgroups(self.pyRevitScriptGroups)
-                        self.pyRevitScriptPanels.append(scriptpanel)
-                except UnknownFileNameFormat:
-                    if f in [x.iconFileName for x in self.pyRevitScriptCommands]:
-                        reportv('Skipping script icon file: {0}'.format(f))
-                        continue
-                    else:
-                        reportv('Can not recognize name pattern. skipping: {0}'.format(f))
-                        continue
+            try:
+                scriptpanel = ScriptPanel(tabdir, f, tabname)
+                if (tabname, scriptpanel.panelName) not in self.pyRevitScriptPanelsIndex:
+                    scriptpanel.adoptgroups(self.pyRevitScriptGroupsIndex)
+                    self.pyRevitScriptPanels.append(scriptpanel)
+                    self.pyRevitScriptPanelsIndex[(tabname, scriptpanel.panelName)] = scriptpanel
+                    tabpanels.append(scriptpanel)
+            except UnknownFileNameFormat:
+                reportv('Can not recognize name pattern. skipping: {0}', f)
+                continue
+        return tabpanels
 
-    def findscripttabs(self, rootdir):
-        for dirName in os.listdir(rootdir):
-            fulltabpath = op.join(rootdir, dirName)
-            if op.isdir(fulltabpath) and ('_' not in dirName):
-                reportv('\n')
-                reportv('Searching fo scripts under: {0}'.format(fulltabpath), title=True)
-                tabnames = [x.tabName for x in self.pyRevitScriptTabs]
-                if dirName not in tabnames:
-                    scripttab = ScriptTab(dirName, fulltabpath)
-                    self.findscriptpanels(fulltabpath, scripttab.tabName)
-                    reportv('\nTab found: {0}'.format(scripttab.tabName))
-                    scripttab.adoptpanels(self.pyRevitScriptPanels)
-                    self.pyRevitScriptTabs.append(scripttab)
-                    sys.path.append(fulltabpath)
-                    reportv('\n')
+    @staticmethod
+    def findscripticons(tabcommands, iconfiles):
+        scripticonfiles = set((cmd.filePath, cmd.iconFileName) for cmd in tabcommands)
+        for tabdir, f in sorted((tabdir, f) for tabdir in iconfiles for f in iconfiles[tabdir].values()):
+            if (tabdir, f) in scripticonfiles:
+                reportv('Skipping script icon file: {0}', f)
             else:
+                reportv('Can not recognize name pattern. skipping: {0}', f)
+
+    def findscripttab(self, tabname, tabfolders):
+        scripttab = ScriptTab(tabname, tabfolders[0][0])
+        scriptfiles, descriptorfiles, iconfiles = PyRevitUISession.mergetabfolders(tabfolders)
+        tabcommands = self.findscriptcommands(scripttab.tabName, scriptfiles, iconfiles)
+        self.findscriptgroups(scripttab.tabName, descriptorfiles)
+        tabpanels = self.findscriptpanels(scripttab.tabName, descriptorfiles)
+        PyRevitUISession.findscripticons(tabcommands, iconfiles)
+        reportv('\nTab found: {0}', scripttab.tabName)
+        scripttab.adoptpanels(tabpanels)
+        return scripttab
+
+    def findscripttabs(self, rootdirs):
+        # the folders of each tab across all roots, in root order
+        tabfolders = {}
+        tabnames = []
+        for rootscan in PyRevitRootScan.scanall(rootdirs, self.settings.discoveryThreadCount, self.manifest):
+            if rootscan.error:
+                reportwarning('Can not scan script root. Skipping: {0} ({1})', rootscan.rootDir, rootscan.error)
                 continue
+            startupTimer.addspan('root', rootscan.rootDir, rootscan.scanTime)
+            startupTimer.count('filesScanned', rootscan.fileCount)
+            reportv('Script root scanned in {0:.3f} s: {1} tabs, {2} files: {3}',
+                    rootscan.scanTime, len(rootscan.tabs), rootscan.fileCount, rootscan.rootDir)
+            for tabname, tabdir, scriptfiles, descriptorfiles, iconfiles in rootscan.tabs:
+                if tabname not in tabfolders:
+                    tabnames.append(tabname)
+                    tabfolders[tabname] = []
+                tabfolders[tabname].append((tabdir, scriptfiles, descriptorfiles, iconfiles))
+
+        for tabname in tabnames:
+            if isverbose():
+                reportv('\n')
+                reportv('Searching fo scripts under: {0}', ', '.join(f[0] for f in tabfolders[tabname]), title=True)
+            if tabname not in self.pyRevitScriptTabsIndex:
+                with startupTimer.span('tab', tabname):
+                    scripttab = self.findscripttab(tabname, tabfolders[tabname])
+                self.pyRevitScriptTabs.append(scripttab)
+                self.pyRevitScriptTabsIndex[scripttab.tabName] = scripttab
+                # folders of later roots come first so their modules shadow the ones in earlier roots
+                for tabfolder in reversed(tabfolders[tabname]):
+                    sys.path.append(tabfolder[0])
+                reportv('\n')
 
     def createreloadbutton(self, rootdir):
         reportv('Creating "Reload Scripts" button...')
@@ -486,58 +2099,43 @@ class PyRevitUISession:
             fulltabpath = op.join(rootdir, fname)
             if not op.isdir(fulltabpath) and self.settings.userSetupKeyword in fname:
                 try:
-                    cmd = ScriptCommand(rootdir, fname, self.settings.masterTabName)
+                    cmd = ScriptCommand(rootdir, fname, self.settings.masterTabName, self.manifest)
                     self.pyRevitScriptCommands.append(cmd)
+                    self.pyRevitScriptCommandsIndex.setdefault((cmd.tabName, cmd.scriptGroupName), []).append(cmd)
                     reportv('Reload button added.\n')
                 except:
-                    reportv('\nCould not create reload command.\n')
+                    reportwarning('\nCould not create reload command.\n')
                     continue
 
     def createassmebly(self):
-        # create DLL folder
-        # dllfolder = Path.Combine( self.homeDir, self.settings.pyRevitAssemblyName )
-        # if not os.path.exists( dllfolder ):
-        # os.mkdir( dllfolder )
-        dllfolder = self.userTempFolder
-        # make assembly name
-        generatedassemblyname = self.settings.pyRevitAssemblyName + self.getrevitversionstr() + datetime.now().strftime(
-            '_%y%m%d%H%M%S')
+        if self.settings.useDispatcherAssembly:
+            self.createdispatcherassembly()
+            return
+        dllfolder = self.getassemblycachefolder()
+        # make assembly name from the content hash so an unchanged command set reuses the existing dll
+        generatedassemblyname = '{0}{1}_{2}'.format(self.settings.pyRevitAssemblyName,
+                                                    self.getrevitversionstr(),
+                                                    self.getassemblyhash())
         dllname = generatedassemblyname + '.dll'
+        self.useassembly(dllname, lambda filename: self.buildcommandassembly(dllfolder, generatedassemblyname,
+                                                                             filename))
+
+    def buildcommandassembly(self, dllfolder, generatedassemblyname, dllname):
         # create assembly
         windowsassemblyname = AssemblyName(Name=generatedassemblyname, Version=Version(1, 0, 0, 0))
-        reportv('Generated assembly name for this session: {0}'.format(generatedassemblyname))
-        reportv('Generated windows assembly name for this session: {0}'.format(windowsassemblyname))
-        reportv('Generated DLL name for this session: {0}'.format(dllname))
+        reportv('Generated assembly name for this session: {0}', generatedassemblyname)
+        reportv('Generated windows assembly name for this session: {0}', windowsassemblyname)
+        reportv('Generated DLL name for this session: {0}', dllname)
         assemblybuilder = AppDomain.CurrentDomain.DefineDynamicAssembly(windowsassemblyname,
                                                                         AssemblyBuilderAccess.RunAndSave, dllfolder)
         modulebuilder = assemblybuilder.DefineDynamicModule(generatedassemblyname, dllname)
 
         # create command classes
         for cmd in self.pyRevitScriptCommands:
-            typebuilder = modulebuilder.DefineType(cmd.className, TypeAttributes.Class | TypeAttributes.Public,
-                                                   self.commandLoaderClass)
-
-            # add RegenerationAttribute to type
-            regenerationconstrutorinfo = clr.GetClrType(RegenerationAttribute).GetConstructor(
-                Array[Type]((RegenerationOption,)))
-            regenerationattributebuilder = CustomAttributeBuilder(regenerationconstrutorinfo,
-                                                                  Array[object]((RegenerationOption.Manual,)))
-            typebuilder.SetCustomAttribute(regenerationattributebuilder)
-
-            # add TransactionAttribute to type
-            transactionconstructorinfo = clr.GetClrType(TransactionAttribute).GetConstructor(
-                Array[Type]((TransactionMode,)))
-            transactionattributebuilder = CustomAttributeBuilder(transactionconstructorinfo,
-                                                                 Array[object]((TransactionMode.Manual,)))
-            typebuilder.SetCustomAttribute(transactionattributebuilder)
-
-            # call base constructor with script path
-            ci = self.commandLoaderClass.GetConstructor(Array[Type]((str,)))
-            constructorbuilder = typebuilder.DefineConstructor(MethodAttributes.Public, CallingConventions.Standard,
-                                                               Array[Type](()))
-            gen = constructorbuilder.GetILGenerator()
+            typebuilder, gen, ci = self.definecommandtype(modulebuilder, cmd.className)
             gen.Emit(OpCodes.Ldarg_0)  # Load "this" onto eval stack
-            gen.Emit(OpCodes.Ldstr, cmd.getfullscriptaddress())  # Load the path to the command as a string onto stack
+            # Load the path to the command as a string onto stack
+            gen.Emit(OpCodes.Ldstr, self.getcommandscriptaddress(cmd))
             gen.Emit(OpCodes.Call, ci)  # call base constructor (consumes "this" and the string)
             gen.Emit(OpCodes.Nop)  # Fill some space - this is how it is generated for equivalent C# code
             gen.Emit(OpCodes.Nop)
@@ -547,9 +2145,213 @@ class PyRevitUISession:
 
         # save final assembly
         assemblybuilder.Save(dllname)
-        self.newAssemblyLocation = Path.Combine(dllfolder, dllname)
 
-    def createorfindpyrevitpanels(self):
+    def definecommandtype(self, modulebuilder, typename):
+        startupTimer.count('typesEmitted')
+        typebuilder = modulebuilder.DefineType(typename, TypeAttributes.Class | TypeAttributes.Public,
+                                               self.commandLoaderClass)
+
+        # add RegenerationAttribute to type
+        regenerationconstrutorinfo = clr.GetClrType(RegenerationAttribute).GetConstructor(
+            Array[Type]((RegenerationOption,)))
+        regenerationattributebuilder = CustomAttributeBuilder(regenerationconstrutorinfo,
+                                                              Array[object]((RegenerationOption.Manual,)))
+        typebuilder.SetCustomAttribute(regenerationattributebuilder)
+
+        # add TransactionAttribute to type
+        transactionconstructorinfo = clr.GetClrType(TransactionAttribute).GetConstructor(
+            Array[Type]((TransactionMode,)))
+        transactionattributebuilder = CustomAttributeBuilder(transactionconstructorinfo,
+                                                             Array[object]((TransactionMode.Manual,)))
+        typebuilder.SetCustomAttribute(transactionattributebuilder)
+
+        # constructor that calls base constructor with script path. caller emits the body
+        ci = self.commandLoaderClass.GetConstructor(Array[Type]((str,)))
+        constructorbuilder = typebuilder.DefineConstructor(MethodAttributes.Public, CallingConventions.Standard,
+                                                           Array[Type](()))
+        return typebuilder, constructorbuilder.GetILGenerator(), ci
+
+    def getdispatcherslots(self):
+        # slot assignments are kept for the whole Revit session so existing buttons keep their class after reloads
+        dispatcherslots = get_session_data(self.settings.dispatcherSlotsDataKey, dict)
+        for cmd in self.pyRevitScriptCommands:
+            if cmd.className not in dispatcherslots:
+                dispatcherslots[cmd.className] = len(dispatcherslots)
+        return dispatcherslots
+
+    def getdispatcherslotcount(self, dispatcherslots):
+        slotcount = self.settings.dispatcherSlotCount
+        while slotcount < len(dispatcherslots):
+            slotcount *= 2
+        return slotcount
+
+    def getdispatcherslottypename(self, slot):
+        return '{0}.Slot{1:05d}'.format(self.settings.dispatcherTypeNamespace, slot)
+
+    def getcommandtypename(self, cmd):
+        if self.settings.useDispatcherAssembly:
+            return self.getdispatcherslottypename(self.dispatcherSlots[cmd.className])
+        return cmd.className
+
+    def createdispatcherassembly(self):
+        """Dispatcher mode: a fixed assembly of slot types, emitted once per Revit version and loader class.
+        Each slot type reads its script path from the AppDomain data when Revit creates the command,
+        so a reload only rewrites that table and never defines new types."""
+        self.dispatcherSlots = self.getdispatcherslots()
+        slotcount = self.getdispatcherslotcount(self.dispatcherSlots)
+
+        # rewrite the lookup table
+        for cmd in self.pyRevitScriptCommands:
+            AppDomain.CurrentDomain.SetData(self.getdispatcherslottypename(self.dispatcherSlots[cmd.className]),
+                                            self.getcommandscriptaddress(cmd))
+        reportv('Dispatcher table updated for {0} commands.', len(self.pyRevitScriptCommands))
+
+        loaderhash = hashlib.md5(self.commandLoaderClass.AssemblyQualifiedName.encode('utf-8')).hexdigest()[:8]
+        generatedassemblyname = '{0}{1}_{2}_{3}'.format(self.settings.dispatcherTypeNamespace,
+                                                        self.getrevitversionstr(),
+                                                        slotcount,
+                                                        loaderhash)
+        dllfolder = self.getassemblycachefolder()
+        dllname = generatedassemblyname + '.dll'
+        self.useassembly(dllname, lambda filename: self.builddispatcherassembly(dllfolder, generatedassemblyname,
+                                                                                filename, slotcount))
+
+    def builddispatcherassembly(self, dllfolder, generatedassemblyname, dllname, slotcount):
+        reportv('Generating dispatcher assembly with {0} slots: {1} in {2}', slotcount, dllname, dllfolder)
+        windowsassemblyname = AssemblyName(Name=generatedassemblyname, Version=Version(1, 0, 0, 0))
+        assemblybuilder = AppDomain.CurrentDomain.DefineDynamicAssembly(windowsassemblyname,
+                                                                        AssemblyBuilderAccess.RunAndSave, dllfolder)
+        modulebuilder = assemblybuilder.DefineDynamicModule(generatedassemblyname, dllname)
+        getcurrentdomain = clr.GetClrType(AppDomain).GetProperty('CurrentDomain').GetGetMethod()
+        getdata = clr.GetClrType(AppDomain).GetMethod('GetData', Array[Type]((str,)))
+        for slot in range(slotcount):
+            slottypename = self.getdispatcherslottypename(slot)
+            typebuilder, gen, ci = self.definecommandtype(modulebuilder, slottypename)
+            gen.Emit(OpCodes.Ldarg_0)  # Load "this" onto eval stack
+            gen.Emit(OpCodes.Call, getcurrentdomain)  # Load AppDomain.CurrentDomain
+            gen.Emit(OpCodes.Ldstr, slottypename)  # Load the lookup key of this slot
+            gen.Emit(OpCodes.Callvirt, getdata)  # Look up the script path (consumes the domain and the key)
+            gen.Emit(OpCodes.Castclass, clr.GetClrType(str))
+            gen.Emit(OpCodes.Call, ci)  # call base constructor (consumes "this" and the script path)
+            gen.Emit(OpCodes.Ret)
+            typebuilder.CreateType()
+        assemblybuilder.Save(dllname)
+
+    def getsessionassemblyprefixes(self):
+        # pyRevit2016_<hash> and pyRevitDispatch2016_<slots>_<hash>. the compiled scripts are not session assemblies
+        return (self.settings.pyRevitAssemblyName + self.getrevitversionstr() + '_',
+                self.settings.dispatcherTypeNamespace + self.getrevitversionstr() + '_')
+
+    def countloadedpyrevitassemblies(self):
+        return len(assemblyIndex.findassemblies(self.getsessionassemblyprefixes()))
+
+    @staticmethod
+    def getribbonitemkey(*names):
+        return '/'.join(names)
+
+    @staticmethod
+    def getfilesignature(fullpath):
+        try:
+            return '{0}:{1}:{2}'.format(fullpath, *PyRevitManifest.getfilestamp(fullpath))
+        except OSError:
+            return fullpath
+
+    def getcommandsignature(self, scriptGroup, cmd):
+        iconfile = op.join(cmd.filePath, cmd.iconFileName) if cmd.iconFileName else scriptGroup.buttonIcons.iconFile
+        return '|'.join([self.newAssemblyLocation, self.getcommandtypename(cmd),
+                         PyRevitUISession.getfilesignature(cmd.getfullscriptaddress()),
+                         PyRevitUISession.getfilesignature(iconfile),
+                         PyRevitUISession.getfilesignature(scriptGroup.buttonIcons.iconFile)])
+
+    def getgroupribbonstate(self, scriptTab, scriptPanel, scriptGroup):
+        """Returns the ribbon item keys and signatures that this script group is built into."""
+        groupstate = {}
+        groupkey = PyRevitUISession.getribbonitemkey(scriptTab.tabName, scriptPanel.panelName, scriptGroup.groupName)
+        groupiconsignature = PyRevitUISession.getfilesignature(scriptGroup.buttonIcons.iconFile)
+        if scriptGroup.groupType in (self.settings.pulldownButtonTypeName, self.settings.splitButtonTypeName):
+            groupstate[groupkey] = '|'.join([scriptGroup.groupType, groupiconsignature])
+            for cmd in scriptGroup.commands:
+                groupstate[PyRevitUISession.getribbonitemkey(groupkey, cmd.className)] = \
+                    self.getcommandsignature(scriptGroup, cmd)
+        elif scriptGroup.groupType == self.settings.stackedThreeTypeName:
+            for cmd in scriptGroup.commands:
+                groupstate[PyRevitUISession.getribbonitemkey(scriptTab.tabName, scriptPanel.panelName,
+                                                             cmd.className)] = self.getcommandsignature(scriptGroup,
+                                                                                                        cmd)
+        elif scriptGroup.islinkbutton():
+            groupstate[groupkey] = '|'.join([str(scriptGroup.assemblyLocation), scriptGroup.assemblyName,
+                                             scriptGroup.assemblyClassName, groupiconsignature])
+        elif scriptGroup.commands:
+            cmd = scriptGroup.commands[-1]
+            groupstate[PyRevitUISession.getribbonitemkey(scriptTab.tabName, scriptPanel.panelName,
+                                                         cmd.className)] = self.getcommandsignature(scriptGroup, cmd)
+        return groupstate
+
+    def getgroupribbonbindings(self, scriptTab, scriptPanel, scriptGroup):
+        """Returns how createui populates the ribbon items of this script group, as
+        (ribbon item key, command, button icons, image name, large image name) for each item."""
+        groupkey = PyRevitUISession.getribbonitemkey(scriptTab.tabName, scriptPanel.panelName, scriptGroup.groupName)
+        if scriptGroup.groupType in (self.settings.pulldownButtonTypeName, self.settings.splitButtonTypeName):
+            return [(groupkey, None, scriptGroup.buttonIcons, 'smallBitmap', 'largeBitmap')] + \
+                [(PyRevitUISession.getribbonitemkey(groupkey, cmd.className), cmd,
+                  cmd.buttonIcons or scriptGroup.buttonIcons, None, 'mediumBitmap') for cmd in scriptGroup.commands]
+        elif scriptGroup.groupType == self.settings.stackedThreeTypeName:
+            return [(PyRevitUISession.getribbonitemkey(scriptTab.tabName, scriptPanel.panelName, cmd.className), cmd,
+                     cmd.buttonIcons or scriptGroup.buttonIcons, 'smallBitmap', None) for cmd in scriptGroup.commands]
+        elif scriptGroup.islinkbutton():
+            return [(groupkey, None, scriptGroup.buttonIcons, 'smallBitmap', 'largeBitmap')]
+        elif scriptGroup.commands:
+            cmd = scriptGroup.commands[-1]
+            cmdkey = PyRevitUISession.getribbonitemkey(scriptTab.tabName, scriptPanel.panelName, cmd.className)
+            if scriptGroup.groupType == self.settings.smartButtonTypeName:
+                return [(cmdkey, cmd, self.getsmartbuttonicons(scriptGroup, cmd), 'smallBitmap', 'largeBitmap')]
+            return [(cmdkey, cmd, scriptGroup.buttonIcons, 'smallBitmap', 'largeBitmap')]
+        return []
+
+    def getribbonstate(self):
+        """Returns the ribbon state of each script group keyed by group key, and the state of the whole ribbon."""
+        groupstates = {}
+        ribbonstate = {}
+        for scriptTab in self.pyRevitScriptTabs:
+            for scriptPanel in scriptTab.getsortedscriptpanels():
+                for scriptGroup in scriptPanel.getsortedscriptgroups():
+                    groupkey = PyRevitUISession.getribbonitemkey(scriptTab.tabName, scriptPanel.panelName,
+                                                                 scriptGroup.groupName)
+                    groupstates[groupkey] = self.getgroupribbonstate(scriptTab, scriptPanel, scriptGroup)
+                    ribbonstate.update(groupstates[groupkey])
+        return groupstates, ribbonstate
+
+    def createchangeplan(self):
+        groupstates, ribbonstate = self.getribbonstate()
+        previousstate = None
+        if self.settings.useIncrementalReload:
+            previousstate = AppDomain.CurrentDomain.GetData(self.settings.ribbonStateDataKey)
+        self.changePlan = PyRevitUIChangePlan(previousstate, ribbonstate)
+        return groupstates, ribbonstate
+
+    def groupneedsupdate(self, groupstates, scriptTab, scriptPanel, scriptGroup):
+        groupkey = PyRevitUISession.getribbonitemkey(scriptTab.tabName, scriptPanel.panelName, scriptGroup.groupName)
+        return any(self.changePlan.needsupdate(k) for k in groupstates[groupkey])
+
+    def panelneedsupdate(self, groupstates, scriptTab, scriptPanel):
+        # a full build also disables the orphaned items of panels without any script groups
+        return self.changePlan.isFull or any(self.groupneedsupdate(groupstates, scriptTab, scriptPanel, scriptGroup)
+                   for scriptGroup in scriptPanel.getsortedscriptgroups())
+
+    def registerribbonitem(self, action, key, ribbonitem):
+        # ribbon items are kept on the AppDomain so later reloads can reach changed items directly
+        get_session_data(self.settings.ribbonItemsDataKey, dict)[key] = ribbonitem
+        self.changePlan.recordtouch(action, key)
+
+    def disableremovedribbonitems(self):
+        ribbonitems = get_session_data(self.settings.ribbonItemsDataKey, dict)
+        for key in sorted(self.changePlan.disable):
+            if key in ribbonitems:
+                reportv('\tDisabling removed ribbon item: {0}', key)
+                ribbonitems[key].Enabled = False
+                self.changePlan.recordtouch('disable', key)
+
+    def createorfindpyrevitpanels(self, groupstates):
         reportv('Searching for existing pyRevit panels...')
         for scriptTab in self.pyRevitScriptTabs:
             # creates pyrevitribbonpanels for existing or newly created panels
@@ -561,202 +2363,370 @@ class PyRevitUISession:
                     __revit__.CreateRibbonTab(scriptTab.tabName)
                     pyrevitribbonpanels = {p.Name: p for p in __revit__.GetRibbonPanels(scriptTab.tabName)}
                 else:
-                    reportv('pyRevit ribbon found but does not include any scripts. Skipping: {0}'.format(
-                        scriptTab.tabName))
+                    reportv('pyRevit ribbon found but does not include any scripts. Skipping: {0}', scriptTab.tabName)
             reportv('Searching for panels...')
             for panel in scriptTab.getsortedscriptpanels():
                 if panel.panelName in pyrevitribbonpanels.keys():
-                    reportv('Existing panel found: {0}'.format(panel.panelName))
+                    reportv('Existing panel found: {0}', panel.panelName)
                     scriptTab.pyRevitUIPanels[panel.panelName] = pyrevitribbonpanels[panel.panelName]
-                    scriptTab.pyRevitUIButtons[panel.panelName] = list(pyrevitribbonpanels[panel.panelName].GetItems())
+                    # the items of panels that the change plan leaves alone are not needed
+                    if self.panelneedsupdate(groupstates, scriptTab, panel):
+                        scriptTab.pyRevitUIButtons[panel.panelName] = \
+                            list(pyrevitribbonpanels[panel.panelName].GetItems())
+                    else:
+                        scriptTab.pyRevitUIButtons[panel.panelName] = None
                 else:
-                    reportv('Creating scripts panel: {0}'.format(panel.panelName))
+                    reportv('Creating scripts panel: {0}', panel.panelName)
                     newpanel = __revit__.CreateRibbonPanel(scriptTab.tabName, panel.panelName)
                     scriptTab.pyRevitUIPanels[panel.panelName] = newpanel
                     scriptTab.pyRevitUIButtons[panel.panelName] = []
 
-    def createui(self):
+    def createui(self, groupstates, ribbonstate):
         newbuttoncount = updatedbuttoncount = 0
         for scriptTab in self.pyRevitScriptTabs:
             for scriptPanel in scriptTab.getsortedscriptpanels():
+                if scriptTab.pyRevitUIButtons[scriptPanel.panelName] is None:
+                    continue
                 pyrevitribbonpanel = scriptTab.pyRevitUIPanels[scriptPanel.panelName]
                 pyrevitribbonitemsdict = {b.Name: b for b in scriptTab.pyRevitUIButtons[scriptPanel.panelName]}
-                reportv('Creating\\Updating ribbon items for panel: {0}'.format(scriptPanel.panelName))
+                reportv('Creating\\Updating ribbon items for panel: {0}', scriptPanel.panelName)
                 for scriptGroup in scriptPanel.getsortedscriptgroups():
+                    if not self.groupneedsupdate(groupstates, scriptTab, scriptPanel, scriptGroup):
+                        continue
+                    groupkey = PyRevitUISession.getribbonitemkey(scriptTab.tabName, scriptPanel.panelName,
+                                                                 scriptGroup.groupName)
                     # PulldownButton or SplitButton
                     if scriptGroup.groupType == self.settings.pulldownButtonTypeName or scriptGroup.groupType == self.settings.splitButtonTypeName:
                         # PulldownButton
                         if scriptGroup.groupType == self.settings.pulldownButtonTypeName:
                             if scriptGroup.groupName not in pyrevitribbonitemsdict:
-                                reportv('\tCreating pulldown button group: {0}'.format(scriptGroup.groupName))
+                                reportv('\tCreating pulldown button group: {0}', scriptGroup.groupName)
                                 ribbonitem = pyrevitribbonpanel.AddItem(
                                     PulldownButtonData(scriptGroup.groupName, scriptGroup.groupName))
                             else:
-                                reportv('\tUpdating pulldown button group: {0}'.format(scriptGroup.groupName))
+                                reportv('\tUpdating pulldown button group: {0}', scriptGroup.groupName)
                                 ribbonitem = pyrevitribbonitemsdict.pop(scriptGroup.groupName)
 
                         # SplitButton
                         elif scriptGroup.groupType == self.settings.splitButtonTypeName:
                             if scriptGroup.groupName not in pyrevitribbonitemsdict.keys():
-                                reportv('\tCreating split button group: {0}'.format(scriptGroup.groupName))
+                                reportv('\tCreating split button group: {0}', scriptGroup.groupName)
                                 ribbonitem = pyrevitribbonpanel.AddItem(
                                     SplitButtonData(scriptGroup.groupName, scriptGroup.groupName))
                             else:
-                                reportv('\tUpdating split button group: {0}'.format(scriptGroup.groupName))
+                                reportv('\tUpdating split button group: {0}', scriptGroup.groupName)
                                 ribbonitem = pyrevitribbonitemsdict.pop(scriptGroup.groupName)
 
-                        ribbonitem.Image = scriptGroup.buttonIcons.smallBitmap
-                        ribbonitem.LargeImage = scriptGroup.buttonIcons.largeBitmap
-                        existingribbonitempushbuttonsdict = {b.ClassName: b for b in ribbonitem.GetItems()}
+                        if self.changePlan.needsupdate(groupkey):
+                            self.populateribbonitem(ribbonitem, groupkey, None, scriptGroup.buttonIcons,
+                                                    'smallBitmap', 'largeBitmap')
+                            self.registerribbonitem('group', groupkey, ribbonitem)
+                        existingribbonitempushbuttonsdict = {b.Name: b for b in ribbonitem.GetItems()}
 
                         for cmd in scriptGroup.commands:
+                            cmdkey = PyRevitUISession.getribbonitemkey(groupkey, cmd.className)
+                            if not self.changePlan.needsupdate(cmdkey):
+                                existingribbonitempushbuttonsdict.pop(cmd.className, None)
+                                continue
                             if cmd.className not in existingribbonitempushbuttonsdict:
-                                reportv('\t\tCreating push button: {0}'.format(cmd.className))
+                                reportv('\t\tCreating push button: {0}', cmd.className)
                                 buttondata = PushButtonData(cmd.className, cmd.cmdName, self.newAssemblyLocation,
-                                                            cmd.className)
-                                buttondata.ToolTip = cmd.tooltip
-                                if cmd.buttonIcons:
-                                    buttondata.LargeImage = cmd.buttonIcons.mediumBitmap
-                                    # buttondata.LargeImage = cmd.buttonIcons.largeBitmap
-                                else:
-                                    buttondata.LargeImage = scriptGroup.buttonIcons.mediumBitmap
-                                    # buttondata.LargeImage = scriptGroup.buttonIcons.largeBitmap
-                                ribbonitem.AddPushButton(buttondata)
+                                                            self.getcommandtypename(cmd))
+                                pushbutton = ribbonitem.AddPushButton(buttondata)
+                                self.populateribbonitem(pushbutton, cmdkey, cmd,
+                                                        cmd.buttonIcons or scriptGroup.buttonIcons,
+                                                        None, 'mediumBitmap')
+                                self.registerribbonitem('create', cmdkey, pushbutton)
                                 newbuttoncount += 1
                             else:
-                                reportv('\t\tUpdating push button: {0}'.format(cmd.className))
+                                reportv('\t\tUpdating push button: {0}', cmd.className)
                                 pushbutton = existingribbonitempushbuttonsdict.pop(cmd.className)
-                                pushbutton.ToolTip = cmd.tooltip
+                                pushbutton.AssemblyName = self.newAssemblyLocation
+                                pushbutton.ClassName = self.getcommandtypename(cmd)
                                 pushbutton.Enabled = True
-                                if cmd.buttonIcons:
-                                    pushbutton.LargeImage = cmd.buttonIcons.mediumBitmap
-                                    # pushbutton.LargeImage = cmd.buttonIcons.largeBitmap
-                                else:
-                                    pushbutton.LargeImage = scriptGroup.buttonIcons.mediumBitmap
-                                    # pushbutton.LargeImage = scriptGroup.buttonIcons.largeBitmap
+                                self.populateribbonitem(pushbutton, cmdkey, cmd,
+                                                        cmd.buttonIcons or scriptGroup.buttonIcons,
+                                                        None, 'mediumBitmap')
+                                self.registerribbonitem('update', cmdkey, pushbutton)
                                 updatedbuttoncount += 1
                         for orphanedButtonName, orphanedButton in existingribbonitempushbuttonsdict.items():
-                            reportv('\tDisabling orphaned button: {0}'.format(orphanedButtonName))
+                            reportv('\tDisabling orphaned button: {0}', orphanedButtonName)
                             orphanedButton.Enabled = False
 
                     # StackedButtons
                     elif scriptGroup.groupType == self.settings.stackedThreeTypeName:
-                        reportv('\tCreating\\Updating 3 stacked buttons: {0}'.format(scriptGroup.groupType))
+                        reportv('\tCreating\\Updating 3 stacked buttons: {0}', scriptGroup.groupType)
                         stackcommands = []
+                        stackscripts = []
                         for cmd in scriptGroup.commands:
+                            cmdkey = PyRevitUISession.getribbonitemkey(scriptTab.tabName, scriptPanel.panelName,
+                                                                       cmd.className)
                             if cmd.className not in pyrevitribbonitemsdict:
-                                reportv('\t\tCreating stacked button: {0}'.format(cmd.className))
+                                reportv('\t\tCreating stacked button: {0}', cmd.className)
                                 buttondata = PushButtonData(cmd.className, cmd.cmdName, self.newAssemblyLocation,
-                                                            cmd.className)
-                                buttondata.ToolTip = cmd.tooltip
-                                if cmd.buttonIcons:
-                                    buttondata.Image = cmd.buttonIcons.smallBitmap
-                                else:
-                                    buttondata.Image = scriptGroup.buttonIcons.smallBitmap
+                                                            self.getcommandtypename(cmd))
                                 stackcommands.append(buttondata)
+                                stackscripts.append(cmd)
                                 newbuttoncount += 1
-                            else:
-                                reportv('\t\tUpdating stacked button: {0}'.format(cmd.className))
+                            elif self.changePlan.needsupdate(cmdkey):
+                                reportv('\t\tUpdating stacked button: {0}', cmd.className)
                                 ribbonitem = pyrevitribbonitemsdict.pop(cmd.className)
                                 ribbonitem.AssemblyName = self.newAssemblyLocation
-                                ribbonitem.ClassName = cmd.className
+                                ribbonitem.ClassName = self.getcommandtypename(cmd)
                                 ribbonitem.Enabled = True
                                 updatedbuttoncount += 1
-                                if cmd.buttonIcons:
-                                    ribbonitem.Image = cmd.buttonIcons.smallBitmap
-                                else:
-                                    ribbonitem.Image = scriptGroup.buttonIcons.smallBitmap
+                                self.populateribbonitem(ribbonitem, cmdkey, cmd,
+                                                        cmd.buttonIcons or scriptGroup.buttonIcons,
+                                                        'smallBitmap', None)
+                                self.registerribbonitem('update', cmdkey, ribbonitem)
                         if len(stackcommands) == 3:
-                            pyrevitribbonpanel.AddStackedItems(*stackcommands)
+                            stackeditems = pyrevitribbonpanel.AddStackedItems(*stackcommands)
+                            for stackeditem, cmd in zip(stackeditems, stackscripts):
+                                cmdkey = PyRevitUISession.getribbonitemkey(scriptTab.tabName, scriptPanel.panelName,
+                                                                           stackeditem.Name)
+                                self.populateribbonitem(stackeditem, cmdkey, cmd,
+                                                        cmd.buttonIcons or scriptGroup.buttonIcons,
+                                                        'smallBitmap', None)
+                                self.registerribbonitem('create', cmdkey, stackeditem)
 
                     # PushButton
                     elif scriptGroup.groupType == self.settings.pushButtonTypeName and not scriptGroup.islinkbutton():
                         try:
-                            cmd = scriptGroup.commands.pop()
+                            # the command stays in the group so the script watcher can find its ribbon item
+                            cmd = scriptGroup.commands[-1]
+                            cmdkey = PyRevitUISession.getribbonitemkey(scriptTab.tabName, scriptPanel.panelName,
+                                                                       cmd.className)
                             if cmd.className not in pyrevitribbonitemsdict:
-                                reportv('\tCreating push button: {0}'.format(cmd.className))
+                                reportv('\tCreating push button: {0}', cmd.className)
                                 ribbonitem = pyrevitribbonpanel.AddItem(
                                     PushButtonData(cmd.className, scriptGroup.groupName, self.newAssemblyLocation,
-                                                   cmd.className))
+                                                   self.getcommandtypename(cmd)))
+                                self.registerribbonitem('create', cmdkey, ribbonitem)
                                 newbuttoncount += 1
                             else:
-                                reportv('\tUpdating push button: {0}'.format(cmd.className))
+                                reportv('\tUpdating push button: {0}', cmd.className)
                                 ribbonitem = pyrevitribbonitemsdict.pop(cmd.className)
                                 ribbonitem.AssemblyName = self.newAssemblyLocation
-                                ribbonitem.ClassName = cmd.className
+                                ribbonitem.ClassName = self.getcommandtypename(cmd)
                                 ribbonitem.Enabled = True
+                                self.registerribbonitem('update', cmdkey, ribbonitem)
                                 updatedbuttoncount += 1
-                            ribbonitem.ToolTip = cmd.tooltip
-                            ribbonitem.Image = scriptGroup.buttonIcons.smallBitmap
-                            ribbonitem.LargeImage = scriptGroup.buttonIcons.largeBitmap
+                            self.populateribbonitem(ribbonitem, cmdkey, cmd, scriptGroup.buttonIcons,
+                                                    'smallBitmap', 'largeBitmap')
                         except:
-                            reportv(
-                                '\tPushbutton has no associated scripts. Skipping {0}'.format(scriptGroup.sourceFile))
+                            reportv('\tPushbutton has no associated scripts. Skipping {0}', scriptGroup.sourceFile)
                             continue
 
                     # SmartButton
                     elif scriptGroup.groupType == self.settings.smartButtonTypeName and not scriptGroup.islinkbutton():
                         try:
-                            cmd = scriptGroup.commands.pop()
+                            # the command stays in the group so the script watcher can find its ribbon item
+                            cmd = scriptGroup.commands[-1]
+                            cmdkey = PyRevitUISession.getribbonitemkey(scriptTab.tabName, scriptPanel.panelName,
+                                                                       cmd.className)
                             if cmd.className not in pyrevitribbonitemsdict:
-                                reportv('\tCreating push button: {0}'.format(cmd.className))
+                                reportv('\tCreating push button: {0}', cmd.className)
                                 ribbonitem = pyrevitribbonpanel.AddItem(
                                     PushButtonData(cmd.className, scriptGroup.groupName, self.newAssemblyLocation,
-                                                   cmd.className))
+                                                   self.getcommandtypename(cmd)))
+                                self.registerribbonitem('create', cmdkey, ribbonitem)
                                 newbuttoncount += 1
                             else:
-                                reportv('\tUpdating push button: {0}'.format(cmd.className))
+                                reportv('\tUpdating push button: {0}', cmd.className)
                                 ribbonitem = pyrevitribbonitemsdict.pop(cmd.className)
                                 ribbonitem.AssemblyName = self.newAssemblyLocation
-                                ribbonitem.ClassName = cmd.className
+                                ribbonitem.ClassName = self.getcommandtypename(cmd)
                                 ribbonitem.Enabled = True
+                                self.registerribbonitem('update', cmdkey, ribbonitem)
                                 updatedbuttoncount += 1
-                            ribbonitem.ToolTip = cmd.tooltip
-                            importedscript = __import__(cmd.getscriptbasename())
-                            importedscript.selfInit(__revit__, cmd.getfullscriptaddress(), ribbonitem)
+                            self.populateribbonitem(ribbonitem, cmdkey, cmd,
+                                                    self.getsmartbuttonicons(scriptGroup, cmd),
+                                                    'smallBitmap', 'largeBitmap')
+                            self.initsmartbutton(cmd, cmdkey, ribbonitem)
                         except:
-                            reportv(
-                                '\tSmart button has no associated scripts. Skipping {0}'.format(scriptGroup.sourceFile))
+                            reportv('\tSmart button has no associated scripts. Skipping {0}', scriptGroup.sourceFile)
                             continue
 
                     # LinkButton
                     elif scriptGroup.groupType == self.settings.linkButtonTypeName and scriptGroup.islinkbutton():
                         if scriptGroup.groupName not in pyrevitribbonitemsdict:
-                            reportv('\tCreating push button link to other assembly: {0}'.format(scriptGroup.groupName))
+                            reportv('\tCreating push button link to other assembly: {0}', scriptGroup.groupName)
                             ribbonitem = pyrevitribbonpanel.AddItem(
                                 PushButtonData(scriptGroup.groupName, scriptGroup.groupName,
                                                scriptGroup.assemblyLocation,
                                                scriptGroup.assemblyName + '.' + scriptGroup.assemblyClassName))
+                            self.registerribbonitem('create', groupkey, ribbonitem)
                             newbuttoncount += 1
                         else:
-                            reportv('\tUpdating push button link to other assembly: {0}'.format(scriptGroup.groupName))
+                            reportv('\tUpdating push button link to other assembly: {0}', scriptGroup.groupName)
                             ribbonitem = pyrevitribbonitemsdict.pop(scriptGroup.groupName)
                             ribbonitem.AssemblyName = scriptGroup.assemblyLocation
                             ribbonitem.ClassName = scriptGroup.assemblyName + '.' + scriptGroup.assemblyClassName
                             ribbonitem.Enabled = True
+                            self.registerribbonitem('update', groupkey, ribbonitem)
                             updatedbuttoncount += 1
-                        ribbonitem.Image = scriptGroup.buttonIcons.smallBitmap
-                        ribbonitem.LargeImage = scriptGroup.buttonIcons.largeBitmap
-
-                # now disable all orphaned buttons in this panel
-                for orphanedRibbonItemName, orphanedRibbonItem in pyrevitribbonitemsdict.items():
-                    reportv('\tDisabling orphaned ribbon item: {0}'.format(orphanedRibbonItemName))
-                    orphanedRibbonItem.Enabled = False
+                        self.populateribbonitem(ribbonitem, groupkey, None, scriptGroup.buttonIcons,
+                                                'smallBitmap', 'largeBitmap')
+
+                # now disable all orphaned buttons in this panel.
+                # an incremental plan skips untouched items, so the removed items come from the plan instead.
+                if self.changePlan.isFull:
+                    for orphanedRibbonItemName, orphanedRibbonItem in pyrevitribbonitemsdict.items():
+                        reportv('\tDisabling orphaned ribbon item: {0}', orphanedRibbonItemName)
+                        orphanedRibbonItem.Enabled = False
+
+        if not self.changePlan.isFull:
+            self.disableremovedribbonitems()
+        AppDomain.CurrentDomain.SetData(self.settings.ribbonStateDataKey, ribbonstate)
+        # the icons and tooltips of the items are not set until the idle queue runs their tasks
+        self.idleQueue.setribbonstate(ribbonstate)
 
         # final report
         reportv('\n\n')
-        report('{0} buttons created...\n{1} buttons updated...\n\n'.format(newbuttoncount, updatedbuttoncount))
+        report('{0} buttons created...\n{1} buttons updated...\n\n', newbuttoncount, updatedbuttoncount)
+        self.changePlan.report()
+
+    def populateribbonitem(self, ribbonitem, statekey, cmd, buttonicons, imagename, largeimagename):
+        """Queues the tooltip and icons of a ribbon item. Placeholder images are shown until they are set."""
+        if self.idleQueue.deferred and buttonicons:
+            if imagename:
+                ribbonitem.Image = iconCache.getplaceholder(16)
+            if largeimagename:
+                ribbonitem.LargeImage = iconCache.getplaceholder(32)
+        self.idleQueue.add(ribbonitem.Name, PyRevitUISession.setribbonitemui,
+                           ribbonitem, cmd, buttonicons, imagename, largeimagename, statekey=statekey)
+
+    @staticmethod
+    def setribbonitemui(ribbonitem, cmd, buttonicons, imagename, largeimagename):
+        if cmd:
+            ribbonitem.ToolTip = cmd.gettooltip()
+        if buttonicons:
+            if imagename:
+                ribbonitem.Image = getattr(buttonicons, imagename)
+            if largeimagename:
+                ribbonitem.LargeImage = getattr(buttonicons, largeimagename)
+
+    def getsmartbuttoninitmode(self, cmd):
+        return ScriptCommand.extractparameter(self.settings.smartButtonInitParameter, cmd.getfullscriptaddress())
+
+    def getsmartbuttonicons(self, scriptGroup, cmd):
+        # selfInit sets the icon of a smart button. the ones that are initialized on click show the group icon
+        # until their script sets its own
+        if self.getsmartbuttoninitmode(cmd) == 'click':
+            return scriptGroup.buttonIcons
+        return None
+
+    def initsmartbutton(self, cmd, statekey, ribbonitem):
+        """Initializes a smart button according to the __selfinit__ parameter in its script header.
+        'startup' runs selfInit during the load, 'click' leaves the initialization to the script when the button
+        is clicked, and anything else runs selfInit in idle time after the other ribbon items are populated."""
+        initmode = self.getsmartbuttoninitmode(cmd)
+        if initmode == 'startup':
+            try:
+                PyRevitUISession.selfinitsmartbutton(cmd, ribbonitem)
+            except Exception:
+                reportwarning('Smart button could not be initialized. Skipping: {0}', cmd.className)
+                self.idleQueue.invalidate([statekey])
+        elif initmode == 'click':
+            reportv('\tSmart button will initialize when clicked: {0}', cmd.className)
+        else:
+            self.smartButtonInits.append((cmd, statekey, ribbonitem))
+
+    @staticmethod
+    def selfinitsmartbutton(cmd, ribbonitem):
+        with startupTimer.span('smartbutton', cmd.className):
+            importedscript = __import__(cmd.getscriptbasename())
+            importedscript.selfInit(__revit__, cmd.getfullscriptaddress(), ribbonitem)
 
     def createpyrevitui(self):
         # setting up UI
         reportv('Now setting up ribbon, panels, and buttons...')
-        self.createorfindpyrevitpanels()
+        groupstates, ribbonstate = self.createchangeplan()
+        self.createorfindpyrevitpanels(groupstates)
         reportv('Ribbon tab and panels are ready. Creating script groups and command buttons...')
-        self.createui()
+        self.createui(groupstates, ribbonstate)
+        # smart buttons are initialized after all other ribbon items are populated
+        for cmd, statekey, ribbonitem in self.smartButtonInits:
+            self.idleQueue.add(cmd.className, PyRevitUISession.selfinitsmartbutton, cmd, ribbonitem,
+                               statekey=statekey)
         reportv('All UI items have been added...')
 
 
+def find_mirror_home_directory(homedir, settings):
+    """Returns the local copy to run the session from when the home directory is on a network share."""
+    sourcedir = PyRevitLocalMirror.findsourcedir(homedir) or homedir
+    if not settings.useLocalMirror \
+            or (settings.mirrorNetworkHomeOnly and not PyRevitLocalMirror.isnetworkfolder(sourcedir)):
+        return homedir
+    mirrorfolder = settings.localMirrorFolder \
+        or op.join(os.getenv('LOCALAPPDATA') or find_user_temp_directory(), 'pyRevitMirror')
+    sourcehash = hashlib.md5(op.normcase(sourcedir).encode('utf-8')).hexdigest()[:8]
+    mirror = PyRevitLocalMirror(sourcedir, op.join(mirrorfolder, sourcehash))
+    with startupTimer.span('phase', 'localmirror'):
+        if not op.isdir(sourcedir):
+            if mirror.hasmirror():
+                reportwarning('Can not reach {0}. Running from the last local copy.', sourcedir)
+                return mirror.mirrorDir
+            reportwarning('Can not reach {0} and there is no local copy of it yet.', sourcedir)
+            return homedir
+        try:
+            mirror.sync()
+        except Exception as err:
+            # files copied before the share dropped are copied again on the next update, since the local manifest
+            # is only saved after a complete update
+            if mirror.hasmirror() and (not mirror.copiedFiles or not op.isdir(sourcedir)):
+                reportwarning('Can not update the local copy of {0}. Running from the last local copy: {1}',
+                              sourcedir, err)
+                return mirror.mirrorDir
+            reportwarning('Can not update the local copy of {0}. Running from the share: {1}', sourcedir, err)
+            return sourcedir
+        try:
+            newerfiles = mirror.findnewerfiles(mirror.sourceEntries)
+        except Exception as err:
+            newerfiles = []
+            reportv('Can not check the share for files newer than its manifest: {0}', err)
+        if newerfiles:
+            reportwarning('{0} files on {1} are newer than its mirror manifest, so the local copy may be out of date. '
+                          'Build the manifest again with _headless/mirrormanifest.py after deploying: {2}',
+                          len(newerfiles), sourcedir, ', '.join(newerfiles[:5]))
+    startupTimer.count('mirrorFilesCopied', len(mirror.copiedFiles))
+    report('Local copy of {0} is up to date: {1} files copied ({2} KB), {3} removed, {4} unchanged.',
+           sourcedir, len(mirror.copiedFiles), mirror.copiedSize // 1024, len(mirror.removedFiles),
+           mirror.unchangedCount)
+    return mirror.mirrorDir
+
+
+def start_session(homedir, settings, discoveronly=False):
+    global startupTimer, iconCache, assemblyIndex, loaderLog
+    startupTimer = PyRevitStartupTimer()
+    iconCache = PyRevitIconCache()
+    assemblyIndex = PyRevitAssemblyIndex()
+    # Settings > showLoaderLog asks for the full trace of one load this way
+    if AppDomain.CurrentDomain.GetData(settings.traceNextLoadDataKey):
+        AppDomain.CurrentDomain.SetData(settings.traceNextLoadDataKey, None)
+        settings.logFileLevel = PyRevitLoaderLog.DEBUG
+    loaderLog = PyRevitLoaderLog(settings.logLevel,
+                                 settings.logFileLevel,
+                                 op.join(find_user_temp_directory(), settings.logFileName),
+                                 settings.bufferLoaderLog)
+    try:
+        homedir = find_mirror_home_directory(homedir, settings)
+        extensiondirs = [find_mirror_home_directory(folder, settings) for folder in settings.extensionFolders]
+        session = PyRevitUISession(homedir, settings, extensiondirs)
+        if discoveronly:
+            session.discover()
+        else:
+            session.load()
+        return session
+    finally:
+        if loaderLog.logFile and loaderLog.fileLevel < loaderLog.windowLevel:
+            report('Full loader trace saved to: {0}', loaderLog.logFile)
+        loaderLog.flush()
+
+
 # MAIN
-__window__.Width = 1100
-# find pyRevit home directory and initialize current session
-thisSession = PyRevitUISession(find_home_directory(), PyRevitUISettings())
+# the headless driver under _headless/ defines __pyrevit_headless__ and calls start_session itself
+if not globals().get('__pyrevit_headless__', False):
+    __window__.Width = 1100
+    # find pyRevit home directory and initialize current session
+    thisSession = start_session(find_home_directory(), PyRevitUISettings())
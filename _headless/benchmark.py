@@ -0,0 +1,188 @@
+"""Startup benchmark for the pyRevit loader on synthetic script trees.
+
+Generates script trees with the pyRevit naming conventions (descriptor images, scripts and icons)
+and runs the loader against the Revit API stand-in in revitstandin.py. For every tree it reports
+the time of each startup phase for a cold start and for a reload in the same process, and the
+memory and allocations of each phase:
+
+    python _headless/benchmark.py [--trees 10x1000,25x5000,50x10000] [--keep folder]
+
+Each tree is given as <tab count>x<command count>. The total is the time Revit is blocked for; the
+icons, tooltips and smart buttons populated later in idle time are reported as the idleuipopulation phase. Timings come from a run without tracemalloc,
+memory and allocations from a second run with tracemalloc tracing, since tracing slows the loader down.
+Needs CPython 3.9 or newer.
+"""
+
+import sys
+import os
+import os.path as op
+import gc
+import time
+import shutil
+import tempfile
+import tracemalloc
+
+import revitstandin
+
+defaultTrees = '10x1000,25x5000,50x10000'
+groupsPerPanel = 10
+commandsPerGroup = 20
+scriptHeader = '''"""Synthetic command {0}."""
+
+__doc__ = 'Synthetic command {0} for the startup benchmark.'
+
+import os
+
+'''
+scriptBody = 'print(os.getcwd())\n' * 40
+
+
+def maketree(rootdir, tabcount, commandcount):
+    """Creates tabcount tab folders with commandcount scripts spread over them.
+    Every group is a pulldown button with commandsPerGroup scripts, and every other script has its own icon."""
+    commandspertab = max(1, commandcount // tabcount)
+    groupspertab = max(1, commandspertab // commandsPerGroup)
+    for tabindex in range(tabcount):
+        tabname = 'Bench{0:02}'.format(tabindex)
+        tabdir = op.join(rootdir, tabname)
+        os.makedirs(tabdir)
+        for groupindex in range(groupspertab):
+            panelname = 'Panel{0}'.format(groupindex // groupsPerPanel)
+            groupname = 'T{0}G{1}'.format(tabindex, groupindex)
+            descriptorname = '{0:02}{1:02}_{2}_PulldownButton_{3}.png'.format(groupindex // groupsPerPanel,
+                                                                            groupindex % groupsPerPanel,
+                                                                            panelname, groupname)
+            open(op.join(tabdir, descriptorname), 'wb').close()
+            for commandindex in range(commandsPerGroup):
+                commandname = '{0}_cmd{1}'.format(groupname, commandindex)
+                with open(op.join(tabdir, commandname + '.py'), 'w') as f:
+                    f.write(scriptHeader.format(commandname) + scriptBody)
+                if commandindex % 2:
+                    open(op.join(tabdir, commandname + '.png'), 'wb').close()
+    return tabcount * groupspertab * commandsPerGroup
+
+
+class PhaseMeasurement:
+    def __init__(self, phase):
+        self.phase = phase
+        self.duration = 0.0
+        self.peak = 0
+        self.allocated = 0
+        self.blocks = 0
+
+
+def maketracingtimer(loaderglobals, measurements):
+    """Returns a startup timer class that also measures traced memory and allocations of each phase."""
+    basetimer = loaderglobals['PyRevitStartupTimer']
+
+    class TracingSpan:
+        def __init__(self, basespan):
+            self.baseSpan = basespan
+            self.measurement = PhaseMeasurement(basespan.name)
+            self.startSnapshot = None
+
+        def __enter__(self):
+            tracemalloc.reset_peak()
+            self.startSnapshot = tracemalloc.take_snapshot()
+            self.startMemory = tracemalloc.get_traced_memory()[0]
+            return self.baseSpan.__enter__()
+
+        def __exit__(self, exctype, excvalue, exctraceback):
+            result = self.baseSpan.__exit__(exctype, excvalue, exctraceback)
+            current, peak = tracemalloc.get_traced_memory()
+            stats = tracemalloc.take_snapshot().compare_to(self.startSnapshot, 'filename')
+            self.measurement.peak = peak - self.startMemory
+            self.measurement.allocated = current - self.startMemory
+            self.measurement.blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+            measurements.append(self.measurement)
+            return result
+
+    class TracingStartupTimer(basetimer):
+        def span(self, category, name):
+            basespan = basetimer.span(self, category, name)
+            return TracingSpan(basespan) if category == 'phase' else basespan
+
+    return TracingStartupTimer
+
+
+def runsession(homedir, appdomain, uiapp, tracing):
+    """Runs one quiet loader session and returns its phase measurements."""
+    loaderglobals = revitstandin.execloader(homedir, uiapp, appdomain)
+    measurements = []
+    if tracing:
+        loaderglobals['PyRevitStartupTimer'] = maketracingtimer(loaderglobals, measurements)
+    settings = loaderglobals['PyRevitUISettings']()
+    settings.logLevel = 40
+    settings.logFileLevel = None
+    gc.collect()
+    starttime = time.time()
+    session = loaderglobals['start_session'](homedir, settings)
+    total = time.time() - starttime
+    uiapp.runidle()
+    if not tracing:
+        for phase, duration in loaderglobals['startupTimer'].spans['phase']:
+            measurement = PhaseMeasurement(phase)
+            measurement.duration = duration
+            measurements.append(measurement)
+    return session, measurements, total
+
+
+def benchmarktree(rootdir, tabcount, commandcount):
+    homedir = op.join(rootdir, '{0}x{1}'.format(tabcount, commandcount))
+    os.makedirs(homedir)
+    commandcount = maketree(homedir, tabcount, commandcount)
+    results = {}
+    for tracing in (False, True):
+        # a fresh temp folder and AppDomain make the first session a cold start
+        tempdir = op.join(homedir, '_temp')
+        shutil.rmtree(tempdir, ignore_errors=True)
+        os.makedirs(tempdir)
+        os.environ['Temp'] = tempdir
+        appdomain = revitstandin.StandInAppDomain()
+        uiapp = revitstandin.StandInUIApplication()
+        if tracing:
+            tracemalloc.start()
+        for run in ('cold', 'reload'):
+            session, measurements, total = runsession(homedir, appdomain, uiapp, tracing)
+            results[(run, tracing)] = (measurements, total)
+        if tracing:
+            tracemalloc.stop()
+    return commandcount, results
+
+
+def report(tabcount, commandcount, results):
+    print('\n{0} tabs, {1} commands'.format(tabcount, commandcount))
+    print('{0:<30}{1:>12}{2:>12}{3:>14}{4:>14}{5:>12}'.format('phase', 'cold s', 'reload s',
+                                                              'peak KiB', 'kept KiB', 'blocks'))
+    coldtimes, coldtotal = results[('cold', False)]
+    reloadtimes, reloadtotal = results[('reload', False)]
+    coldmemory = dict((m.phase, m) for m in results[('cold', True)][0])
+    reloadduration = dict((m.phase, m.duration) for m in reloadtimes)
+    for measurement in coldtimes:
+        line = '{0:<30}{1:>12.3f}{2:>12.3f}'.format(measurement.phase, measurement.duration,
+                                                    reloadduration.get(measurement.phase, 0.0))
+        # phases that run in idle time are not measured with tracemalloc
+        memory = coldmemory.get(measurement.phase)
+        if memory:
+            line += '{0:>14.1f}{1:>14.1f}{2:>12}'.format(memory.peak / 1024.0, memory.allocated / 1024.0,
+                                                        memory.blocks)
+        print(line)
+    print('{0:<30}{1:>12.3f}{2:>12.3f}'.format('total', coldtotal, reloadtotal))
+
+
+if __name__ == '__main__':
+    trees = defaultTrees
+    keepdir = None
+    if '--trees' in sys.argv:
+        trees = sys.argv[sys.argv.index('--trees') + 1]
+    if '--keep' in sys.argv:
+        keepdir = op.abspath(sys.argv[sys.argv.index('--keep') + 1])
+    rootdir = keepdir or tempfile.mkdtemp(prefix='pyRevitBenchmark')
+    try:
+        for tree in trees.split(','):
+            tabcount, commandcount = [int(x) for x in tree.split('x')]
+            commandcount, results = benchmarktree(rootdir, tabcount, commandcount)
+            report(tabcount, commandcount, results)
+    finally:
+        if not keepdir:
+            shutil.rmtree(rootdir, ignore_errors=True)
@@ -0,0 +1,105 @@
+"""Benchmark for the selection memory id sets.
+
+Compares the compressed bitmap id sets in pyRevit/_idset.py with the pickled sets of id strings that the
+memory scripts used before, for a memory and a selection of the given sizes:
+
+    python _headless/idsetbenchmark.py [--sizes 10000,100000,1000000]
+
+Ids are drawn from a model-like id range where most ids are used, and the selection overlaps half of the
+memory. For each size it reports the time of building the sets and of each set operation, the time of
+writing and reading the memory file, and the size of the file.
+"""
+
+import sys
+import os
+import os.path as op
+import random
+import shutil
+import tempfile
+import time
+import pickle as pl
+
+sys.path.append(op.join(op.dirname(op.dirname(op.abspath(__file__))), 'pyRevit'))
+
+from _idset import IdSet
+import _selectionmemory
+
+defaultSizes = '10000,100000,1000000'
+firstElementId = 300000
+idDensity = 0.7
+operations = ('union', 'difference', 'intersection', 'symmetric_difference')
+
+
+def makeids(count, seed):
+    """Returns the memory ids and the selection ids. The selection shares half of its ids with the memory."""
+    rand = random.Random(seed)
+    idrange = range(firstElementId, firstElementId + int(count * 2 / idDensity))
+    ids = rand.sample(idrange, count * 2)
+    memory = ids[:count]
+    selection = memory[:count // 2] + ids[count:count + count - count // 2]
+    return memory, selection
+
+
+def timed(func, *args):
+    starttime = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - starttime
+
+
+def writepickle(datafile, ids):
+    with open(datafile, 'w') as f:
+        f.write(pl.dumps(ids, 0).decode('latin-1'))
+
+
+def readpickle(datafile):
+    with open(datafile, 'rb') as f:
+        return pl.load(f)
+
+
+def benchmarkstrings(memory, selection, datafile):
+    results = {}
+    (memset, selset), results['build'] = timed(lambda: (set(str(x) for x in memory), set(str(x) for x in selection)))
+    for operation in operations:
+        results[operation] = timed(getattr(memset, operation), selset)[1]
+    results['write'] = timed(writepickle, datafile, memset)[1]
+    results['read'] = timed(readpickle, datafile)[1]
+    results['file KiB'] = op.getsize(datafile) / 1024.0
+    return results
+
+
+def benchmarkidset(memory, selection, datafile):
+    results = {}
+    (memset, selset), results['build'] = timed(lambda: (IdSet(memory), IdSet(selection)))
+    for operation in operations:
+        result, results[operation] = timed(getattr(memset, operation), selset)
+        assert len(result) == len(getattr(set(memory), operation)(selection))
+    results['write'] = timed(_selectionmemory.writeids, datafile, memset)[1]
+    results['read'] = timed(_selectionmemory.readids, datafile)[1]
+    results['file KiB'] = op.getsize(datafile) / 1024.0
+    return results
+
+
+def report(count, stringresults, idsetresults):
+    print('\n{0} ids in memory, {0} selected'.format(count))
+    print('{0:<24}{1:>18}{2:>18}{3:>10}'.format('', 'pickled strings', 'id set', 'ratio'))
+    for name in ('build',) + operations + ('write', 'read', 'file KiB'):
+        unit = '' if name == 'file KiB' else ' ms'
+        scale = 1.0 if name == 'file KiB' else 1000.0
+        before, after = stringresults[name] * scale, idsetresults[name] * scale
+        print('{0:<24}{1:>18.2f}{2:>18.2f}{3:>9.1f}x'.format(name + unit, before, after,
+                                                          before / after if after else 0.0))
+
+
+if __name__ == '__main__':
+    sizes = defaultSizes
+    if '--sizes' in sys.argv:
+        sizes = sys.argv[sys.argv.index('--sizes') + 1]
+    tempdir = tempfile.mkdtemp(prefix='pyRevitIdSetBenchmark')
+    try:
+        for count in [int(x) for x in sizes.split(',')]:
+            memory, selection = makeids(count, count)
+            stringresults = benchmarkstrings(memory, selection, op.join(tempdir, 'strings.pym'))
+            idsetresults = benchmarkidset(memory, selection, op.join(tempdir, 'idset.pym'))
+            report(count, stringresults, idsetresults)
+    finally:
+        shutil.rmtree(tempdir, ignore_errors=True)
@@ -0,0 +1,59 @@
+"""Checks that the manifest written by one session is used by the next one.
+
+Runs two sessions on the home folder against the Revit API stand-in, each from a fresh temp folder and
+AppDomain except for the manifest, and fails if the second session lists any folder or reads any script that did not
+change. Then reloads the second session in its AppDomain, which only touches the items that changed, and runs a third
+session from a fresh AppDomain that must find every script in the manifest the reload saved:
+
+    python _headless/manifestcheck.py [home folder]
+
+Both ways of populating the ribbon are checked, since tooltips are read in idle time when the population
+is deferred and the manifest has to be saved after that.
+"""
+
+import sys
+import os
+import os.path as op
+import shutil
+import tempfile
+
+import revitstandin
+
+
+def runsession(homedir, deferuipopulation, uiapp=None, appdomain=None):
+    session, loaderglobals = revitstandin.run(homedir, uiapp=uiapp,
+                                              appdomain=appdomain or revitstandin.StandInAppDomain(),
+                                              logLevel=40, logFileLevel=None, useScriptWatcher=False,
+                                              deferUIPopulation=deferuipopulation)
+    return session.manifest, loaderglobals
+
+
+def checkmanifest(homedir, deferuipopulation):
+    tempdir = tempfile.mkdtemp(prefix='pyRevitManifestCheck')
+    os.environ['Temp'] = tempdir
+    try:
+        first, loaderglobals = runsession(homedir, deferuipopulation)
+        second, loaderglobals = runsession(homedir, deferuipopulation)
+        runsession(homedir, deferuipopulation, loaderglobals['__revit__'], loaderglobals['__appdomain__'])
+        third, loaderglobals = runsession(homedir, deferuipopulation)
+    finally:
+        shutil.rmtree(tempdir, ignore_errors=True)
+    print('deferUIPopulation={0}: first session {1} folders listed, {2} parsed. '
+          'second session {3} folder hits, {4} listed, {5} hits, {6} parsed.'
+          .format(deferuipopulation, first.folderMisses, first.misses, second.folderHits, second.folderMisses,
+                  second.hits, second.misses))
+    print('deferUIPopulation={0}: session after a reload {1} hits, {2} parsed.'
+          .format(deferuipopulation, third.hits, third.misses))
+    return second.hits > 0 and second.misses == 0 and second.hits == first.misses \
+        and second.folderMisses == 0 and second.folderHits == first.folderMisses \
+        and third.misses == 0 and third.hits == first.misses
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    rootdir = op.abspath(args[0]) if args else op.dirname(op.dirname(op.abspath(__file__)))
+    results = [checkmanifest(rootdir, deferuipopulation) for deferuipopulation in (True, False)]
+    if not all(results):
+        print('A session listed folders or parsed scripts that were in the manifest.')
+        sys.exit(1)
+    print('Manifest reused.')
@@ -0,0 +1,25 @@
+"""Writes the local mirror manifest of a pyRevit home folder deployed on a network share.
+
+When the home folder is on a network share, every user runs pyRevit from a local copy that is updated
+at startup from the manifest on the share. Run this after every deployment to the share:
+
+    python _headless/mirrormanifest.py <home folder on the share>
+
+The manifest lists the relative path, size and hash of every deployed file. Users only copy the files
+whose entries changed since their last startup.
+"""
+
+import sys
+import os.path as op
+
+import revitstandin
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    homedir = op.abspath(sys.argv[1])
+    loaderglobals = revitstandin.execloader(homedir)
+    manifestfile, filecount = loaderglobals['PyRevitLocalMirror'].buildmanifest(homedir)
+    print('{0} files listed in {1}'.format(filecount, manifestfile))
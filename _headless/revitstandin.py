@@ -0,0 +1,396 @@
+"""Revit API stand-in for running the pyRevit loader outside Revit.
+
+The loader in __init__.py only runs inside RevitPythonLoader, where clr, the .NET assemblies,
+__revit__ and the output window are provided by the host. This module registers stand-ins for
+those under CPython 3 so the discovery and ribbon creation code can be run, timed and compared on
+any machine:
+
+    python _headless/revitstandin.py [homedir] [--discover] [--ribbon] [--verbose] [--mirror=<folder>]
+        [--extension=<folder> ...]
+
+The stand-ins only record what the loader asks for. No assembly is emitted and no image is decoded.
+Loader state that Revit keeps on the AppDomain (icon cache, dispatcher slots, ribbon state) lives on
+the stand-in AppDomain, so running the loader twice in the same process behaves like a reload.
+"""
+
+import sys
+import os
+import os.path as op
+import types
+import tempfile
+
+
+class StandInObject(object):
+    """Accepts any attribute access, call, index or flag combination and returns another stand-in."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return StandInObject()
+
+    def __call__(self, *args, **kwargs):
+        return StandInObject()
+
+    def __getitem__(self, key):
+        return StandInObject
+
+    def __or__(self, other):
+        return self
+
+    def __iter__(self):
+        return iter([])
+
+
+# RIBBON
+class StandInEvent(object):
+    def __init__(self):
+        self.handlers = []
+
+    def __iadd__(self, handler):
+        self.handlers.append(handler)
+        return self
+
+    def __isub__(self, handler):
+        self.handlers.remove(handler)
+        return self
+
+    def fire(self, sender, args=None):
+        for handler in list(self.handlers):
+            handler(sender, args)
+
+
+class StandInIdlingEventArgs(object):
+    def __init__(self):
+        self.raiseWithoutDelay = False
+
+    def SetRaiseWithoutDelay(self):
+        self.raiseWithoutDelay = True
+
+
+class StandInRibbonItem(object):
+    """Stands in for the button data classes and for the ribbon items created from them."""
+
+    def __init__(self, name, text=None, assemblyname=None, classname=None):
+        self.Name = name
+        self.ItemText = text
+        self.AssemblyName = assemblyname
+        self.ClassName = classname
+        self.ToolTip = None
+        self.Image = None
+        self.LargeImage = None
+        self.Enabled = True
+        self.items = []
+
+    def AddPushButton(self, buttondata):
+        self.items.append(buttondata)
+        return buttondata
+
+    def GetItems(self):
+        return list(self.items)
+
+
+class StandInRibbonPanel(object):
+    def __init__(self, name):
+        self.Name = name
+        self.items = []
+
+    def AddItem(self, itemdata):
+        self.items.append(itemdata)
+        return itemdata
+
+    def AddStackedItems(self, *itemdatas):
+        self.items.extend(itemdatas)
+        return list(itemdatas)
+
+    def GetItems(self):
+        return list(self.items)
+
+
+class StandInUIApplication(object):
+    """Stands in for __revit__. Keeps the created ribbon tabs and panels for inspection."""
+
+    def __init__(self, versionnumber='2016'):
+        self.Application = types.SimpleNamespace(VersionNumber=versionnumber)
+        self.tabs = {}
+        self.Idling = StandInEvent()
+        # no project is open in the stand-in
+        self.ActiveUIDocument = None
+
+    def runidle(self):
+        """Raises Idling while the loader has idle time work left, like Revit does while the user is not busy.
+        Stops once no handler is left, or when the handlers that are left neither asked to be called again nor
+        changed, like the script watcher waiting for file events. Returns the call count."""
+        idlingcount = 0
+        while self.Idling.handlers:
+            handlers = list(self.Idling.handlers)
+            args = StandInIdlingEventArgs()
+            self.Idling.fire(self, args)
+            idlingcount += 1
+            if not args.raiseWithoutDelay and handlers == self.Idling.handlers:
+                break
+        return idlingcount
+
+    def CreateRibbonTab(self, tabname):
+        self.tabs[tabname] = []
+
+    def GetRibbonPanels(self, tabname):
+        if tabname not in self.tabs:
+            raise Exception('Ribbon tab does not exist: {0}'.format(tabname))
+        return list(self.tabs[tabname])
+
+    def CreateRibbonPanel(self, tabname, panelname):
+        panel = StandInRibbonPanel(panelname)
+        self.tabs[tabname].append(panel)
+        return panel
+
+    def dumpribbon(self):
+        """Returns the created ribbon as text. Useful for comparing the ribbon of two loader versions."""
+        lines = []
+        for tabname in sorted(self.tabs):
+            for panel in self.tabs[tabname]:
+                lines.append('{0}/{1}'.format(tabname, panel.Name))
+                for item in panel.items:
+                    lines.append('  {0} {1} enabled={2}'.format(item.Name, item.ClassName, item.Enabled))
+                    for subitem in item.items:
+                        lines.append('    {0} {1} enabled={2}'.format(subitem.Name, subitem.ClassName, subitem.Enabled))
+        return '\n'.join(lines)
+
+
+# FILE SYSTEM
+class StandInFileSystemEventArgs(object):
+    def __init__(self, fullpath, oldfullpath=None):
+        self.FullPath = fullpath
+        if oldfullpath:
+            self.OldFullPath = oldfullpath
+
+
+class StandInFileSystemWatcher(object):
+    """Does not watch anything. Call raiseevent to hand the loader a file event, as the worker thread would."""
+    instances = []
+
+    def __init__(self, path):
+        self.Path = path
+        self.IncludeSubdirectories = False
+        self.NotifyFilter = None
+        self.EnableRaisingEvents = False
+        self.Changed = StandInEvent()
+        self.Created = StandInEvent()
+        self.Deleted = StandInEvent()
+        self.Renamed = StandInEvent()
+        StandInFileSystemWatcher.instances.append(self)
+
+    def raiseevent(self, eventname, fullpath, oldfullpath=None):
+        if self.EnableRaisingEvents:
+            getattr(self, eventname).fire(self, StandInFileSystemEventArgs(fullpath, oldfullpath))
+
+    def Dispose(self):
+        StandInFileSystemWatcher.instances.remove(self)
+
+
+class StandInFileSystemInfo(object):
+    def __init__(self, fullpath):
+        self.FullName = fullpath
+        self.Name = op.basename(fullpath)
+        self.LastWriteTimeUtc = getlastwritetimeutc(fullpath)
+
+
+class StandInDirectoryInfo(StandInFileSystemInfo):
+    def GetFiles(self):
+        return [StandInFileSystemInfo(op.join(self.FullName, f)) for f in sorted(os.listdir(self.FullName))
+                if op.isfile(op.join(self.FullName, f))]
+
+    def GetDirectories(self):
+        return [StandInDirectoryInfo(op.join(self.FullName, f)) for f in sorted(os.listdir(self.FullName))
+                if op.isdir(op.join(self.FullName, f))]
+
+
+class StandInDriveInfo(object):
+    """Every drive is a local drive here."""
+    def __init__(self, drivename):
+        self.Name = drivename
+        self.DriveType = 'Fixed'
+
+
+def getlastwritetimeutc(fullpath):
+    # the loader only compares write times, so seconds since the epoch stand in for DateTime
+    return op.getmtime(fullpath)
+
+
+# ASSEMBLIES
+class StandInAssembly(object):
+    def __init__(self, name):
+        self.name = name
+        self.FullName = '{0}, Version=1.0.0.0'.format(name)
+        self.Location = op.join(tempfile.gettempdir(), name + '.dll')
+
+    def GetName(self):
+        return types.SimpleNamespace(Name=self.name, FullName=self.FullName)
+
+    def GetType(self, typename):
+        return StandInType(typename, self)
+
+    def GetTypes(self):
+        return []
+
+
+class StandInType(StandInObject):
+    def __init__(self, typename, assembly):
+        self.FullName = typename
+        self.AssemblyQualifiedName = '{0}, {1}'.format(typename, assembly.FullName)
+
+
+class StandInAssemblyBuilder(object):
+    def __init__(self, folder):
+        self.folder = folder
+        self.typeNames = []
+
+    def DefineDynamicModule(self, *args):
+        return self
+
+    def DefineType(self, typename, *args):
+        self.typeNames.append(typename)
+        return StandInObject()
+
+    def Save(self, dllname):
+        # an empty file is enough for the loader to find and reuse the cached assembly
+        with open(op.join(self.folder, dllname), 'w') as f:
+            f.write('\n'.join(self.typeNames))
+
+
+class StandInAssemblyName(object):
+    def __init__(self, Name=None, Version=None):
+        self.Name = Name
+        self.Version = Version
+
+
+class StandInAppDomain(object):
+    def __init__(self, assemblynames=('RevitPythonLoader', 'RevitPythonShell', 'RevitLookup')):
+        self.assemblies = [StandInAssembly(name) for name in assemblynames]
+        self.data = {}
+        self.AssemblyLoad = StandInEvent()
+
+    def GetAssemblies(self):
+        return list(self.assemblies)
+
+    def loadassembly(self, assemblyname):
+        assembly = StandInAssembly(assemblyname)
+        self.assemblies.append(assembly)
+        self.AssemblyLoad.fire(self, types.SimpleNamespace(LoadedAssembly=assembly))
+        return assembly
+
+    def DefineDynamicAssembly(self, assemblyname, access, folder=None):
+        self.loadassembly(assemblyname.Name)
+        return StandInAssemblyBuilder(folder)
+
+    def GetData(self, key):
+        return self.data.get(key)
+
+    def SetData(self, key, value):
+        self.data[key] = value
+
+
+def registermodule(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    module.__all__ = list(attrs)
+    # anything the loader imports by name but never looks at closely is a stand-in
+    module.__getattr__ = lambda attrname: StandInObject()
+    sys.modules[name] = module
+    return module
+
+
+def install(appdomain=None):
+    """Registers the clr, System and Autodesk stand-in modules and returns the stand-in AppDomain."""
+    appdomain = appdomain or StandInAppDomain()
+    registermodule('clr', AddReference=lambda *args: None, GetClrType=lambda clrtype: StandInObject())
+    systemnames = dict((name, StandInObject()) for name in ('Uri', 'Array', 'Byte', 'Type', 'Version'))
+    systemnames['AssemblyName'] = StandInAssemblyName
+    systemnames['AppDomain'] = types.SimpleNamespace(CurrentDomain=appdomain)
+    registermodule('System', **systemnames)
+    registermodule('System.IO', Path=types.SimpleNamespace(Combine=op.join), FileSystemWatcher=StandInFileSystemWatcher,
+                   NotifyFilters=StandInObject(), DirectoryInfo=StandInDirectoryInfo, DriveInfo=StandInDriveInfo,
+                   DriveType=types.SimpleNamespace(Network='Network', Fixed='Fixed'),
+                   File=types.SimpleNamespace(GetLastWriteTimeUtc=getlastwritetimeutc))
+    registermodule('System.Reflection',
+                   **dict((name, StandInObject()) for name in ('TypeAttributes', 'MethodAttributes',
+                                                                'CallingConventions')))
+    registermodule('System.Reflection.Emit',
+                   **dict((name, StandInObject()) for name in ('AssemblyBuilderAccess', 'CustomAttributeBuilder',
+                                                                'OpCodes')))
+    registermodule('System.Windows')
+    registermodule('System.Windows.Media', PixelFormats=StandInObject())
+    registermodule('System.Windows.Media.Imaging',
+                   BitmapImage=StandInObject, BitmapCacheOption=StandInObject(), BitmapSource=StandInObject())
+    registermodule('System.Diagnostics',
+                   Process=types.SimpleNamespace(GetProcessesByName=lambda processname: []))
+    registermodule('Autodesk')
+    registermodule('Autodesk.Revit')
+    registermodule('Autodesk.Revit.UI',
+                   PushButtonData=StandInRibbonItem,
+                   PulldownButtonData=StandInRibbonItem,
+                   SplitButtonData=StandInRibbonItem)
+    registermodule('Autodesk.Revit.Attributes',
+                   **dict((name, StandInObject()) for name in ('RegenerationAttribute', 'RegenerationOption',
+                                                                'TransactionAttribute', 'TransactionMode')))
+    # the loader keeps its caches in the user temp folder
+    if not os.getenv('Temp'):
+        os.environ['Temp'] = tempfile.gettempdir()
+    return appdomain
+
+
+def getloaderfile():
+    return op.join(op.dirname(op.dirname(op.abspath(__file__))), '__init__.py')
+
+
+def execloader(homedir, uiapp=None, appdomain=None, loaderfile=None):
+    """Executes the loader module with the stand-ins in place, without starting a session.
+    Returns the loader globals. Call start_session from them to run the loader."""
+    loaderfile = loaderfile or getloaderfile()
+    appdomain = install(appdomain)
+    loaderglobals = {'__name__': 'pyrevitloader',
+                     '__file__': op.join(homedir, '__init__.py'),
+                     '__revit__': uiapp or StandInUIApplication(),
+                     '__window__': StandInObject(),
+                     '__pyrevit_headless__': True}
+    with open(loaderfile, 'r') as f:
+        exec(compile(f.read(), loaderfile, 'exec'), loaderglobals)
+    loaderglobals['__appdomain__'] = appdomain
+    return loaderglobals
+
+
+def run(homedir, discoveronly=False, uiapp=None, appdomain=None, loaderfile=None, idle=True, **settings):
+    """Runs one loader session against the stand-ins and returns (session, loader globals).
+    The work the loader leaves for Revit's idle time is done before returning unless idle is False.
+    Keyword arguments override the PyRevitUISettings attributes of the same name."""
+    loaderglobals = execloader(homedir, uiapp, appdomain, loaderfile)
+    sessionsettings = loaderglobals['PyRevitUISettings']()
+    for name, value in settings.items():
+        setattr(sessionsettings, name, value)
+    session = loaderglobals['start_session'](homedir, sessionsettings, discoveronly)
+    if idle:
+        loaderglobals['__revit__'].runidle()
+    return session, loaderglobals
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    rootdir = op.abspath(args[0]) if args else op.dirname(op.dirname(op.abspath(__file__)))
+    loglevel = 10 if '--verbose' in sys.argv else 20
+    # --mirror=<folder> runs the session from a local copy of the home folder, as for a home on a network share
+    mirrorfolders = [op.abspath(arg.split('=', 1)[1]) for arg in sys.argv[1:] if arg.startswith('--mirror=')]
+    sessionsettings = {}
+    if mirrorfolders:
+        sessionsettings = dict(useLocalMirror=True, mirrorNetworkHomeOnly=False, localMirrorFolder=mirrorfolders[0])
+    # --extension=<folder> adds a script root after the home folder. can be given more than once
+    sessionsettings['extensionFolders'] = [op.abspath(arg.split('=', 1)[1]) for arg in sys.argv[1:]
+                                           if arg.startswith('--extension=')]
+    session, loaderglobals = run(rootdir, discoveronly='--discover' in sys.argv, logLevel=loglevel, **sessionsettings)
+    print('{0} tabs, {1} panels, {2} groups, {3} commands found.'.format(len(session.pyRevitScriptTabs),
+                                                                      len(session.pyRevitScriptPanels),
+                                                                      len(session.pyRevitScriptGroups),
+                                                                      len(session.pyRevitScriptCommands)))
+    if '--ribbon' in sys.argv:
+        print(loaderglobals['__revit__'].dumpribbon())
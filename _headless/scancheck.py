@@ -0,0 +1,89 @@
+"""Checks that finding the tabs, panels and scripts scales linearly with the number of files.
+
+Generates script trees of a quarter of the given file count and of the full count with the generator of
+benchmark.py, and times the findscripttabs phase of a discover-only session on each against the Revit API
+stand-in. Fails if a file takes more than twice as long to scan in the large tree as in the small one:
+
+    python _headless/scancheck.py [--files 5000]
+
+Also checks that a script whose name starts with a digit keeps its icon instead of the icon being taken for
+a group descriptor.
+"""
+
+import sys
+import os
+import os.path as op
+import shutil
+import tempfile
+
+import revitstandin
+import benchmark
+
+defaultFileCount = 5000
+tabCount = 10
+repeatCount = 3
+maxPerFileRatio = 2.0
+
+
+def countfiles(homedir):
+    return sum(len(files) for dirpath, dirnames, files in os.walk(homedir))
+
+
+def timescan(homedir):
+    """Returns the shortest findscripttabs phase of a few discover-only sessions."""
+    durations = []
+    for i in range(repeatCount):
+        session, loaderglobals = revitstandin.run(homedir, discoveronly=True,
+                                                  appdomain=revitstandin.StandInAppDomain(),
+                                                  logLevel=40, logFileLevel=None)
+        durations.extend(duration for phase, duration in loaderglobals['startupTimer'].spans['phase']
+                         if phase == 'findscripttabs')
+    return min(durations)
+
+
+def checkscaling(rootdir, filecount):
+    perfiletimes = []
+    for treefilecount in (filecount // 4, filecount):
+        homedir = op.join(rootdir, str(treefilecount))
+        os.makedirs(homedir)
+        # about three files per two commands: the script, every other icon and the group descriptors
+        benchmark.maketree(homedir, tabCount, treefilecount * 2 // 3)
+        scannedcount = countfiles(homedir)
+        duration = timescan(homedir)
+        perfiletimes.append(duration / scannedcount)
+        print('{0:>8} files scanned in {1:.3f} s, {2:.1f} us per file'.format(scannedcount, duration,
+                                                                           duration / scannedcount * 1e6))
+    ratio = perfiletimes[1] / perfiletimes[0]
+    print('Time per file in the large tree is {0:.2f}x the time in the small tree.'.format(ratio))
+    return ratio <= maxPerFileRatio
+
+
+def checkdigiticon(rootdir):
+    homedir = op.join(rootdir, 'digits')
+    tabdir = op.join(homedir, 'Digits')
+    os.makedirs(tabdir)
+    for f in ('0000_Views_PulldownButton_3D.png', '3D_isolate.py', '3D_isolate.png', '3D_section.py'):
+        open(op.join(tabdir, f), 'w').close()
+    session, loaderglobals = revitstandin.run(homedir, discoveronly=True, appdomain=revitstandin.StandInAppDomain(),
+                                              logLevel=40, logFileLevel=None)
+    icons = dict((cmd.fileName, cmd.iconFileName) for cmd in session.pyRevitScriptCommands)
+    groups = [group.groupName for group in session.pyRevitScriptGroups]
+    print('Scripts starting with a digit: icons {0}, groups {1}'.format(sorted(icons.items()), groups))
+    return icons.get('3D_isolate.py') == '3D_isolate.png' and groups == ['3D']
+
+
+if __name__ == '__main__':
+    filecount = defaultFileCount
+    if '--files' in sys.argv:
+        filecount = int(sys.argv[sys.argv.index('--files') + 1])
+    rootdir = tempfile.mkdtemp(prefix='pyRevitScanCheck')
+    os.environ['Temp'] = op.join(rootdir, '_temp')
+    os.makedirs(os.environ['Temp'])
+    try:
+        results = [checkscaling(rootdir, filecount), checkdigiticon(rootdir)]
+    finally:
+        shutil.rmtree(rootdir, ignore_errors=True)
+    if not all(results):
+        print('Scan check failed.')
+        sys.exit(1)
+    print('Scan check passed.')
@@ -18,11 +18,11 @@ https://github.com/eirannejad/pyRevit/blob/master/LICENSE
 '''
 
 __window__.Close()
-from Autodesk.Revit.DB import ElementId, Group
-from System.Collections.Generic import List
+from _runtimecontext import context
 
-uidoc = __revit__.ActiveUIDocument
-doc = __revit__.ActiveUIDocument.Document
+ctx = context(__revit__)
+uidoc = ctx.uidoc
+doc = ctx.doc
 
 set = []
 for elId in uidoc.Selection.GetElementIds():
@@ -30,5 +30,5 @@ for elId in uidoc.Selection.GetElementIds():
 	if not el.Pinned:
 		set.append( elId )
 
-uidoc.Selection.SetElementIds( List[ElementId]( set ) )
+uidoc.Selection.SetElementIds( ctx.List[ctx.ElementId]( set ) )
 uidoc.RefreshActiveView()
\ No newline at end of file
@@ -17,33 +17,22 @@ See this link for a copy of the GNU General Public License protecting this packa
 https://github.com/eirannejad/pyRevit/blob/master/LICENSE
 '''
 
-__doc__ = 'Read selection from memory. Works like the MR button in a calculator. This is a project-dependent (Revit *.rvt) memory. Every project has its own memory saved in user temp folder as *.pym files.'
+__doc__ = 'Read selection from memory. Works like the MR button in a calculator. This is a project-dependent (Revit *.rvt) memory. Every project has its own memory saved in its folder under pyRevitProjects in user temp folder.'
 
 __window__.Hide()
-from Autodesk.Revit.DB import ElementId
-from System.Collections.Generic import List
-
-import os
-import os.path as op
-import pickle as pl
+from _selectionmemory import SelectionMemory, getactiveslot, toelementids, readErrors
 
 uidoc = __revit__.ActiveUIDocument
 doc = __revit__.ActiveUIDocument.Document
 
-usertemp = os.getenv('Temp')
-prjname = op.splitext( op.basename( doc.PathName ) )[0]
-datafile = usertemp + '\\' + prjname + '_pySaveRevitSelection.pym'
+memory = SelectionMemory(doc)
+slotname = getactiveslot(doc)
 try:
-	f = open(datafile, 'r')
-	cursel = pl.load(f)
-	f.close()
-
-	set = []
-	for elId in cursel:
-		set.append( ElementId( int( elId )))
-
-	uidoc.Selection.SetElementIds( List[ElementId]( set ) )
+	uidoc.Selection.SetElementIds(toelementids(memory.read(slotname)))
 	__window__.Close()
-except:
+except IOError:
+	__window__.Show()
+	print('CAN NOT FIND SELECTION FILE FOR SLOT {0}:\n{1}'.format(slotname, memory.getslotfile(slotname)))
+except readErrors as err:
 	__window__.Show()
-	print('CAN NOT FIND SELECTION FILE:\n{0}'.format(datafile))
\ No newline at end of file
+	print('CAN NOT READ SELECTION FILE FOR SLOT {0}: {1}\n{2}'.format(slotname, err, memory.getslotfile(slotname)))
\ No newline at end of file
@@ -17,24 +17,12 @@ See this link for a copy of the GNU General Public License protecting this packa
 https://github.com/eirannejad/pyRevit/blob/master/LICENSE
 '''
 
-__doc__ = 'Clears selection from memory. Works like the MC button in a calculator. This is a project-dependent (Revit *.rvt) memory. Every project has its own memory saved in user temp folder as *.pym files.'
+__doc__ = 'Clears selection from memory. Works like the MC button in a calculator. This is a project-dependent (Revit *.rvt) memory. Every project has its own memory saved in its folder under pyRevitProjects in user temp folder.'
 
 __window__.Close()
-#from Autodesk.Revit.DB import *
-from Autodesk.Revit.UI.Selection import SelElementSet
+from _idset import IdSet
+from _selectionmemory import SelectionMemory, getactiveslot
 
-import os
-import os.path as op
-import pickle as pl
-
-uidoc = __revit__.ActiveUIDocument
 doc = __revit__.ActiveUIDocument.Document
 
-usertemp = os.getenv('Temp')
-prjname = op.splitext( op.basename( doc.PathName ) )[0]
-datafile = usertemp + '\\' + prjname + '_pySaveRevitSelection.pym'
-f = open(datafile, 'wb')
-prevsel = set([])
-pl.dump( prevsel, f)
-f.close()
-
+SelectionMemory(doc).write(getactiveslot(doc), IdSet())
@@ -17,13 +17,28 @@ See this link for a copy of the GNU General Public License protecting this packa
 https://github.com/eirannejad/pyRevit/blob/master/LICENSE
 '''
 
-__doc__ = 'Deletes all the temporary selection data files from user temp folder. This will clear all selection memories. This is a project-dependent (Revit *.rvt) memory. Every project has its own memory saved in user temp folder as *.pym files.'
+__doc__ = 'Deletes the folders of all projects under pyRevitProjects in user temp folder, and the *.pym memory files that older versions kept directly in user temp folder. This will clear the selection memories, selection histories and copied view settings of all projects.'
 
 # __window__.Close()
 
 import os
 import os.path as op
-
+import json
+import shutil
+from _projectcache import getcacheroot, indexFileName
+
+cacheroot = getcacheroot()
+if op.exists(cacheroot):
+	for cachefolder in os.listdir(cacheroot):
+		cachedir = op.join(cacheroot, cachefolder)
+		try:
+			with open(op.join(cachedir, indexFileName), 'r') as f:
+				print( json.load(f)['projectPath'] )
+		except (IOError, ValueError, KeyError):
+			print( cachefolder )
+		shutil.rmtree(cachedir, ignore_errors=True)
+
+# older versions kept the memory files directly in user temp folder
 usertemp = os.getenv('Temp')
 files = os.listdir( usertemp )
 files = [ fi for fi in files if fi.endswith(".pym") ]
@@ -19,32 +19,37 @@ https://github.com/eirannejad/pyRevit/blob/master/LICENSE
 
 __doc__ = 'Saves current selection memory as a Selection Filter.'
 
-__window__.Close()
+__window__.Hide()
 from Autodesk.Revit.DB import Transaction
 from Autodesk.Revit.DB import ElementId
 from Autodesk.Revit.DB import SelectionFilterElement
 
-import os
-import os.path as op
-import pickle as pl
 from datetime import datetime
+from _selectionmemory import SelectionMemory, getactiveslot, readErrors
 
 uidoc = __revit__.ActiveUIDocument
 doc = __revit__.ActiveUIDocument.Document
 
-usertemp = os.getenv('Temp')
-prjname = op.splitext( op.basename( doc.PathName ) )[0]
-datafile = usertemp + '\\' + prjname + '_pySaveRevitSelection.pym'
-f = open(datafile, 'r')
-
-cursel = pl.load(f)
-f.close()
-
-filtername = 'SavedSelection_' + prjname + '_' + str(datetime.now())
-
-t = Transaction(doc, 'pySaveSelection')
-t.Start()
-selFilter = SelectionFilterElement.Create(doc, filtername )
-for elid in cursel:
-	selFilter.AddSingle( ElementId( int(elid) ) )
-t.Commit()
\ No newline at end of file
+memory = SelectionMemory(doc)
+slotname = getactiveslot(doc)
+try:
+	cursel = memory.read(slotname)
+except IOError:
+	cursel = None
+	__window__.Show()
+	print('CAN NOT FIND SELECTION FILE FOR SLOT {0}:\n{1}'.format(slotname, memory.getslotfile(slotname)))
+except readErrors as err:
+	cursel = None
+	__window__.Show()
+	print('CAN NOT READ SELECTION FILE FOR SLOT {0}: {1}\n{2}'.format(slotname, err, memory.getslotfile(slotname)))
+
+if cursel is not None:
+	filtername = 'SavedSelection_' + memory.cache.projectName + '_' + slotname + '_' + str(datetime.now())
+
+	t = Transaction(doc, 'pySaveSelection')
+	t.Start()
+	selFilter = SelectionFilterElement.Create(doc, filtername )
+	for elid in cursel:
+		selFilter.AddSingle( ElementId(elid) )
+	t.Commit()
+	__window__.Close()
@@ -0,0 +1,69 @@
+'''
+Copyright (c) 2014-2016 Ehsan Iran-Nejad
+Python scripts for Autodesk Revit
+
+This file is part of pyRevit repository at https://github.com/eirannejad/pyRevit
+
+pyRevit is a free set of scripts for Autodesk Revit: you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 3, as published by
+the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+See this link for a copy of the GNU General Public License protecting this package.
+https://github.com/eirannejad/pyRevit/blob/master/LICENSE
+'''
+
+__doc__ = 'Selects the selection memory slot that the M+, M-, MR and MC buttons work with. Type a new name to start a new slot. Every project can keep any number of named slots in its folder under pyRevitProjects in user temp folder.'
+
+__window__.Close()
+import clr
+clr.AddReference('System.Windows.Forms')
+clr.AddReference('System.Drawing')
+from System.Windows.Forms import Form, ComboBox, Button, DialogResult, FormBorderStyle, FormStartPosition
+from System.Drawing import Point, Size
+
+from _selectionmemory import getactiveslot, getslotnames, setactiveslot
+
+doc = __revit__.ActiveUIDocument.Document
+
+
+class SlotForm(Form):
+	def __init__(self, slotnames, activeslot):
+		self.Text = 'Selection Memory Slot'
+		self.FormBorderStyle = FormBorderStyle.FixedDialog
+		self.StartPosition = FormStartPosition.CenterScreen
+		self.MinimizeBox = False
+		self.MaximizeBox = False
+		self.ClientSize = Size(300, 70)
+
+		self.slotBox = ComboBox()
+		self.slotBox.Location = Point(10, 10)
+		self.slotBox.Size = Size(280, 20)
+		for slotname in slotnames:
+			self.slotBox.Items.Add(slotname)
+		self.slotBox.Text = activeslot
+		self.Controls.Add(self.slotBox)
+
+		okbutton = Button()
+		okbutton.Text = 'OK'
+		okbutton.Location = Point(130, 40)
+		okbutton.DialogResult = DialogResult.OK
+		self.Controls.Add(okbutton)
+
+		cancelbutton = Button()
+		cancelbutton.Text = 'Cancel'
+		cancelbutton.Location = Point(215, 40)
+		cancelbutton.DialogResult = DialogResult.Cancel
+		self.Controls.Add(cancelbutton)
+
+		self.AcceptButton = okbutton
+		self.CancelButton = cancelbutton
+
+
+form = SlotForm(getslotnames(doc), getactiveslot(doc))
+if form.ShowDialog() == DialogResult.OK:
+	setactiveslot(doc, form.slotBox.Text)
@@ -24,9 +24,8 @@ __window__.Close()
 from Autodesk.Revit.DB import ElementId, View3D
 from Autodesk.Revit.UI import TaskDialog
 
-import os
-import os.path as op
 import pickle as pl
+from _projectcache import ProjectCache
 
 uidoc = __revit__.ActiveUIDocument
 doc = __revit__.ActiveUIDocument.Document
@@ -50,9 +49,7 @@ class vorient():
 	upy = 0
 	upz = 0
 
-usertemp = os.getenv('Temp')
-prjname = op.splitext( op.basename( doc.PathName ) )[0]
-datafile = usertemp + '\\' + prjname + '_pySaveSectionBoxState.pym'
+cache = ProjectCache(doc)
 
 av = uidoc.ActiveGraphicalView
 avui = uidoc.GetOpenUIViews()[0]
@@ -80,9 +77,6 @@ if isinstance( av, View3D ):
 	vo.upy = viewOrientation.UpDirection.Y
 	vo.upz = viewOrientation.UpDirection.Z
 
-	f = open(datafile, 'w')
-	pl.dump( sbox , f)
-	pl.dump( vo , f)
-	f.close()
+	cache.save('sectionbox', 'sectionbox', pl.dumps( sbox ) + pl.dumps( vo ))
 else:
 	TaskDialog.Show('pyRevit', 'You must be on a 3D view to copy Section Box settings.')
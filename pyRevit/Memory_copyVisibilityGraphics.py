@@ -21,19 +21,14 @@ __doc__ = '''Copy the Visibility Graphics settings of the active view to memory.
 
 
 __window__.Close()
-import os
-import os.path as op
 import pickle as pl
+from _projectcache import ProjectCache
 
 uidoc = __revit__.ActiveUIDocument
 doc = __revit__.ActiveUIDocument.Document
 
-usertemp = os.getenv('Temp')
-prjname = op.splitext( op.basename( doc.PathName ) )[0]
-datafile = usertemp + '\\' + prjname + '_pySaveVisibilityGraphicsState.pym'
+cache = ProjectCache(doc)
 
 av = uidoc.ActiveGraphicalView
 
-f = open(datafile, 'w')
-pl.dump( int( av.Id.IntegerValue) , f)
-f.close()
+cache.save('vgtemplate', 'viewtemplate', pl.dumps( int( av.Id.IntegerValue) ))
@@ -21,9 +21,8 @@ __doc__ = '''Copy the zoom state of the active view to memory.'''
 
 
 __window__.Close()
-import os
-import os.path as op
 import pickle as pl
+from _projectcache import ProjectCache
 
 class point:
 	x = 0
@@ -32,9 +31,7 @@ class point:
 uidoc = __revit__.ActiveUIDocument
 doc = __revit__.ActiveUIDocument.Document
 
-usertemp = os.getenv('Temp')
-prjname = op.splitext( op.basename( doc.PathName ) )[0]
-datafile = usertemp + '\\' + prjname + '_pySaveRevitActiveViewZoomState.pym'
+cache = ProjectCache(doc)
 
 av = uidoc.GetOpenUIViews()[0]
 cornerlist = av.GetZoomCorners()
@@ -48,7 +45,4 @@ p1.y = vc1.Y
 p2.x = vc2.X
 p2.y = vc2.Y
 
-f = open(datafile, 'w')
-pl.dump( p1, f)
-pl.dump( p2, f)
-f.close()
+cache.save('zoom', 'zoom', pl.dumps( p1 ) + pl.dumps( p2 ))
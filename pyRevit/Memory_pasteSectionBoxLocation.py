@@ -24,9 +24,8 @@ from Autodesk.Revit.DB import ElementId, Transaction, BoundingBoxXYZ, XYZ, View3
 from Autodesk.Revit.UI import TaskDialog
 from System.Collections.Generic import List
 
-import os
-import os.path as op
 import pickle as pl
+from _projectcache import ProjectCache
 
 class point:
 	x = 0
@@ -54,12 +53,11 @@ class vorient():
 uidoc = __revit__.ActiveUIDocument
 doc = __revit__.ActiveUIDocument.Document
 
-usertemp = os.getenv('Temp')
-prjname = op.splitext( op.basename( doc.PathName ) )[0]
-datafile = usertemp + '\\' + prjname + '_pySaveSectionBoxState.pym'
+cache = ProjectCache(doc)
+datafile = cache.getartifactfile('sectionbox')
 
 try:
-	f = open(datafile, 'r')
+	f = open(datafile, 'rb')
 	sbox = pl.load(f)
 	vo = pl.load(f)
 	f.close()
@@ -23,19 +23,17 @@ __window__.Hide()
 from Autodesk.Revit.DB import ElementId, Transaction
 from System.Collections.Generic import List
 
-import os
-import os.path as op
 import pickle as pl
+from _projectcache import ProjectCache
 
 uidoc = __revit__.ActiveUIDocument
 doc = __revit__.ActiveUIDocument.Document
 
-usertemp = os.getenv('Temp')
-prjname = op.splitext( op.basename( doc.PathName ) )[0]
-datafile = usertemp + '\\' + prjname + '_pySaveVisibilityGraphicsState.pym'
+cache = ProjectCache(doc)
+datafile = cache.getartifactfile('vgtemplate')
 
 try:
-	f = open(datafile, 'r')
+	f = open(datafile, 'rb')
 	id = pl.load(f)
 	f.close()
 	with Transaction(doc, 'Paste Visibility Graphics') as t:
@@ -24,9 +24,8 @@ from Autodesk.Revit.DB import ElementId, XYZ
 # from Autodesk.Revit.UI import Rectangle
 from System.Collections.Generic import List
 
-import os
-import os.path as op
 import pickle as pl
+from _projectcache import ProjectCache
 
 class point:
 	x = 0
@@ -35,11 +34,10 @@ class point:
 uidoc = __revit__.ActiveUIDocument
 doc = __revit__.ActiveUIDocument.Document
 
-usertemp = os.getenv('Temp')
-prjname = op.splitext( op.basename( doc.PathName ) )[0]
-datafile = usertemp + '\\' + prjname + '_pySaveRevitActiveViewZoomState.pym'
+cache = ProjectCache(doc)
+datafile = cache.getartifactfile('zoom')
 try:
-	f = open(datafile, 'r')
+	f = open(datafile, 'rb')
 	p2 = pl.load(f)
 	p1 = pl.load(f)
 	f.close()
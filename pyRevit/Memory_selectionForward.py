@@ -0,0 +1,37 @@
+'''
+Copyright (c) 2014-2016 Ehsan Iran-Nejad
+Python scripts for Autodesk Revit
+
+This file is part of pyRevit repository at https://github.com/eirannejad/pyRevit
+
+pyRevit is a free set of scripts for Autodesk Revit: you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 3, as published by
+the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+See this link for a copy of the GNU General Public License protecting this package.
+https://github.com/eirannejad/pyRevit/blob/master/LICENSE
+'''
+
+__doc__ = 'Steps forward to the next selection in the selection history. Works like redo for selections. The history is recorded while pyRevit runs and is saved in the folder of each project under pyRevitProjects in user temp folder.'
+
+__window__.Close()
+from _selectionhistory import gethistory
+from _selectionmemory import getselectedids, toelementids
+
+uidoc = __revit__.ActiveUIDocument
+doc = __revit__.ActiveUIDocument.Document
+
+history = gethistory(doc)
+# a selection made since the loader last recorded one starts a new branch, so there is nothing to step forward to
+history.record(getselectedids(uidoc))
+selection = history.forward()
+if selection is not None:
+	uidoc.Selection.SetElementIds(toelementids(selection))
+# the loader only saves the histories after the selections it records, so the new position is saved here
+if history.changed:
+	history.save()
@@ -18,18 +18,18 @@ https://github.com/eirannejad/pyRevit/blob/master/LICENSE
 '''
 
 __window__.Close()
-from Autodesk.Revit.DB import FilteredElementCollector, ElementId, BuiltInCategory, TextNote, Group
-from System.Collections.Generic import List
+from _runtimecontext import context
 
-uidoc = __revit__.ActiveUIDocument
-doc = __revit__.ActiveUIDocument.Document
+ctx = context(__revit__)
+uidoc = ctx.uidoc
+doc = ctx.doc
 
-cl = FilteredElementCollector(doc)
-list = cl.OfClass( TextNote ).WhereElementIsNotElementType().ToElements()
+cl = ctx.FilteredElementCollector(doc)
+list = cl.OfClass( ctx.TextNote ).WhereElementIsNotElementType().ToElements()
 
 selSet = []
 
 for el in list:
 	selSet.append( el.Id )
 
-uidoc.Selection.SetElementIds( List[ElementId]( selSet ) )
\ No newline at end of file
+uidoc.Selection.SetElementIds( ctx.List[ctx.ElementId]( selSet ) )
\ No newline at end of file
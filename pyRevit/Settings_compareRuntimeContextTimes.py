@@ -0,0 +1,89 @@
+'''
+Copyright (c) 2014-2016 Ehsan Iran-Nejad
+Python scripts for Autodesk Revit
+
+This file is part of pyRevit repository at https://github.com/eirannejad/pyRevit
+
+pyRevit is a free set of scripts for Autodesk Revit: you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 3, as published by
+the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+See this link for a copy of the GNU General Public License protecting this package.
+https://github.com/eirannejad/pyRevit/blob/master/LICENSE
+'''
+
+__doc__ = 'Measures the time the usual first lines of a script take on each click: importing the Revit API types and getting the active document. Each click is run in a fresh engine, once with the imports and once with the shared runtime context.'
+
+import os.path as op
+import time
+
+import clr
+clr.AddReference('IronPython')
+from IronPython.Hosting import Python
+
+__window__.Width = 1100
+
+clickcount = 10
+
+# the first lines of Select_selectAllTextNotes.py before and after using the runtime context
+importheader = '''
+import clr
+clr.AddReference('RevitAPI')
+from Autodesk.Revit.DB import FilteredElementCollector, ElementId, BuiltInCategory, TextNote, Group, Transaction
+from System.Collections.Generic import List
+uidoc = __revit__.ActiveUIDocument
+doc = __revit__.ActiveUIDocument.Document
+idlist = List[ElementId]()
+'''
+
+contextheader = '''
+from _runtimecontext import context
+ctx = context(__revit__)
+uidoc = ctx.uidoc
+doc = ctx.doc
+ctx.FilteredElementCollector, ctx.ElementId, ctx.BuiltInCategory, ctx.TextNote, ctx.Group, ctx.Transaction
+idlist = ctx.List[ctx.ElementId]()
+'''
+
+scriptfolder = op.dirname(__file__)
+
+
+def timeclick(header):
+	engine = Python.CreateEngine()
+	searchpaths = engine.GetSearchPaths()
+	searchpaths.Add(scriptfolder)
+	engine.SetSearchPaths(searchpaths)
+	scope = engine.CreateScope()
+	scope.SetVariable('__revit__', __revit__)
+	source = engine.CreateScriptSourceFromString(header)
+	starttime = time.time()
+	source.Execute(scope)
+	return time.time() - starttime
+
+
+def median(values):
+	values = sorted(values)
+	mid = len(values) // 2
+	return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2.0
+
+
+print('Timing {0} clicks with each script header. Each click runs in a fresh engine.\n'.format(clickcount))
+results = []
+for name, header in (('imports', importheader), ('runtime context', contextheader)):
+	durations = [timeclick(header) for i in range(clickcount)]
+	results.append((name, durations))
+
+print('{0:<20}{1:>12}{2:>12}{3:>12}{4:>12}'.format('Header', 'first ms', 'median ms', 'min ms', 'max ms'))
+print('-' * 68)
+for name, durations in results:
+	print('{0:<20}{1:>12.1f}{2:>12.1f}{3:>12.1f}{4:>12.1f}'.format(name, durations[0] * 1000,
+	                                                              median(durations[1:]) * 1000,
+	                                                              min(durations) * 1000, max(durations) * 1000))
+print('-' * 68)
+saved = median(results[0][1][1:]) - median(results[1][1][1:])
+print('Per-click overhead saved by the runtime context: {0:.1f} ms'.format(saved * 1000))
@@ -0,0 +1,64 @@
+'''
+Copyright (c) 2014-2016 Ehsan Iran-Nejad
+Python scripts for Autodesk Revit
+
+This file is part of pyRevit repository at https://github.com/eirannejad/pyRevit
+
+pyRevit is a free set of scripts for Autodesk Revit: you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 3, as published by
+the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+See this link for a copy of the GNU General Public License protecting this package.
+https://github.com/eirannejad/pyRevit/blob/master/LICENSE
+'''
+
+__doc__ = 'Compares the click times of the commands in this Revit session: the first click of each command against its later clicks, and the clicks that ran the script from source against the ones that ran its compiled copy from the script cache. The launcher of each command records how long it took, from the start of the launcher to the end of the script. Scripts are compiled on the UI thread in idle time after a load, so the clicks before that run from source. The times include everything the script does, dialogs too.'
+
+import os.path as op
+
+from System import AppDomain
+
+__window__.Width = 1100
+
+scriptcount = 20
+timesdatakey = 'pyRevitScriptTimes'
+
+
+def average(times):
+	return sum(times) / len(times) * 1000 if times else None
+
+
+def formattime(value):
+	return '-' if value is None else '{0:.1f}'.format(value)
+
+
+scripttimes = AppDomain.CurrentDomain.GetData(timesdatakey)
+
+if not scripttimes:
+	print('NO COMMANDS HAVE RUN THROUGH THE SCRIPT CACHE IN THIS REVIT SESSION YET.')
+else:
+	rows = []
+	for scriptpath, runs in scripttimes.items():
+		compiled, firsttime = runs[0]
+		rows.append((firsttime * 1000, scriptpath, 'compiled' if compiled else 'source', len(runs),
+					 average([t for c, t in runs[1:]]),
+					 average([t for c, t in runs if not c]),
+					 average([t for c, t in runs if c])))
+	rows = sorted(rows, reverse=True)[:scriptcount]
+	print('{0}{1}{2}{3}{4}{5}{6}'.format('Script'.ljust(44), 'Clicks'.rjust(8), 'First ms'.rjust(10),
+										 'First from'.rjust(12), 'Later ms'.rjust(10), 'Source ms'.rjust(11),
+										 'Cached ms'.rjust(11)))
+	print('-' * 106)
+	for firsttime, scriptpath, firstfrom, clicks, latertime, sourcetime, cachedtime in rows:
+		print('{0}{1}{2}{3}{4}{5}{6}'.format(op.basename(scriptpath).ljust(44), str(clicks).rjust(8),
+											 formattime(firsttime).rjust(10), firstfrom.rjust(12),
+											 formattime(latertime).rjust(10), formattime(sourcetime).rjust(11),
+											 formattime(cachedtime).rjust(11)))
+	print('-' * 106)
+	print('Times are averages. Later ms leaves out the first click. Source ms and Cached ms split all clicks by how the '
+		  'script was run.')
@@ -0,0 +1,98 @@
+'''
+Copyright (c) 2014-2016 Ehsan Iran-Nejad
+Python scripts for Autodesk Revit
+
+This file is part of pyRevit repository at https://github.com/eirannejad/pyRevit
+
+pyRevit is a free set of scripts for Autodesk Revit: you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 3, as published by
+the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+See this link for a copy of the GNU General Public License protecting this package.
+https://github.com/eirannejad/pyRevit/blob/master/LICENSE
+'''
+
+__doc__ = 'Compares the phase timings of the last pyRevit startups and reloads. Phases that took noticeably longer than usual in the last startup are marked with <<< and the slowest files of the last startup are listed.'
+
+import os
+import os.path as op
+import json
+
+__window__.Width = 1100
+
+startupcount = 8
+# a phase is marked when it is this many times slower than the median of the earlier startups
+regressionfactor = 1.5
+regressionminimum = 0.05
+
+usertemp = os.getenv('Temp')
+logfile = op.join(usertemp, 'pyRevitStartupLog.jsonl')
+
+
+def median(values):
+	values = sorted(values)
+	if not values:
+		return 0.0
+	mid = len(values) // 2
+	return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2.0
+
+
+try:
+	with open(logfile, 'r') as f:
+		records = [json.loads(line) for line in f.readlines() if line.strip()]
+except:
+	records = []
+
+if not records:
+	print('CAN NOT FIND STARTUP TIMING LOG:\n{0}'.format(logfile))
+else:
+	records = records[-startupcount:]
+	phasenames = []
+	for record in records:
+		for name, duration in record['phases']:
+			if name not in phasenames:
+				phasenames.append(name)
+	counternames = sorted(set(k for record in records for k in record['counters']))
+
+	print('{0}{1}'.format('Startup'.ljust(30), ''.join(r['timestamp'][5:16].rjust(13) for r in records)))
+	print('{0}{1}'.format('Reload'.ljust(30), ''.join(str(r['isReload']).rjust(13) for r in records)))
+	print('-' * (30 + 13 * len(records)))
+	rows = [(name, [dict(r['phases']).get(name) for r in records]) for name in phasenames]
+	rows.append(('total', [r['total'] for r in records]))
+	for name, durations in rows:
+		line = name.ljust(30) + ''.join(('{0:.3f}'.format(d) if d is not None else '-').rjust(13) for d in durations)
+		earlier = [d for d in durations[:-1] if d is not None]
+		last = durations[-1]
+		if earlier and last is not None and last > regressionminimum and last > regressionfactor * median(earlier):
+			line += '  <<<'
+		print(line)
+	print('-' * (30 + 13 * len(records)))
+	for name in counternames:
+		print(name.ljust(30) + ''.join(str(r['counters'].get(name, 0)).rjust(13) for r in records))
+
+	print('\nSlowest files in the last startup:')
+	for name, duration in records[-1]['slowestFiles'][:10]:
+		print('{0:8.3f} s  {1}'.format(duration, name))
+
+	docstrings = records[-1].get('slowestDocstrings', [])
+	if docstrings:
+		print('\nSlowest docstrings read in the last startup:')
+		for name, duration in docstrings[:10]:
+			print('{0:8.3f} s  {1}'.format(duration, name))
+
+	smartbuttons = records[-1].get('smartButtons', [])
+	if smartbuttons:
+		print('\nSmart button initialization in the last startup:')
+		for name, duration in smartbuttons[:10]:
+			print('{0:8.3f} s  {1}'.format(duration, name))
+
+	roots = records[-1].get('roots', [])
+	if len(roots) > 1:
+		print('\nScript root scans in the last startup:')
+		for name, duration in roots:
+			print('{0:8.3f} s  {1}'.format(duration, name))
@@ -0,0 +1,48 @@
+'''
+Copyright (c) 2014-2016 Ehsan Iran-Nejad
+Python scripts for Autodesk Revit
+
+This file is part of pyRevit repository at https://github.com/eirannejad/pyRevit
+
+pyRevit is a free set of scripts for Autodesk Revit: you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 3, as published by
+the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+See this link for a copy of the GNU General Public License protecting this package.
+https://github.com/eirannejad/pyRevit/blob/master/LICENSE
+'''
+
+__doc__ = 'Shows the log of the last pyRevit startup or reload. When the log does not have the full trace, including the messages that are not printed during the load, it offers to log the full trace of the next reload. Set logFileLevel to DEBUG in the settings of __init__.py to log the full trace of every load.'
+
+import os
+import os.path as op
+
+from System import AppDomain
+from Autodesk.Revit.UI import TaskDialog, TaskDialogCommonButtons, TaskDialogResult
+
+__window__.Width = 1100
+
+usertemp = os.getenv('Temp')
+logfile = op.join(usertemp, 'pyRevitLoaderLog.txt')
+# read by the loader at the start of the next load, see traceNextLoadDataKey in the settings of __init__.py
+tracenextloaddatakey = 'pyRevitTraceNextLoad'
+
+if op.exists(logfile):
+	with open(logfile, 'r') as f:
+		loaderlog = f.read()
+	print(loaderlog)
+	# the log file lines are the elapsed time, the level name and the message
+	if ' DEBUG ' not in loaderlog:
+		res = TaskDialog.Show('pyRevit',
+							  'This log does not have the full loader trace. Log the full trace of the next reload?',
+							  TaskDialogCommonButtons.Yes | TaskDialogCommonButtons.No)
+		if res == TaskDialogResult.Yes:
+			AppDomain.CurrentDomain.SetData(tracenextloaddatakey, True)
+			print('RELOAD PYREVIT AND OPEN THIS LOG AGAIN FOR THE FULL TRACE.')
+else:
+	print('CAN NOT FIND LOADER LOG FILE:\n{0}'.format(logfile))
@@ -18,12 +18,13 @@ https://github.com/eirannejad/pyRevit/blob/master/LICENSE
 '''
 
 __window__.Close()
-from Autodesk.Revit.DB import Transaction
+from _runtimecontext import context
 
-doc = __revit__.ActiveUIDocument.Document
-uidoc = __revit__.ActiveUIDocument
+ctx = context(__revit__)
+uidoc = ctx.uidoc
+doc = ctx.doc
  
-t = Transaction(doc, 'convert text')
+t = ctx.Transaction(doc, 'convert text')
 t.Start()
 
 for elId in uidoc.Selection.GetElementIds():
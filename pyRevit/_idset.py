@@ -0,0 +1,221 @@
+'''
+Copyright (c) 2014-2016 Ehsan Iran-Nejad
+Python scripts for Autodesk Revit
+
+This file is part of pyRevit repository at https://github.com/eirannejad/pyRevit
+
+pyRevit is a free set of scripts for Autodesk Revit: you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 3, as published by
+the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+See this link for a copy of the GNU General Public License protecting this package.
+https://github.com/eirannejad/pyRevit/blob/master/LICENSE
+'''
+
+__doc__ = '''Element id set backed by compressed bitmaps, used by the selection memory scripts.
+Ids are split into a high key (id >> 16) and a low 16 bit value, the same way as in roaring bitmaps. The low values
+under each key are kept in a container: a frozenset while there are at most 4096 of them, and a 65536 bit integer
+above that. Set operations work on whole containers, so a union of two dense whole-model selections is a handful of
+integer ORs instead of one operation per element, and 65536 ids in a bitmap container take 8 KB.'''
+
+import binascii
+import operator
+import struct
+
+containerBits = 16
+lowMask = (1 << containerBits) - 1
+arrayMaxSize = 4096
+bitmapBytes = (1 << containerBits) // 8
+arrayKind = 0
+bitmapKind = 1
+containerHeaderFormat = '<qHI'
+containerHeaderSize = struct.calcsize(containerHeaderFormat)
+
+# bit positions that are set in each byte value
+byteBits = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def bitcount(bitmap):
+	return bin(bitmap).count('1')
+
+
+def frombytes(data):
+	# bitmaps are stored little endian, so bit n of the integer is low value n
+	return int(binascii.hexlify(bytes(data[::-1])), 16)
+
+
+def tobytes(bitmap):
+	return binascii.unhexlify('{0:0{1}x}'.format(bitmap, bitmapBytes * 2))[::-1]
+
+
+def tobitmap(lows):
+	data = bytearray(bitmapBytes)
+	for low in lows:
+		data[low >> 3] |= 1 << (low & 7)
+	return frombytes(data)
+
+
+def bitmaplows(bitmap):
+	lows = []
+	for index, value in enumerate(bytearray(tobytes(bitmap))):
+		if value:
+			base = index << 3
+			lows.extend(base + bit for bit in byteBits[value])
+	return lows
+
+
+def optimize(container):
+	'''Returns the container as the smaller of the two container kinds, or None if it is empty.'''
+	if isinstance(container, frozenset):
+		if len(container) > arrayMaxSize:
+			return tobitmap(container)
+		return container if container else None
+	if not container:
+		return None
+	if bitcount(container) <= arrayMaxSize:
+		return frozenset(bitmaplows(container))
+	return container
+
+
+def combinecontainers(first, second, setop, bitop):
+	if isinstance(first, frozenset) and isinstance(second, frozenset):
+		return optimize(setop(first, second))
+	if isinstance(first, frozenset):
+		first = tobitmap(first)
+	if isinstance(second, frozenset):
+		second = tobitmap(second)
+	return optimize(bitop(first, second))
+
+
+def bitdifference(first, second):
+	return first & ~second
+
+
+def isidset(ids):
+	# id sets made by the copy of this module in another engine, like the one the loader runs in, are not instances
+	# of this IdSet class but have the same containers
+	return hasattr(ids, 'containers')
+
+
+class IdSet(object):
+	def __init__(self, ids=None):
+		self.containers = {}
+		if isidset(ids):
+			self.containers.update(ids.containers)
+		elif ids is not None:
+			groups = {}
+			for elid in ids:
+				key = elid >> containerBits
+				lows = groups.get(key)
+				if lows is None:
+					lows = groups[key] = []
+				lows.append(elid & lowMask)
+			for key, lows in groups.items():
+				self.containers[key] = optimize(frozenset(lows))
+
+	def __len__(self):
+		return sum(len(c) if isinstance(c, frozenset) else bitcount(c) for c in self.containers.values())
+
+	def __iter__(self):
+		for key in sorted(self.containers):
+			container = self.containers[key]
+			base = key << containerBits
+			lows = sorted(container) if isinstance(container, frozenset) else bitmaplows(container)
+			for low in lows:
+				yield base + low
+
+	def __eq__(self, other):
+		return isidset(other) and self.containers == other.containers
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __contains__(self, elid):
+		container = self.containers.get(elid >> containerBits)
+		if container is None:
+			return False
+		if isinstance(container, frozenset):
+			return (elid & lowMask) in container
+		return bool(container >> (elid & lowMask) & 1)
+
+	def combine(self, other, setop, bitop, keepfirst, keepsecond):
+		'''Applies setop or bitop to the containers under the same key. Containers under a key that is only in
+		one of the sets are kept as they are if keepfirst or keepsecond is set for that set.'''
+		if not isidset(other):
+			other = IdSet(other)
+		result = IdSet()
+		for key, container in self.containers.items():
+			if key in other.containers:
+				combined = combinecontainers(container, other.containers[key], setop, bitop)
+				if combined is not None:
+					result.containers[key] = combined
+			elif keepfirst:
+				result.containers[key] = container
+		if keepsecond:
+			for key, container in other.containers.items():
+				if key not in self.containers:
+					result.containers[key] = container
+		return result
+
+	def union(self, other):
+		return self.combine(other, frozenset.union, operator.or_, True, True)
+
+	def intersection(self, other):
+		return self.combine(other, frozenset.intersection, operator.and_, False, False)
+
+	def difference(self, other):
+		return self.combine(other, frozenset.difference, bitdifference, True, False)
+
+	def symmetric_difference(self, other):
+		return self.combine(other, frozenset.symmetric_difference, operator.xor, True, True)
+
+	__or__ = union
+	__and__ = intersection
+	__sub__ = difference
+	__xor__ = symmetric_difference
+
+	def getpackedsize(self):
+		return 4 + sum(containerHeaderSize + (len(c) * 2 if isinstance(c, frozenset) else bitmapBytes)
+		               for c in self.containers.values())
+
+	def pack(self):
+		'''Returns the container count and the containers in key order. Array containers are stored as their
+		sorted uint16 low values and bitmap containers as 8 KB little endian bitmaps.'''
+		parts = [struct.pack('<I', len(self.containers))]
+		for key in sorted(self.containers):
+			container = self.containers[key]
+			if isinstance(container, frozenset):
+				parts.append(struct.pack(containerHeaderFormat, key, arrayKind, len(container)))
+				parts.append(struct.pack('<{0}H'.format(len(container)), *sorted(container)))
+			else:
+				parts.append(struct.pack(containerHeaderFormat, key, bitmapKind, bitcount(container)))
+				parts.append(tobytes(container))
+		return b''.join(parts)
+
+	@staticmethod
+	def unpack(data, offset=0):
+		return IdSet.unpackfrom(data, offset)[0]
+
+	@staticmethod
+	def unpackfrom(data, offset):
+		'''Returns the id set packed at offset in data, and the offset after it.'''
+		idset = IdSet()
+		containercount = struct.unpack_from('<I', data, offset)[0]
+		offset += 4
+		for index in range(containercount):
+			key, kind, cardinality = struct.unpack_from(containerHeaderFormat, data, offset)
+			offset += containerHeaderSize
+			if kind == arrayKind:
+				idset.containers[key] = frozenset(struct.unpack_from('<{0}H'.format(cardinality), data, offset))
+				offset += cardinality * 2
+			elif kind == bitmapKind:
+				idset.containers[key] = frombytes(data[offset:offset + bitmapBytes])
+				offset += bitmapBytes
+			else:
+				raise ValueError('Unknown id set container kind: {0}'.format(kind))
+		return idset, offset
@@ -0,0 +1,152 @@
+'''
+Copyright (c) 2014-2016 Ehsan Iran-Nejad
+Python scripts for Autodesk Revit
+
+This file is part of pyRevit repository at https://github.com/eirannejad/pyRevit
+
+pyRevit is a free set of scripts for Autodesk Revit: you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 3, as published by
+the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+See this link for a copy of the GNU General Public License protecting this package.
+https://github.com/eirannejad/pyRevit/blob/master/LICENSE
+'''
+
+__doc__ = '''Cache folders of the projects, used by the Memory scripts to keep what they copy and remember.
+Each project gets a folder under pyRevitProjects in user temp folder, named after the project and a hash of its path.
+The path is the central model path for workshared models, so all local copies of a central model share one folder,
+and the document path otherwise. Documents that were never saved get a folder of their own for the Revit session.
+
+The pyRevitProject.json index in each folder lists the project path and the stored artifacts: selection slots,
+selection history, zoom state, section box and visibility graphics template. Artifact files are opened directly by
+name, so finding them never lists the temp folder. Artifacts are written to a temporary file that is then renamed over
+the old one, under a lock file shared by all Revit instances.'''
+
+import os
+import os.path as op
+import re
+import json
+import time
+import hashlib
+
+cacheRootName = 'pyRevitProjects'
+indexFileName = 'pyRevitProject.json'
+lockFileName = 'pyRevitProject.lock'
+artifactExtension = '.pym'
+lockTimeout = 5.0
+staleLockAge = 30.0
+
+
+def getcacheroot():
+	return op.join(os.getenv('Temp'), cacheRootName)
+
+
+def getprojectpath(doc):
+	if doc.IsWorkshared:
+		try:
+			from Autodesk.Revit.DB import ModelPathUtils
+			centralpath = ModelPathUtils.ConvertModelPathToUserVisiblePath(doc.GetWorksharingCentralModelPath())
+			if centralpath:
+				return centralpath
+		except Exception:
+			pass
+	if doc.PathName:
+		return doc.PathName
+	# documents that were never saved are told apart by their title in a Revit session only
+	return 'unsaved:{0}:{1}'.format(doc.Title, os.getpid())
+
+
+def replacefile(srcfile, dstfile):
+	if hasattr(os, 'replace'):
+		os.replace(srcfile, dstfile)
+		return
+	# os.rename does not overwrite an existing file on Windows
+	from System.IO import File
+	if File.Exists(dstfile):
+		File.Replace(srcfile, dstfile, None)
+	else:
+		File.Move(srcfile, dstfile)
+
+
+def writefile(fullpath, data):
+	tempfile = '{0}.{1}.tmp'.format(fullpath, os.getpid())
+	with open(tempfile, 'wb') as f:
+		f.write(data)
+	replacefile(tempfile, fullpath)
+
+
+class ProjectCache(object):
+	def __init__(self, doc):
+		self.projectPath = getprojectpath(doc)
+		self.projectName = re.sub(r'[^\w\-]', '_', op.splitext(op.basename(self.projectPath))[0])
+		projectkey = hashlib.md5(op.normcase(self.projectPath).encode('utf-8')).hexdigest()[:12]
+		self.cacheDir = op.join(getcacheroot(), '{0}_{1}'.format(self.projectName, projectkey))
+		self.indexFile = op.join(self.cacheDir, indexFileName)
+		self.lockFile = op.join(self.cacheDir, lockFileName)
+
+	def getartifactfile(self, name):
+		return op.join(self.cacheDir, name + artifactExtension)
+
+	def readindex(self):
+		try:
+			with open(self.indexFile, 'r') as f:
+				return json.load(f)
+		except (IOError, ValueError):
+			return {'projectPath': self.projectPath, 'artifacts': {}}
+
+	def getartifacts(self, kind):
+		return sorted(name for name, artifactkind in self.readindex()['artifacts'].items() if artifactkind == kind)
+
+	def register(self, name, kind):
+		'''Lists the artifact in the index. Only call with the lock held.'''
+		index = self.readindex()
+		if index['artifacts'].get(name) != kind:
+			index['artifacts'][name] = kind
+			writefile(self.indexFile, json.dumps(index, indent=0).encode('utf-8'))
+
+	def acquirelock(self, timeout=lockTimeout):
+		'''Waits for the lock for up to timeout seconds. A timeout of 0 tries once. Raises IOError if it is not taken.'''
+		if not op.exists(self.cacheDir):
+			os.makedirs(self.cacheDir)
+		starttime = time.time()
+		while True:
+			try:
+				lockfd = os.open(self.lockFile, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+				os.write(lockfd, str(os.getpid()).encode('utf-8'))
+				os.close(lockfd)
+				return
+			except OSError:
+				pass
+			try:
+				if time.time() - op.getmtime(self.lockFile) > staleLockAge:
+					os.remove(self.lockFile)
+					continue
+			except OSError:
+				continue
+			if time.time() - starttime >= timeout:
+				raise IOError('Project cache is locked by another Revit instance:\n{0}'.format(self.lockFile))
+			time.sleep(0.05)
+
+	def releaselock(self):
+		try:
+			os.remove(self.lockFile)
+		except OSError:
+			pass
+
+	def save(self, name, kind, data, timeout=lockTimeout):
+		self.acquirelock(timeout)
+		try:
+			writefile(self.getartifactfile(name), data)
+			self.register(name, kind)
+		finally:
+			self.releaselock()
+
+	def load(self, name):
+		'''Returns the data of the artifact. Raises IOError if it was never saved.'''
+		with open(self.getartifactfile(name), 'rb') as f:
+			return f.read()
@@ -0,0 +1,102 @@
+'''
+Copyright (c) 2014-2016 Ehsan Iran-Nejad
+Python scripts for Autodesk Revit
+
+This file is part of pyRevit repository at https://github.com/eirannejad/pyRevit
+
+pyRevit is a free set of scripts for Autodesk Revit: you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 3, as published by
+the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+See this link for a copy of the GNU General Public License protecting this package.
+https://github.com/eirannejad/pyRevit/blob/master/LICENSE
+'''
+
+__doc__ = '''Runtime context shared by the pyRevit scripts in a Revit session.
+Scripts usually start with a few "from Autodesk.Revit.DB import ..." lines. Every click runs in a fresh engine, so
+each of these imports has the engine look through the whole Revit API namespace again before the script does any
+work. Scripts can get the same types from the runtime context instead:
+
+	from _runtimecontext import context
+	ctx = context(__revit__)
+	cl = ctx.FilteredElementCollector(ctx.doc)
+	ctx.uidoc.Selection.SetElementIds(ctx.List[ctx.ElementId](ids))
+
+The context looks each type up directly in its assembly the first time any script asks for it and keeps it in
+the AppDomain, so later clicks in the same Revit session get it without any lookup. ctx.doc and ctx.uidoc are read
+from Revit on every access and always refer to the active document.'''
+
+import clr
+from System import AppDomain, Type
+
+contextDataKey = 'pyRevitRuntimeTypes'
+
+# namespaces that short type names are looked up in, in order, and the assembly each namespace lives in
+searchNamespaces = (('Autodesk.Revit.DB', 'RevitAPI'),
+                    ('Autodesk.Revit.UI', 'RevitAPIUI'),
+                    ('Autodesk.Revit.UI.Selection', 'RevitAPIUI'),
+                    ('Autodesk.Revit.DB.Architecture', 'RevitAPI'),
+                    ('System', 'mscorlib'))
+
+# short names of types outside the search namespaces
+knownTypes = {'List': 'System.Collections.Generic.List`1, mscorlib',
+              'Dictionary': 'System.Collections.Generic.Dictionary`2, mscorlib',
+              'HashSet': 'System.Collections.Generic.HashSet`1, System.Core',
+              }
+
+
+def getsharedtypes():
+	sharedtypes = AppDomain.CurrentDomain.GetData(contextDataKey)
+	if sharedtypes is None:
+		sharedtypes = {}
+		AppDomain.CurrentDomain.SetData(contextDataKey, sharedtypes)
+	return sharedtypes
+
+
+def findtype(name):
+	if name in knownTypes:
+		candidates = [knownTypes[name]]
+	else:
+		candidates = ['{0}.{1}, {2}'.format(namespace, name, asm) for namespace, asm in searchNamespaces]
+	for typename in candidates:
+		clrtype = Type.GetType(typename, False)
+		if clrtype is not None:
+			return clr.GetPythonType(clrtype)
+	return None
+
+
+class RuntimeContext(object):
+	def __init__(self, uiapp):
+		self.uiApp = uiapp
+		self.types = getsharedtypes()
+
+	@property
+	def uidoc(self):
+		return self.uiApp.ActiveUIDocument
+
+	@property
+	def doc(self):
+		return self.uiApp.ActiveUIDocument.Document
+
+	def gettype(self, name):
+		if name not in self.types:
+			pythontype = findtype(name)
+			if pythontype is None:
+				raise AttributeError('Can not find type {0} in the runtime context.'.format(name))
+			self.types[name] = pythontype
+		return self.types[name]
+
+	def __getattr__(self, name):
+		# only called for names that are not attributes of the context itself
+		if name.startswith('_'):
+			raise AttributeError(name)
+		return self.gettype(name)
+
+
+def context(uiapp):
+	return RuntimeContext(uiapp)
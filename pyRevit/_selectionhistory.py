@@ -0,0 +1,177 @@
+'''
+Copyright (c) 2014-2016 Ehsan Iran-Nejad
+Python scripts for Autodesk Revit
+
+This file is part of pyRevit repository at https://github.com/eirannejad/pyRevit
+
+pyRevit is a free set of scripts for Autodesk Revit: you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 3, as published by
+the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+See this link for a copy of the GNU General Public License protecting this package.
+https://github.com/eirannejad/pyRevit/blob/master/LICENSE
+'''
+
+__doc__ = '''Selection history of the open projects, recorded by the pyRevit loader while Revit runs.
+The oldest selection in a history is kept whole, and every later selection as the ids added to and removed from the
+selection before it, so a history of small changes to a large selection takes little memory. When a history grows
+over its memory budget, its oldest entries are folded into the oldest selection and dropped.
+
+The histories are kept in the AppDomain for the selection Back and Forward buttons. Each history is also written to
+the cache folder of the project next to its selection memory (see _projectcache.py), so it is still there after
+Revit restarts.'''
+
+import struct
+
+from _idset import IdSet
+from _projectcache import ProjectCache, lockTimeout
+
+historyDataKey = 'pyRevitSelectionHistories'
+historyKind = 'history'
+historyArtifact = 'selectionhistory'
+historyMagic = b'PYSH'
+historyVersion = 1
+# magic, version, delta count and position of the current selection
+historyHeaderFormat = '<4sHII'
+historyHeaderSize = struct.calcsize(historyHeaderFormat)
+defaultBudget = 16 * 1024 * 1024
+
+
+class SelectionHistory(object):
+	'''Entry 0 is the oldest selection and entry n the selection after the first n deltas. The current selection is
+	the entry at position. Stepping back and forward applies one delta to the current selection.'''
+	def __init__(self, budget=defaultBudget):
+		self.budget = budget
+		self.base = IdSet()
+		self.deltas = []
+		self.deltaSizes = []
+		self.size = self.base.getpackedsize()
+		self.position = 0
+		self.current = IdSet()
+		self.changed = False
+		self.cache = None
+
+	def __len__(self):
+		return len(self.deltas) + 1
+
+	def record(self, ids):
+		'''Adds the selection after the current one. Returns False if it is the current selection.'''
+		if ids == self.current:
+			return False
+		# like undo, a new selection after stepping back drops the selections after the current one
+		self.size -= sum(self.deltaSizes[self.position:])
+		del self.deltas[self.position:]
+		del self.deltaSizes[self.position:]
+		added = ids.difference(self.current)
+		removed = self.current.difference(ids)
+		self.deltas.append((added, removed))
+		self.deltaSizes.append(added.getpackedsize() + removed.getpackedsize())
+		self.size += self.deltaSizes[-1]
+		self.position += 1
+		self.current = IdSet(ids)
+		self.evict()
+		self.changed = True
+		return True
+
+	def evict(self):
+		# the current selection is never dropped
+		while self.size > self.budget and self.position > 0:
+			added, removed = self.deltas.pop(0)
+			self.size -= self.deltaSizes.pop(0) + self.base.getpackedsize()
+			self.base = self.base.difference(removed).union(added)
+			self.size += self.base.getpackedsize()
+			self.position -= 1
+
+	def back(self):
+		'''Steps back to the selection before the current one and returns it, or None at the oldest selection.'''
+		if self.position == 0:
+			return None
+		added, removed = self.deltas[self.position - 1]
+		self.current = self.current.difference(added).union(removed)
+		self.position -= 1
+		self.changed = True
+		return self.current
+
+	def forward(self):
+		'''Steps forward to the selection after the current one and returns it, or None at the newest selection.'''
+		if self.position == len(self.deltas):
+			return None
+		added, removed = self.deltas[self.position]
+		self.current = self.current.difference(removed).union(added)
+		self.position += 1
+		self.changed = True
+		return self.current
+
+	def pack(self):
+		parts = [struct.pack(historyHeaderFormat, historyMagic, historyVersion, len(self.deltas), self.position),
+		         self.base.pack()]
+		for added, removed in self.deltas:
+			parts.append(added.pack())
+			parts.append(removed.pack())
+		return b''.join(parts)
+
+	@staticmethod
+	def unpack(data, budget=defaultBudget):
+		magic, version, deltacount, position = struct.unpack(historyHeaderFormat, data[:historyHeaderSize])
+		if magic != historyMagic or version > historyVersion or position > deltacount:
+			raise ValueError('Not a selection history file.')
+		history = SelectionHistory(budget)
+		history.base, offset = IdSet.unpackfrom(data, historyHeaderSize)
+		history.current = history.base
+		history.size = history.base.getpackedsize()
+		for index in range(deltacount):
+			added, offset = IdSet.unpackfrom(data, offset)
+			removed, offset = IdSet.unpackfrom(data, offset)
+			history.deltas.append((added, removed))
+			history.deltaSizes.append(added.getpackedsize() + removed.getpackedsize())
+			history.size += history.deltaSizes[-1]
+		while history.position < position:
+			history.forward()
+		history.changed = False
+		history.evict()
+		return history
+
+	def save(self, timeout=lockTimeout):
+		self.cache.save(historyArtifact, historyKind, self.pack(), timeout)
+		self.changed = False
+
+
+def gethistories():
+	from System import AppDomain
+	histories = AppDomain.CurrentDomain.GetData(historyDataKey)
+	if histories is None:
+		histories = {}
+		AppDomain.CurrentDomain.SetData(historyDataKey, histories)
+	return histories
+
+
+def gethistory(doc, budget=defaultBudget):
+	'''Returns the selection history of the project, read from its cache folder the first time it is asked for.'''
+	histories = gethistories()
+	cache = ProjectCache(doc)
+	if cache.projectPath not in histories:
+		try:
+			history = SelectionHistory.unpack(cache.load(historyArtifact), budget)
+		except (IOError, ValueError, struct.error):
+			history = SelectionHistory(budget)
+		history.cache = cache
+		histories[cache.projectPath] = history
+	return histories[cache.projectPath]
+
+
+def savehistories(timeout=lockTimeout):
+	'''Writes the changed histories. Returns False if any of them could not be written, for example while another Revit
+	instance holds the lock of its project cache. Those histories stay changed, so they are written by the next call.'''
+	saved = True
+	for history in gethistories().values():
+		if history.changed:
+			try:
+				history.save(timeout)
+			except (IOError, OSError):
+				saved = False
+	return saved
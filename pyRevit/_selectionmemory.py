@@ -0,0 +1,220 @@
+'''
+Copyright (c) 2014-2016 Ehsan Iran-Nejad
+Python scripts for Autodesk Revit
+
+This file is part of pyRevit repository at https://github.com/eirannejad/pyRevit
+
+pyRevit is a free set of scripts for Autodesk Revit: you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 3, as published by
+the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+See this link for a copy of the GNU General Public License protecting this package.
+https://github.com/eirannejad/pyRevit/blob/master/LICENSE
+'''
+
+__doc__ = '''Selection memory files shared by the Memory and MemA scripts.
+A memory file holds the element ids as a compressed bitmap id set (see _idset.py) after a 16 byte header, followed
+by the UniqueIds of the elements:
+
+	4 bytes   PYSM
+	uint16    format version, 3
+	uint16    id width in bytes, 0 for an id set
+	uint64    id count
+	          id set containers
+	uint32    size of the UniqueIds
+	          UniqueIds, one per line, zlib compressed
+
+Element ids can change when a model is detached or recreated, so the elements are found again by their UniqueIds
+through the UniqueId index of the document (see _uniqueidindex.py). The id set is used as it is by readers without
+an index. Version 2 memory files hold the id set only. The whole file is loaded with a single read call. Memory files
+that older versions kept in user temp folder, as a sorted id array or a pickled set of id strings, are not read.
+
+Each project can keep any number of named selection slots. Every slot is a memory file of its own in the cache
+folder of the project (see _projectcache.py), so reading a slot never touches the others. Changes to a slot are made
+under the lock of the project cache, and the new memory file is written next to the old one and then renamed over
+it, so a crash in the middle of a write leaves the previous selection in place.'''
+
+import re
+import struct
+import zlib
+
+from _idset import IdSet, isidset
+from _projectcache import ProjectCache, getprojectpath, writefile
+from _uniqueidindex import getelementidvalue, getindex
+
+fileMagic = b'PYSM'
+formatVersion = 3
+idSetVersion = 2
+idSetWidth = 0
+headerFormat = '<4sHHQ'
+headerSize = struct.calcsize(headerFormat)
+
+# raised when a memory file is cut short or corrupt
+readErrors = (ValueError, IndexError, struct.error, zlib.error)
+
+selectionKind = 'selection'
+defaultSlot = 'default'
+activeSlotDataKey = 'pyRevitSelectionSlots'
+
+
+def getslotartifact(slotname):
+	return selectionKind if slotname == defaultSlot else selectionKind + '.' + slotname
+
+
+def getmemoryfile(doc, slotname=defaultSlot):
+	return ProjectCache(doc).getartifactfile(getslotartifact(slotname))
+
+
+def cleanslotname(slotname):
+	slotname = re.sub(r'[^\w\- ]', '_', slotname.strip())
+	return slotname if slotname else defaultSlot
+
+
+def getslotnames(doc):
+	prefix = selectionKind + '.'
+	slotnames = [name[len(prefix):] for name in ProjectCache(doc).getartifacts(selectionKind) if name.startswith(prefix)]
+	return [defaultSlot] + slotnames
+
+
+def getactiveslot(doc):
+	# the active slot is kept for each Revit instance, so two instances on the same project can use different slots
+	from System import AppDomain
+	activeslots = AppDomain.CurrentDomain.GetData(activeSlotDataKey)
+	projectpath = getprojectpath(doc)
+	if activeslots is None or projectpath not in activeslots:
+		return defaultSlot
+	return activeslots[projectpath]
+
+
+def setactiveslot(doc, slotname):
+	from System import AppDomain
+	activeslots = AppDomain.CurrentDomain.GetData(activeSlotDataKey)
+	if activeslots is None:
+		activeslots = {}
+		AppDomain.CurrentDomain.SetData(activeSlotDataKey, activeslots)
+	projectpath = getprojectpath(doc)
+	activeslots[projectpath] = cleanslotname(slotname)
+	return activeslots[projectpath]
+
+
+def getselectedids(uidoc):
+	return toidset(uidoc.Selection.GetElementIds())
+
+
+def toidset(elementids):
+	return IdSet(getelementidvalue(elid) for elid in elementids)
+
+
+def getselectionsignature(elementids):
+	'''Returns the count, sum and xor of the ids. Tells a changed selection apart from the last one without building
+	its id set.'''
+	total = mixed = 0
+	for elid in elementids:
+		value = getelementidvalue(elid)
+		total += value
+		mixed ^= value
+	return elementids.Count, total, mixed
+
+
+def toelementids(ids):
+	from Autodesk.Revit.DB import ElementId
+	from System.Collections.Generic import List
+	return List[ElementId]([ElementId(elid) for elid in ids])
+
+
+def packids(ids, uniqueids=None):
+	if not isidset(ids):
+		ids = IdSet(ids)
+	version = idSetVersion if uniqueids is None else formatVersion
+	data = struct.pack(headerFormat, fileMagic, version, idSetWidth, len(ids)) + ids.pack()
+	if uniqueids is not None:
+		packeduniqueids = zlib.compress('\n'.join(uniqueids).encode('ascii'))
+		data += struct.pack('<I', len(packeduniqueids)) + packeduniqueids
+	return data
+
+
+def unpackids(data):
+	'''Returns the id set and the UniqueIds in the memory file data. The UniqueIds are None for older versions.'''
+	magic, version, idwidth, idcount = struct.unpack(headerFormat, data[:headerSize])
+	if magic != fileMagic or version < idSetVersion or version > formatVersion or idwidth != idSetWidth:
+		raise ValueError('Not a selection memory file.')
+	ids, offset = IdSet.unpackfrom(data, headerSize)
+	if version < formatVersion:
+		return ids, None
+	size = struct.unpack_from('<I', data, offset)[0]
+	offset += 4
+	uniqueids = zlib.decompress(data[offset:offset + size]).decode('ascii')
+	return ids, uniqueids.split('\n') if uniqueids else []
+
+
+def readids(datafile, index=None):
+	'''Returns the id set in the memory file. The elements are found by their UniqueIds if an index is given and the
+	file has them. Raises IOError if there is no memory file.'''
+	with open(datafile, 'rb') as f:
+		data = f.read()
+	ids, uniqueids = unpackids(data)
+	if index is not None and uniqueids is not None:
+		return index.getelementids(uniqueids)
+	return ids
+
+
+def writeids(datafile, ids, index=None):
+	'''Writes the id set to the memory file, with the UniqueIds of the elements if an index is given.'''
+	uniqueids = index.getuniqueids(ids) if index is not None else None
+	writefile(datafile, packids(ids, uniqueids))
+
+
+class SelectionMemory(object):
+	'''Named selection slots of a project. Slots are read without a lock, since a memory file is always replaced
+	as a whole, and are changed with update() under the lock of the project cache.'''
+	def __init__(self, doc):
+		self.doc = doc
+		self.cache = ProjectCache(doc)
+
+	def getslotfile(self, slotname):
+		return self.cache.getartifactfile(getslotartifact(slotname))
+
+	def read(self, slotname):
+		return readids(self.getslotfile(slotname), getindex(self.doc))
+
+	def write(self, slotname, ids):
+		'''Replaces the ids in the slot without reading them first.'''
+		index = getindex(self.doc)
+		# the first use of the index in a session builds it, which should not keep other instances waiting
+		if len(ids):
+			index.build()
+		self.cache.acquirelock()
+		try:
+			writeids(self.getslotfile(slotname), ids, index)
+			self.cache.register(getslotartifact(slotname), selectionKind)
+		finally:
+			self.cache.releaselock()
+
+	def update(self, slotname, change):
+		'''Replaces the ids in the slot with change(ids) and returns them. A missing slot or a memory file that can not
+		be read starts out empty.'''
+		# the first use of the index in a session builds it, which should not keep other instances waiting
+		index = getindex(self.doc)
+		index.build()
+		self.cache.acquirelock()
+		try:
+			datafile = self.getslotfile(slotname)
+			try:
+				ids = readids(datafile, index)
+			except IOError:
+				ids = IdSet()
+			except readErrors as err:
+				print('CAN NOT READ SELECTION FILE FOR SLOT {0}. STARTING FROM AN EMPTY SELECTION: {1}\n{2}'.format(
+					slotname, err, datafile))
+				ids = IdSet()
+			newids = change(ids)
+			writeids(datafile, newids, index)
+			self.cache.register(getslotartifact(slotname), selectionKind)
+			return newids
+		finally:
+			self.cache.releaselock()
@@ -0,0 +1,148 @@
+'''
+Copyright (c) 2014-2016 Ehsan Iran-Nejad
+Python scripts for Autodesk Revit
+
+This file is part of pyRevit repository at https://github.com/eirannejad/pyRevit
+
+pyRevit is a free set of scripts for Autodesk Revit: you can redistribute it and/or modify
+it under the terms of the GNU General Public License version 3, as published by
+the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+See this link for a copy of the GNU General Public License protecting this package.
+https://github.com/eirannejad/pyRevit/blob/master/LICENSE
+'''
+
+__doc__ = '''UniqueId index of the open documents, used by the selection memory to find the elements it remembers.
+Element ids change when a model is detached or recreated, and can differ between central and local copies, so the
+memory files keep the UniqueId of every element. The index maps UniqueIds to element ids and back for a whole
+document. It is built once per Revit session the first time UniqueIds are read or written for the document, and kept
+current from the DocumentChanged event after that, so restoring a large memory is one dictionary lookup per element
+instead of one Revit API call per element. Indexes are kept per document, not per path, so saving a document under
+another name keeps its index.'''
+
+from _idset import IdSet
+
+indexDataKey = 'pyRevitUniqueIdIndexes'
+
+
+def getelementidvalue(elid):
+	# ElementId.Value replaces IntegerValue in the Revit versions with 64 bit element ids
+	value = getattr(elid, 'Value', None)
+	return value if value is not None else elid.IntegerValue
+
+
+class UniqueIdIndex(object):
+	def __init__(self, doc):
+		self.doc = doc
+		self.elementIds = {}
+		self.uniqueIds = {}
+		self.isBuilt = False
+
+	def build(self):
+		'''Indexes all elements of the document, once. Lookups build the index when they are first asked for any ids.'''
+		if self.isBuilt:
+			return
+		from Autodesk.Revit.DB import FilteredElementCollector
+		for elementtypes in (False, True):
+			collector = FilteredElementCollector(self.doc)
+			collector = collector.WhereElementIsElementType() if elementtypes else collector.WhereElementIsNotElementType()
+			for element in collector:
+				self.add(element)
+		self.isBuilt = True
+
+	def add(self, element):
+		elid = getelementidvalue(element.Id)
+		self.elementIds[element.UniqueId] = elid
+		self.uniqueIds[elid] = element.UniqueId
+
+	def remove(self, elid):
+		uniqueid = self.uniqueIds.pop(elid, None)
+		if uniqueid is not None:
+			self.elementIds.pop(uniqueid, None)
+
+	def getuniqueids(self, ids):
+		'''Returns the UniqueIds of the elements with the given ids. Ids of elements that do not exist are skipped.'''
+		if len(ids):
+			self.build()
+		uniqueids = []
+		for elid in ids:
+			uniqueid = self.uniqueIds.get(elid)
+			if uniqueid is None:
+				from Autodesk.Revit.DB import ElementId
+				element = self.doc.GetElement(ElementId(elid))
+				if element is None:
+					continue
+				self.add(element)
+				uniqueid = element.UniqueId
+			uniqueids.append(uniqueid)
+		return uniqueids
+
+	def getelementids(self, uniqueids):
+		'''Returns the id set of the elements with the given UniqueIds. Elements that do not exist are skipped.'''
+		if uniqueids:
+			self.build()
+		ids = []
+		for uniqueid in uniqueids:
+			elid = self.elementIds.get(uniqueid)
+			if elid is None:
+				# elements that came in with a reload from central are not reported by DocumentChanged
+				element = self.doc.GetElement(uniqueid)
+				if element is None:
+					continue
+				self.add(element)
+				elid = self.elementIds[uniqueid]
+			ids.append(elid)
+		return IdSet(ids)
+
+	def update(self, addedids, deletedids):
+		# an index that is not built yet gets the changes when it is built
+		if not self.isBuilt:
+			return
+		for elid in deletedids:
+			self.remove(getelementidvalue(elid))
+		for elid in addedids:
+			element = self.doc.GetElement(elid)
+			if element is not None:
+				self.add(element)
+
+
+class UniqueIdIndexes(object):
+	'''Indexes of the open documents. Subscribes to the document events of the Revit session once, when the first
+	index is asked for, and keeps the indexes current until their documents close. Revit documents compare and hash
+	by the document they stand for, so they are the keys of the indexes.'''
+	def __init__(self, app):
+		self.indexes = {}
+		app.DocumentChanged += self.ondocumentchanged
+		app.DocumentClosing += self.ondocumentclosing
+
+	def getindex(self, doc):
+		if doc not in self.indexes:
+			self.indexes[doc] = UniqueIdIndex(doc)
+		return self.indexes[doc]
+
+	def ondocumentchanged(self, sender, args):
+		doc = args.GetDocument()
+		if doc not in self.indexes:
+			return
+		try:
+			self.indexes[doc].update(args.GetAddedElementIds(), args.GetDeletedElementIds())
+		except Exception:
+			# the index is built again the next time it is used
+			self.indexes.pop(doc, None)
+
+	def ondocumentclosing(self, sender, args):
+		self.indexes.pop(args.Document, None)
+
+
+def getindex(doc):
+	from System import AppDomain
+	indexes = AppDomain.CurrentDomain.GetData(indexDataKey)
+	if indexes is None:
+		indexes = UniqueIdIndexes(doc.Application)
+		AppDomain.CurrentDomain.SetData(indexDataKey, indexes)
+	return indexes.getindex(doc)